@@ -0,0 +1,39 @@
+"""Benchmark for building task arguments with argbuilder.build and a compiled ArgBuilder.
+
+Run with `python -m benchmarks.bench_argbuilder`.
+"""
+
+import timeit
+import dcsh.argbuilder as argbuilder
+from dcsh.settings import task_arg_map
+
+
+def make_tasks(count):
+    """Returns count synthetic task definitions using a mix of task options."""
+    tasks = []
+    for ii in range(count):
+        task = {
+            'service': 'svc{}'.format(ii % 7),
+            'remove': True,
+            'environment': {'KEY{}'.format(jj): 'value{}'.format(jj) for jj in range(ii % 5)},
+        }
+        if ii % 2:
+            task['volume'] = ['/src:/src', '/data{}:/data'.format(ii)]
+        if ii % 3:
+            task['user'] = 'user{}'.format(ii)
+        tasks.append(task)
+    return tasks
+
+
+def main():
+    compiled = argbuilder.compile(task_arg_map)
+    print('{:>6}  {:<12} {:>10}'.format('tasks', 'builder', 'ms'))
+    for count in (10, 100, 1000, 5000):
+        tasks = make_tasks(count)
+        for name, fn in (('build', lambda t: argbuilder.build(task_arg_map, t)), ('compiled', compiled)):
+            elapsed = min(timeit.repeat(lambda: [fn(t) for t in tasks], number=5, repeat=3)) / 5
+            print('{:>6}  {:<12} {:>10.3f}'.format(count, name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Benchmark for command name completion with many tasks and commands.
+
+Run with `python -m benchmarks.bench_complete`.
+"""
+
+import cmd
+import timeit
+from dcsh.shell import DcShell
+
+
+def make_settings(count):
+    """Returns shell settings with count tasks, alongside the usual docker-compose commands."""
+    return {
+        'debug': False,
+        'intro': '',
+        'prompt': '$',
+        'prompt_style': 'prompt',
+        'debug_prompt': '#',
+        'debug_prompt_style': 'debug_prompt',
+        'stylesheet': {},
+        'completion_ttl': 5,
+        'dc_commands': dict((name, '') for name in (
+            'build', 'config', 'create', 'down', 'events', 'exec', 'images', 'kill', 'logs', 'pause',
+            'port', 'ps', 'pull', 'push', 'restart', 'rm', 'run', 'scale', 'start', 'stop', 'top',
+            'unpause', 'up', 'version')),
+        'tasks': dict(('task{}'.format(ii), {'help': None, 'compiled_args': []}) for ii in range(count)),
+    }
+
+
+def main():
+    print('{:>6}  {:<24} {:>10}'.format('tasks', 'completenames', 'us'))
+    for count in (10, 100, 1000, 5000):
+        sh = DcShell(make_settings(count))
+        for name, fn in (('cmd.Cmd (dir scan)', lambda: cmd.Cmd.completenames(sh, 'task1')),
+                         ('DcShell (prefix index)', lambda: sh.completenames('task1'))):
+            elapsed = min(timeit.repeat(fn, number=20, repeat=3)) / 20
+            print('{:>6}  {:<24} {:>10.1f}'.format(count, name, elapsed * 1000000))
+
+
+if __name__ == '__main__':
+    main()
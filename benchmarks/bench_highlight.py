@@ -0,0 +1,64 @@
+"""Throughput benchmark for highlighted streaming of docker-compose output.
+
+Run with `python -m benchmarks.bench_highlight`.
+"""
+
+import os
+import time
+import random
+import tempfile
+import dcsh.compose as compose
+from dcsh.highlight import Highlighter
+from dcsh.printer import StylePrinter
+from dcsh.settings import default_highlights
+from dcsh.settings import default_stylesheet
+
+
+def make_logs(size):
+    """Returns roughly size bytes of synthetic docker-compose logs output."""
+    rnd = random.Random(0)
+    services = ['web_1', 'api_1', 'worker_1', 'db_1', 'cache_1']
+    levels = ['INFO'] * 20 + ['DEBUG'] * 10 + ['WARNING'] * 2 + ['ERROR']
+    lines = []
+    total = 0
+    while total < size:
+        line = '{:<9}| 2018-06-01 12:00:{:02d} {} request id={} path=/api/v1/items/{} took {}ms\n'.format(
+            rnd.choice(services), rnd.randint(0, 59), rnd.choice(levels),
+            rnd.randint(0, 1 << 30), rnd.randint(0, 9999), rnd.randint(1, 500))
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+def report(name, size, elapsed):
+    print('{:<32} {:>8.1f} MB/s'.format(name, size / elapsed / (1024 * 1024)))
+
+
+def main():
+    text = make_logs(32 * 1024 * 1024)
+    printer = StylePrinter(open(os.devnull, 'w'), default_stylesheet)
+    highlighter = Highlighter(default_highlights, printer)
+    chunks = [text[ii:ii + compose.stream_chunk_size] for ii in range(0, len(text), compose.stream_chunk_size)]
+
+    start = time.time()
+    for chunk in chunks:
+        highlighter.apply(chunk)
+    report('Highlighter.apply (64KB chunks)', len(text), time.time() - start)
+
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        with open(os.devnull, 'w') as out:
+            start = time.time()
+            compose.stream_compose(['cat', path], Highlighter([], printer), out)
+            report('stream_compose (no rules)', len(text), time.time() - start)
+            start = time.time()
+            compose.stream_compose(['cat', path], highlighter, out)
+            report('stream_compose (default rules)', len(text), time.time() - start)
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark for merging layered, deeply nested configuration.
+
+Run with `python -m benchmarks.bench_merge`.
+"""
+
+import timeit
+import dcsh.merge as merge
+
+
+def make_layer(seed, width, depth, overlap):
+    """Returns a nested dict with width keys per level; overlap sets the share of common keys."""
+
+    def node(level, path):
+        if level == depth:
+            return '{}:{}'.format(seed, path)
+        result = {}
+        for ii in range(width):
+            name = 'k{}'.format(ii) if ii < width * overlap else 's{}k{}'.format(seed, ii)
+            result[name] = node(level + 1, path + '.' + name)
+        return result
+    return node(0, '')
+
+
+def count(value):
+    if isinstance(value, dict):
+        return sum(count(v) for v in value.values())
+    return 1
+
+
+def main():
+    print('{:>6} {:>6} {:>8}  {:<28} {:>10}'.format('width', 'depth', 'leaves', 'strategy', 'ms/merge'))
+    for width, depth in ((64, 2), (16, 3), (8, 4)):
+        # /etc, home and project layers, each overriding some of the previous keys
+        layers = [make_layer(seed, width, depth, overlap)
+                  for seed, overlap in ((0, 1.0), (1, 0.5), (2, 0.25))]
+        layers = [dict(('section{}'.format(ii), layer) for ii in range(4)) for layer in layers]
+        keys = list(layers[0].keys())
+        strategies = [
+            ('Merge(full, shallow)', merge.Merge(merge.full, merge.shallow)),
+            ('Merge(full, deep)', merge.Merge(merge.full, merge.deep)),
+            ('Merge(full, deep).compile', merge.Merge(merge.full, merge.deep).compile(keys)),
+        ]
+        for name, fn in strategies:
+            def run():
+                data = layers[0]
+                for layer in layers[1:]:
+                    data = fn(data, layer)
+                return data
+            leaves = count(run())
+            elapsed = min(timeit.repeat(run, number=20, repeat=3)) / 20
+            print('{:>6} {:>6} {:>8}  {:<28} {:>10.3f}'.format(width, depth, leaves, name, elapsed * 1000))
+
+    # flat layers with thousands of keys, where per-key strategy lookup dominates
+    for size in (1000, 5000):
+        left = dict(('key{}'.format(ii), ii) for ii in range(size))
+        right = dict(('key{}'.format(ii), -ii) for ii in range(0, size, 3))
+        strategies = [
+            ('Merge(left, override)', merge.Merge(merge.left, merge.override)),
+            ('Merge(left, override).compile', merge.Merge(merge.left, merge.override).compile(left.keys())),
+        ]
+        for name, fn in strategies:
+            elapsed = min(timeit.repeat(lambda: fn(left, right), number=50, repeat=3)) / 50
+            print('{:>6} {:>6} {:>8}  {:<28} {:>10.3f}'.format(size, 1, size, name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
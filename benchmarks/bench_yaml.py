@@ -0,0 +1,70 @@
+"""Benchmark for loading the x-dcsh block from large synthetic docker-compose files.
+
+Run with `python -m benchmarks.bench_yaml`.
+"""
+
+import timeit
+import yaml
+import dcsh.yamlload as yamlload
+
+
+def make_compose(services, tasks=50):
+    """Returns the text of a compose file with the given number of services and tasks."""
+    lines = [
+        "version: '3.4'",
+        'x-proxy-args: &proxy-args',
+        '  http_proxy: http://proxy:3128',
+        '  no_proxy: localhost',
+        'x-dcsh:',
+        '  environment:',
+        '    <<: *proxy-args',
+        '  tasks:',
+    ]
+    for ii in range(tasks):
+        lines += [
+            '    task{}:'.format(ii),
+            "      help: 'runs task {}'".format(ii),
+            '      service: service0',
+            '      args: python -m task{}'.format(ii),
+        ]
+    lines.append('services:')
+    for ii in range(services):
+        lines += [
+            '  service{}:'.format(ii),
+            '    build:',
+            '      context: ./service{}'.format(ii),
+            '      args:',
+            '        <<: *proxy-args',
+            '    environment:',
+            '      - SERVICE_INDEX={}'.format(ii),
+            '      - SERVICE_NAME=service{}'.format(ii),
+            '    volumes:',
+            '      - ./service{0}:/workspace/service{0}'.format(ii),
+            '    ports:',
+            '      - "{}:80"'.format(10000 + ii),
+            '    depends_on:',
+            '      - service{}'.format(max(ii - 1, 0)),
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    loaders = [
+        ('yaml.load (SafeLoader)', lambda text: yaml.load(text, Loader=yaml.SafeLoader)['x-dcsh']),
+        ('yamlload.load', lambda text: yamlload.load(text)['x-dcsh']),
+        ('yamlload.load_key', lambda text: yamlload.load_key(text, 'x-dcsh')),
+    ]
+    print('libyaml available: {}'.format(yaml.__with_libyaml__))
+    print('{:>9} {:>8}  {:<24} {:>10}'.format('services', 'lines', 'loader', 'ms/load'))
+    for services in (10, 100, 1000, 5000):
+        text = make_compose(services)
+        expected = loaders[0][1](text)
+        for name, fn in loaders:
+            assert fn(text) == expected
+            number = max(1, 2000 // (services + 10))
+            elapsed = min(timeit.repeat(lambda: fn(text), number=number, repeat=3)) / number
+            print('{:>9} {:>8}  {:<24} {:>10.2f}'.format(services, text.count('\n'), name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Benchmark suite for dcsh's hot paths, checked against a stored baseline.
+
+Run with `python -m benchmarks.suite`; it exits with status 1 if any benchmark is slower
+than its baseline by more than the tolerance.  Use --save to record a new baseline after
+an intentional change, or on a new reference machine.
+
+docker-compose is replaced by a stub that prints realistic help output and exits at once,
+so that timings reflect dcsh itself.
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import timeit
+import argparse
+import tempfile
+import subprocess
+from StringIO import StringIO
+import dcsh.argbuilder as argbuilder
+import dcsh.cache as cache
+import dcsh.config as config
+import dcsh.merge as merge
+import dcsh.shell as shell
+from dcsh.printer import StylePrinter
+from dcsh.settings import default_stylesheet
+from dcsh.settings import task_arg_map
+from .bench_argbuilder import make_tasks
+from .bench_complete import make_settings
+from .bench_merge import make_layer
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# task counts for the synthetic configurations
+task_counts = (10, 100, 1000, 5000)
+
+# stub docker-compose: like the real one, usage goes to stderr when run without arguments
+fake_dc = '''#!/bin/sh
+if [ $# -gt 0 ]; then exit 0; fi
+cat >&2 <<'EOF'
+Define and run multi-container applications with Docker.
+
+Usage:
+  docker-compose [-f <arg>...] [options] [COMMAND] [ARGS...]
+  docker-compose -h|--help
+
+Options:
+  -f, --file FILE             Specify an alternate compose file
+  -p, --project-name NAME     Specify an alternate project name
+  --verbose                   Show more output
+  -v, --version               Print version and exit
+  -H, --host HOST             Daemon socket to connect to
+
+Commands:
+  build              Build or rebuild services
+  bundle             Generate a Docker bundle from the Compose file
+  config             Validate and view the Compose file
+  create             Create services
+  down               Stop and remove containers, networks, images, and volumes
+  events             Receive real time events from containers
+  exec               Execute a command in a running container
+  help               Get help on a command
+  images             List images
+  kill               Kill containers
+  logs               View output from containers
+  pause              Pause services
+  port               Print the public port for a port binding
+  ps                 List containers
+  pull               Pull service images
+  push               Push service images
+  restart            Restart services
+  rm                 Remove stopped containers
+  run                Run a one-off command
+  scale              Set number of containers for a service
+  start              Start services
+  stop               Stop services
+  top                Display the running processes
+  unpause            Unpause services
+  up                 Create and start containers
+  version            Show the Docker-Compose version information
+EOF
+exit 1
+'''
+
+
+def make_dcsh_yml(dc_path, count):
+    """Returns the text of a .dcsh.yml with count tasks, some of which have dependencies."""
+    lines = ['dc_path: {}'.format(dc_path), 'environment:', '  PROJECT: bench', 'tasks:']
+    for ii in range(count):
+        lines += [
+            '  task{}:'.format(ii),
+            "    help: 'runs task {}'".format(ii),
+            '    service: service{}'.format(ii % 7),
+            '    remove: true',
+            '    environment:',
+            '      TASK: task{}'.format(ii),
+            '    args: python -m task{}'.format(ii),
+        ]
+        if ii % 10:
+            lines.append('    depends: [task{}]'.format(ii - ii % 10))
+    return '\n'.join(lines) + '\n'
+
+
+class Workspace(object):
+    """Temporary project directory, home and cache, with a stub docker-compose on the PATH."""
+
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix='dcsh-bench-')
+        self.home = os.path.join(self.root, 'home')
+        self.project = os.path.join(self.root, 'project')
+        self.dc_path = os.path.join(self.root, 'bin', 'docker-compose')
+        for path in (self.home, self.project, os.path.dirname(self.dc_path)):
+            os.makedirs(path)
+        with open(self.dc_path, 'w') as f:
+            f.write(fake_dc)
+        os.chmod(self.dc_path, 0o755)
+        with open(os.path.join(self.project, 'docker-compose.yml'), 'w') as f:
+            f.write("version: '3.4'\nservices:\n  service0:\n    image: python\n")
+        self.env = dict(os.environ, HOME=self.home, XDG_CACHE_HOME=os.path.join(self.root, 'cache'),
+                        PATH=os.path.dirname(self.dc_path) + os.pathsep + os.environ.get('PATH', ''))
+        self.tasks(10)
+
+    def tasks(self, count):
+        """Rewrites the project configuration with count tasks."""
+        with open(os.path.join(self.project, '.dcsh.yml'), 'w') as f:
+            f.write(make_dcsh_yml(self.dc_path, count))
+
+    def clear_cache(self):
+        """Removes every cached settings snapshot and command table."""
+        shutil.rmtree(self.env['XDG_CACHE_HOME'], ignore_errors=True)
+
+    def __enter__(self):
+        self.saved = (os.getcwd(), dict(os.environ))
+        os.chdir(self.project)
+        os.environ.update(self.env)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        cwd, environ = self.saved
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def best(fn, number, repeat=3):
+    """Returns the best time per call of fn over repeat runs of number calls, in seconds."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def bench_startup(ws):
+    """Times `dcsh -c version` end to end, with an empty cache and with a populated one."""
+    argv = [sys.executable, '-m', 'dcsh.cli', '--no-color', '-c', 'version']
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(ws.env, PYTHONPATH=package_root)
+    ws.tasks(100)
+
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(argv, cwd=ws.project, env=env, stdout=devnull, stderr=devnull)
+
+    def cold():
+        ws.clear_cache()
+        run()
+
+    yield 'startup.cold', best(cold, number=1, repeat=5)
+    run()
+    yield 'startup.warm', best(run, number=3)
+
+
+def bench_load_settings(ws):
+    """Times load_settings for each task count, compiling from scratch and from the snapshot."""
+    saved = config.printer.stream
+    config.printer.stream = StringIO()
+    try:
+        for count in task_counts:
+            ws.tasks(count)
+            number = max(1, 100 // count)
+
+            def load():
+                config.load_settings(sudo=False, debug=False, no_color=True)
+
+            def cold():
+                cache.invalidate(config.settings_cache_prefix)
+                load()
+
+            load()  # populates the command cache
+            yield 'load_settings.{}.cold'.format(count), best(cold, number=number)
+            yield 'load_settings.{}.warm'.format(count), best(load, number=number * 10)
+    finally:
+        config.printer.stream = saved
+
+
+def bench_argbuilder(ws):
+    """Times building the arguments of 1000 tasks."""
+    tasks = make_tasks(1000)
+    compiled = argbuilder.compile(task_arg_map)
+    yield 'argbuilder.build', best(lambda: [argbuilder.build(task_arg_map, t) for t in tasks], number=5)
+    yield 'argbuilder.compiled', best(lambda: [compiled(t) for t in tasks], number=5)
+
+
+def bench_merge(ws):
+    """Times merging three nested configuration layers."""
+    layers = [make_layer(seed, 16, 3, overlap) for seed, overlap in ((0, 1.0), (1, 0.5), (2, 0.25))]
+    fn = merge.Merge(merge.full, merge.deep)
+
+    def run():
+        data = layers[0]
+        for layer in layers[1:]:
+            data = fn(data, layer)
+        return data
+    yield 'merge.deep', best(run, number=20)
+
+
+def bench_printer(ws):
+    """Times StylePrinter.write of short styled strings, per call."""
+    p = StylePrinter(StringIO(), stylesheet=default_stylesheet)
+
+    def run():
+        p.stream.seek(0)
+        p.stream.truncate()
+        for ii in range(1000):
+            p.write('heading', 'line {}', ii)
+            p.write('help', ' some help text\n')
+    yield 'printer.write', best(run, number=10) / 2000
+
+
+def bench_shell(ws):
+    """Times DcShell construction with the largest task catalog."""
+    settings = make_settings(task_counts[-1])
+    yield 'shell.init.{}'.format(task_counts[-1]), best(lambda: shell.DcShell(settings, stdin=StringIO()), number=20)
+
+
+def bench_onecmd(ws):
+    """Times DcShell.onecmd dispatch of a task, with docker-compose itself stubbed out."""
+    sh = shell.DcShell(make_settings(1000), stdin=StringIO())
+    saved = shell.run_compose
+    shell.run_compose = lambda *args, **kwargs: 0
+    try:
+        yield 'onecmd.task', best(lambda: sh.onecmd('task500 --verbose'), number=1000)
+    finally:
+        shell.run_compose = saved
+
+
+benchmarks = [bench_startup, bench_load_settings, bench_argbuilder, bench_merge, bench_printer, bench_shell,
+              bench_onecmd]
+
+
+def run(pattern=None):
+    """Runs the benchmarks whose results match pattern, and returns a dict of name -> seconds."""
+    results = {}
+    with Workspace() as ws:
+        for bench in benchmarks:
+            for name, elapsed in bench(ws):
+                if pattern is None or re.search(pattern, name):
+                    results[name] = elapsed
+                    print('{:<28} {:>12.3f} us'.format(name, elapsed * 1000000))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns (name, result, baseline) for each result slower than baseline by more than tolerance."""
+    return [(name, results[name], baseline[name]) for name in sorted(results)
+            if name in baseline and results[name] > baseline[name] * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser('python -m benchmarks.suite')
+    parser.add_argument('--baseline', default=default_baseline, help='baseline results file')
+    parser.add_argument('--save', default=False, action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', default=0.25, type=float,
+                        help='allowed slowdown relative to the baseline (default: 0.25)')
+    parser.add_argument('pattern', nargs='?', default=None, help='only run benchmarks matching this regex')
+    args = parser.parse_args()
+
+    results = run(args.pattern)
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True, separators=(',', ': '))
+            f.write('\n')
+        print('Baseline saved to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}; run with --save to create one.'.format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, result, expected in regressions:
+        print('REGRESSION {}: {:.3f} us, baseline {:.3f} us ({:+.0f}%)'.format(
+            name, result * 1000000, expected * 1000000, (result / expected - 1) * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
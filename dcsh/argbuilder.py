@@ -1,14 +1,98 @@
 """Utility for building CLI argument sets from dicionary data."""
 
+from string import Formatter
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+# placeholders for the {k} and {v} fields of pre-parsed templates
+_key = object()
+_value = object()
 
-def arg(*fmt):
-    """Returns all provided formats for value, if value is truthy."""
 
-    def fn(value):
+def _compile_template(fmt):
+    """Pre-parses a format template into a function of (k, v).
+
+    Templates made of literal text and plain {k} and {v} fields are rendered by
+    concatenation; anything else falls back to str.format.
+    """
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(fmt):
+        if literal:
+            parts.append(literal)
+        if field is not None:
+            if field not in ('k', 'v') or spec or conversion:
+                fmt_format = fmt.format
+                return lambda k, v: fmt_format(k=k, v=v)
+            parts.append(_key if field == 'k' else _value)
+
+    # specialize the common shapes: '-d', '{v}', '--name {v}' and '{k}={v}'
+    if not parts:
+        return lambda k, v: ''
+    if len(parts) == 1 and isinstance(parts[0], string_types):
+        literal = parts[0]
+        return lambda k, v: literal
+    if parts == [_value]:
+        return lambda k, v: str(v)
+    if len(parts) == 2 and isinstance(parts[0], string_types) and parts[1] is _value:
+        literal = parts[0]
+        return lambda k, v: literal + str(v)
+    if len(parts) == 3 and parts[0] is _key and isinstance(parts[1], string_types) and parts[2] is _value:
+        literal = parts[1]
+        return lambda k, v: str(k) + literal + str(v)
+
+    def render(k, v):
+        return ''.join([str(k) if p is _key else str(v) if p is _value else p for p in parts])
+    return render
+
+
+class ArgFormat(object):
+    """Callable that formats a value into a list of arguments; see arg, dict_arg, iter_arg, multi_arg."""
+
+    def __init__(self, kind, fmt):
+        """Creates a formatter of a given kind ('arg', 'dict', 'iter' or 'multi') for templates fmt."""
+        self.kind = kind
+        self.fmt = fmt
+        self._renderers = [_compile_template(f) for f in fmt]
+        self._dispatch = {}
+        self._fn = getattr(self, '_' + kind)
+
+    def __call__(self, value):
+        """Returns the list of arguments for value."""
+        return self._fn(value)
+
+    def _arg(self, value):
         if value:
-            return [f.format(v=value) for f in fmt]
+            return [r(None, value) for r in self._renderers]
         return []
-    return fn
+
+    def _dict(self, value):
+        return [r(k, v) for k, v in value.items() for r in self._renderers]
+
+    def _iter(self, value):
+        return [r(None, v) for v in value for r in self._renderers]
+
+    def _multi(self, value):
+        fn = self._dispatch.get(type(value))
+        if fn is None:
+            if isinstance(value, string_types):
+                fn = self._arg
+            elif hasattr(value, 'items'):
+                fn = self._dict
+            elif hasattr(value, '__iter__'):
+                fn = self._iter
+            else:
+                fn = self._arg
+            self._dispatch[type(value)] = fn
+        return fn(value)
+
+
+def arg(*fmt):
+    """Returns all provided formats for value, if value is truthy."""
+    return ArgFormat('arg', fmt)
 
 
 def dict_arg(*fmt):
@@ -16,10 +100,7 @@ def dict_arg(*fmt):
 
     Value must be dict, or a type that supports .items().
     """
-
-    def fn(value):
-        return [f.format(v=v, k=k) for k, v in value.items() for f in fmt]
-    return fn
+    return ArgFormat('dict', fmt)
 
 
 def iter_arg(*fmt):
@@ -27,10 +108,7 @@ def iter_arg(*fmt):
 
     Value must be an iterable type.
     """
-
-    def fn(value):
-        return [f.format(v=v) for v in value for f in fmt]
-    return fn
+    return ArgFormat('iter', fmt)
 
 
 def multi_arg(*fmt):
@@ -40,19 +118,10 @@ def multi_arg(*fmt):
     - dict-like object: dict_arg
     - iterables (non-string): iter_arg
     - strings and all other types: arg
-    """
 
-    def fn(value):
-        if isinstance(value, str):
-            return arg(*fmt)(value)
-        try:
-            return dict_arg(*fmt)(value)
-        except AttributeError:
-            try:
-                return iter_arg(*fmt)(value)
-            except TypeError:
-                return arg(*fmt)(value)
-    return fn
+    The rule for each value type is resolved once, and remembered.
+    """
+    return ArgFormat('multi', fmt)
 
 
 def build(argmap, data):
@@ -67,7 +136,35 @@ def build(argmap, data):
     """
 
     args = []
-    for name, fn in argmap.iteritems():
+    for name, fn in argmap.items():
         if name in data:
             args += fn(data[name])
     return args
+
+
+class ArgBuilder(object):
+    """An argmap compiled for repeated use; calling it is equivalent to build(argmap, data)."""
+
+    def __init__(self, argmap):
+        """Compiles argmap, a mapping of keys to argbuilder functions."""
+        self._fns = {}
+        self._order = {}
+        for index, (name, fn) in enumerate(argmap.items()):
+            self._fns[name] = getattr(fn, '_fn', fn)  # skip the ArgFormat call indirection
+            self._order[name] = index
+
+    def __call__(self, data):
+        """Builds an array of arguments from data, visiting only the keys present in it."""
+        fns = self._fns
+        names = [name for name in data if name in fns]
+        if len(names) > 1:
+            names.sort(key=self._order.__getitem__)
+        args = []
+        for name in names:
+            args += fns[name](data[name])
+        return args
+
+
+def compile(argmap):
+    """Returns an ArgBuilder for argmap."""
+    return ArgBuilder(argmap)
@@ -0,0 +1,69 @@
+"""Persistent on-disk cache for data that is expensive to derive."""
+
+import os
+import errno
+import hashlib
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# bump whenever the layout of any cached entry changes
+CACHE_VERSION = 4
+
+
+def cache_dir():
+    """Returns the dcsh cache directory, honoring XDG_CACHE_HOME."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'dcsh')
+
+
+def entry_name(prefix, ident):
+    """Returns a filesystem-safe cache entry name for an arbitrary identifier."""
+    if not isinstance(ident, bytes):
+        ident = ident.encode('utf-8')
+    return '{}-{}'.format(prefix, hashlib.sha1(ident).hexdigest()[:16])
+
+
+def load(name, key):
+    """Returns the value stored under name if its key matches; None otherwise."""
+    try:
+        with open(os.path.join(cache_dir(), name), 'rb') as f:
+            version, stored_key, value = pickle.load(f)
+    except Exception:
+        return None  # missing, unreadable, or corrupt entries are all misses
+    if version != CACHE_VERSION or stored_key != key:
+        return None
+    return value
+
+
+def store(name, key, value):
+    """Atomically stores value under name; failures are silently ignored."""
+    path = cache_dir()
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        fd, tmp_path = tempfile.mkstemp(dir=path, prefix='.' + name)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((CACHE_VERSION, key, value), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, os.path.join(path, name))
+    except (IOError, OSError, pickle.PicklingError):
+        pass
+
+
+def invalidate(prefix):
+    """Removes all cache entries whose names start with prefix."""
+    path = cache_dir()
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
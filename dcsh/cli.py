@@ -3,36 +3,77 @@
 import os
 import sys
 import argparse
-from .config import load_settings
-from .settings import printer
-from .shell import DcShell
+from .client import run_remote
 
 
-def main():
-    """Entry point for CLI.
-
-    Argument parsing, I/O configuration, and subcommmand dispatch are conducted here.
-    """
-    # configure parser
+def make_parser():
+    """Returns the command line parser."""
     parser = argparse.ArgumentParser('Shell wrapper for docker-compose')
     parser.add_argument('--no-color', default=False, action='store_true', help='turns off ANSI colors')
     parser.add_argument('-s', '--sudo', default=False, action='store_true', help='run docker-compose using sudo')
     parser.add_argument('-d', '--debug', default=False, action='store_true', help='enable debug output')
+    parser.add_argument('-j', '--jobs', default=None, type=int, help='maximum number of commands run in parallel')
+    parser.add_argument('--stream', default=False, action='store_true',
+                        help='highlight output of long-running docker-compose commands')
+    parser.add_argument('--refresh-commands', default=False, action='store_true',
+                        help='re-scrape the docker-compose command list instead of using the cache')
+    parser.add_argument('--profile', default=None, metavar='PREFIX',
+                        help='profile startup and each command, writing PREFIX.*.pstats and .callgrind files')
+    parser.add_argument('--trace', default=None, metavar='FILE',
+                        help='write a Chrome trace-event file of startup and command phases on exit')
+    parser.add_argument('--server', default=False, action='store_true',
+                        help='keep settings loaded, and serve -c commands run in this directory')
+    parser.add_argument('--no-server', default=False, action='store_true',
+                        help='run -c commands in this process, even if a server is running')
     parser.add_argument('-c', '--command', default=None, action='append', help='executes a command and exits')
+    return parser
+
 
+def main():
+    """Entry point for CLI.
+
+    Argument parsing, I/O configuration, and subcommmand dispatch are conducted here.
+    """
     # parse args and clean up flags
-    args = parser.parse_args()
+    args = make_parser().parse_args()
     if os.fstat(0) != os.fstat(1):
         args.no_color = True  # turn off ansi color on redirect
 
+    # commands are handed to a running server if there is one
+    if args.command and not (args.server or args.no_server or args.refresh_commands or args.profile or args.trace):
+        returncode = run_remote(sys.argv[1:] + (['--no-color'] if args.no_color else []))
+        if returncode is not None:
+            return returncode
+    return run(args)
+
+
+def run(args):
+    """Loads settings and runs the shell, the -c commands, or a server, in this process."""
+    # imported here, so that commands sent to a server do not pay for them
+    from .config import load_settings
+    from .config import reload_settings
+    from .settings import printer
+    from .settings import settings
+    from .shell import DcShell
+    from .profiling import Profiler
+    from .timing import timer
+
+    profiler = Profiler(args.profile)
+    if args.trace:
+        timer.enabled = True
+
     # load+validate settings, and run command
     try:
-        load_settings(**vars(args))
-        sh = DcShell()
+        with profiler.section('startup'):
+            load_settings(**vars(args))
+            sh = DcShell(reloader=reload_settings, profiler=profiler if args.profile else None)
+        if args.server:
+            from .server import serve
+            return serve(sh, run_request)
         if args.command:
-            for cmd_text in args.command:
-                result = sh.onecmd(cmd_text)
-            return result
+            # a lone command can replace this process outright, unless it is being measured
+            settings['oneshot'] = len(args.command) == 1 and not (args.profile or args.trace)
+            return run_commands(sh, args.command)
         else:
             return sh.cmdloop()
     except Exception as e:
@@ -40,7 +81,40 @@ def main():
             raise
         printer.error('Error: {}', str(e)).newline()
         sys.exit(1)
+    finally:
+        printer.flush()
+        if args.trace:
+            timer.write_trace(args.trace)
+
+
+def run_commands(sh, commands):
+    """Runs commands in a shell, then stops its background jobs; returns the last exit code."""
+    for cmd_text in commands:
+        sh.onecmd(cmd_text)
+    sh.jobs.close()
+    return sh.returncode
+
+
+def run_request(sh, argv):
+    """Runs the commands of a client's argv in a server's shell; returns the exit code.
+
+    Options that load_settings would apply are applied to the shell's settings instead.
+    """
+    from .settings import printer
+    from .settings import settings
+
+    args = make_parser().parse_args(argv)
+    if args.debug:
+        settings['debug'] = sh.debug = True
+    if args.sudo:
+        settings['sudo'] = True
+    if args.jobs:
+        settings['jobs'] = args.jobs
+    if args.stream:
+        settings['stream_output'] = True
+    printer.ansimode = not args.no_color
+    return run_commands(sh, args.command or [])
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
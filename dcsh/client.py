@@ -0,0 +1,103 @@
+"""Thin client for a dcsh server, and the protocol they share.
+
+This module is imported before anything else on every `dcsh -c` run, so it must stay
+cheap to import: nothing beyond the standard library and dcsh.cache.
+
+A client first passes its stdin, stdout and stderr to the server, so that the commands
+it runs use the client's terminal or pipes directly.  Everything else goes in frames of a
+one byte channel and a four byte length, followed by that many bytes: the client sends
+an 'r' with its argv, working directory and environment as JSON, and an 'i' for every
+CTRL+C; the server answers with an 'x' with the exit code.
+"""
+
+import os
+import sys
+import json
+import errno
+import signal
+import socket
+import struct
+from . import cache
+
+server_cache_prefix = 'server'
+
+frame_header = struct.Struct('!cI')
+
+
+def socket_path(directory=None):
+    """Returns the path of the server socket for a project directory, by default the current one."""
+    directory = os.path.abspath(directory or os.getcwd())
+    return os.path.join(cache.cache_dir(), cache.entry_name(server_cache_prefix, directory) + '.sock')
+
+
+def send_frame(sock, channel, data):
+    """Writes a single frame to sock."""
+    sock.sendall(frame_header.pack(channel, len(data)) + data)
+
+
+def recv_exactly(sock, size):
+    """Reads exactly size bytes from sock; returns fewer only if the connection closed."""
+    chunks = []
+    while size:
+        try:
+            data = sock.recv(min(size, 65536))
+        except socket.error as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return ''.join(chunks)
+
+
+def run_remote(argv):
+    """Runs dcsh with argv on the server for the current directory; returns its exit code.
+
+    Returns None, without doing anything, if no server is running, or if this Python
+    cannot pass file descriptors.
+    """
+    try:
+        # private to CPython, and only there where passing file descriptors is supported
+        from _multiprocessing import sendfd
+    except ImportError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path())
+    except socket.error as e:
+        sock.close()
+        if e.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+
+    def interrupt(signum, frame):
+        try:
+            send_frame(sock, 'i', '')  # the request gets the CTRL+C instead
+        except socket.error:
+            pass  # the server is gone, which the loop below notices
+
+    previous = signal.getsignal(signal.SIGINT)
+    try:
+        for fd in (0, 1, 2):
+            sendfd(sock.fileno(), fd)
+        request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}
+        send_frame(sock, 'r', json.dumps(request))
+        signal.signal(signal.SIGINT, interrupt)
+        while True:
+            header = recv_exactly(sock, frame_header.size)
+            if len(header) < frame_header.size:
+                break
+            channel, size = frame_header.unpack(header)
+            data = recv_exactly(sock, size)
+            if channel == 'x':
+                return int(data)
+    except EnvironmentError as e:
+        if e.errno not in (errno.ECONNRESET, errno.EPIPE):
+            raise
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        sock.close()  # the server stops the request when it sees the client go
+    sys.stderr.write('dcsh: lost connection to server\n')
+    return 1
@@ -0,0 +1,154 @@
+"""Tab completion for the shell: command names, and context-aware arguments."""
+
+import os
+import time
+import bisect
+import subprocess
+from . import yamlload
+from .compose import compose_command
+from .config import config_sources
+from .watch import stat_key
+
+# docker-compose commands whose arguments are service names
+service_commands = frozenset([
+    'build', 'config', 'create', 'events', 'images', 'kill', 'logs', 'pause', 'port', 'ps',
+    'pull', 'push', 'restart', 'rm', 'run', 'start', 'stop', 'top', 'unpause', 'up',
+])
+
+# docker-compose commands that only make sense for running services
+running_commands = frozenset(['exec', 'kill', 'logs', 'pause', 'port', 'restart', 'stop', 'top'])
+
+# commands that take a single service, followed by a command to run inside it
+single_service_commands = frozenset(['exec', 'port', 'run'])
+
+
+class PrefixIndex(object):
+    """Sorted set of names that can be searched by prefix in logarithmic time."""
+
+    def __init__(self, names):
+        """Creates an index over names; duplicates are removed."""
+        self.names = sorted(set(names))
+
+    def match(self, prefix):
+        """Returns all indexed names that start with prefix, in sorted order."""
+        names = self.names
+        start = end = bisect.bisect_left(names, prefix)
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+
+class Completer(object):
+    """Completion engine for a shell's settings.
+
+    Command names are served from a PrefixIndex that is built once and kept until
+    invalidate() is called.  Services are read from the compose file and reused until it
+    changes on disk.  Running services come from `docker-compose ps`, cached for
+    settings['completion_ttl'] seconds.
+    """
+
+    def __init__(self, settings, builtins):
+        """Creates a completer for settings, and the names of built-in shell commands."""
+        self.settings = settings
+        self.builtins = list(builtins)
+        self._index = None
+        self._services = (None, PrefixIndex([]))  # (compose file stat key, index)
+        self._running = (None, PrefixIndex([]))  # (expiry time, index)
+
+    def invalidate(self):
+        """Discards the index of command names, after tasks or commands change."""
+        self._index = None
+
+    def names(self, prefix):
+        """Returns the built-in commands, docker-compose commands, and tasks starting with prefix."""
+        if self._index is None:
+            self._index = PrefixIndex(
+                self.builtins + list(self.settings['dc_commands']) + list(self.settings['tasks']))
+        return self._index.match(prefix)
+
+    def projects(self, text):
+        """Returns completions for an '@project,...' prefix."""
+        return self._fan_out(text, '@', list(self.settings['projects']) + ['all'])
+
+    def host_groups(self, text):
+        """Returns completions for a '%group,...' prefix."""
+        return self._fan_out(text, '%', self.settings['host_groups'])
+
+    def _fan_out(self, text, sigil, names):
+        """Returns completions from names for a comma separated list that follows sigil.
+
+        Depending on the completer delimiters, text is either the whole list with its sigil,
+        or just the last name in it.
+        """
+        head, sep, tail = text.rpartition(',')
+        prefix = sigil if not sep and tail.startswith(sigil) else ''
+        tail = tail[len(prefix):]
+        return [head + sep + prefix + name for name in sorted(names) if name.startswith(tail)]
+
+    def services(self, prefix):
+        """Returns the services defined in the compose file that start with prefix."""
+        compose_file = config_sources()[-1]
+        key = stat_key(compose_file)
+        if key != self._services[0]:
+            services = []
+            if key is not None:
+                try:
+                    with open(compose_file) as f:
+                        services = list(yamlload.load_key(f, 'services') or {})
+                except Exception:
+                    pass  # an unreadable compose file just has nothing to offer
+            self._services = (key, PrefixIndex(services))
+        return self._services[1].match(prefix)
+
+    def running_services(self, prefix):
+        """Returns the services with running containers that start with prefix."""
+        expiry, index = self._running
+        now = time.time()
+        if expiry is None or now >= expiry:
+            index = PrefixIndex(self._ps())
+            self._running = (now + self.settings['completion_ttl'], index)
+        return index.match(prefix)
+
+    def _ps(self):
+        """Returns the names of running services, according to docker-compose."""
+        cmd = compose_command('ps', '--services', '--filter', 'status=running')
+        try:
+            with open(os.devnull, 'w') as devnull:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=devnull, close_fds=True)
+                output = process.communicate()[0]
+        except OSError:
+            return []
+        if process.returncode != 0:
+            return []
+        return output.split()
+
+    def arguments(self, text, line, begidx):
+        """Returns completions for the argument at begidx of line, that starts with text."""
+        words = line[:begidx].split()
+        if words and words[0].startswith(('@', '%')):
+            if len(words) == 1 and not line[:begidx].endswith(' '):
+                # still in the '@project,...' or '%group,...' prefix
+                return self.projects(text) if words[0].startswith('@') else self.host_groups(text)
+            words = words[1:]
+            if not words:
+                return self.names(text)
+        if words and words[0] == 'bg':
+            words = words[1:]  # 'bg' runs a task or command line
+            if not words:
+                return self.names(text)
+        if words and words[0] == 'dc':
+            words = words[1:]  # 'dc' passes its arguments straight through
+            if not words:
+                return sorted(name for name in self.settings['dc_commands'] if name.startswith(text))
+        if not words or text.startswith('-'):
+            return []
+        command = words[0]
+        if command == 'parallel':
+            return self.names(text)
+        if command in single_service_commands and [w for w in words[1:] if not w.startswith('-')]:
+            return []  # past the service, into the command run inside it
+        if command in running_commands:
+            return self.running_services(text)
+        if command in service_commands:
+            return self.services(text)
+        return []
@@ -1,20 +1,56 @@
 """Module for running docker-compose related commands."""
 
+import os
 import re
+import sys
 import subprocess
+from . import cache
 from .settings import settings
 from .settings import printer
+from .highlight import Highlighter
+from .querycache import query_cache
+from .stats import Invocation
+from .stats import stats
 
 dc_cmd_expr = re.compile(r'\s*(\w+)\s*(.+)$')
 
+commands_cache_prefix = 'commands'
 
-def get_docker_compose_commands():
-    """Scrapes docker-compose help output to get command names and help text."""
+# read size for streamed output
+stream_chunk_size = 65536
 
-    commands = {}
-    sh = subprocess.Popen(settings['dc_path'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    _, text = sh.communicate()
+# partial lines longer than this are written out without waiting for a newline
+stream_max_line = 1024 * 1024
+
+# (rules, Highlighter) for the most recently used highlight rules
+_highlighter = [None, None]
+
+
+def resolve_executable(name):
+    """Returns the absolute path for an executable name, searching PATH; None if not found."""
+    if os.path.dirname(name):
+        return os.path.abspath(name) if os.access(name, os.X_OK) else None
+    for path in os.environ.get('PATH', os.defpath).split(os.pathsep):
+        candidate = os.path.join(path, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def dc_fingerprint(dc_path):
+    """Returns a key identifying the resolved docker-compose binary; None if it cannot be found."""
+    resolved = resolve_executable(dc_path)
+    if resolved is None:
+        return None
+    resolved = os.path.realpath(resolved)
+    st = os.stat(resolved)
+    return (resolved, st.st_size, st.st_mtime)
 
+
+def parse_docker_compose_help(text):
+    """Parses docker-compose help output into a dict of command names and help text."""
+
+    commands = {}
     lines = text.splitlines()
     for ii in range(len(lines)):
         if lines[ii] == 'Commands:':
@@ -26,13 +62,254 @@ def get_docker_compose_commands():
     return commands
 
 
-def run_compose(*args):
-    """Runs docker-compose with the specified args."""
+def scrape_docker_compose_commands(dc_path):
+    """Scrapes docker-compose help output to get command names and help text."""
+
+    sh = subprocess.Popen(dc_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, text = sh.communicate()
+    return parse_docker_compose_help(text)
+
+
+class CommandScrape(object):
+    """Background scrape of the docker-compose command table.
+
+    The cache is consulted on construction; on a miss, docker-compose is spawned right
+    away and left running, so that other startup work can overlap with it. Call result()
+    to join on the child and obtain the commands.
+    """
+
+    def __init__(self, dc_path, refresh=False):
+        """Starts a scrape for the given docker-compose path."""
+        self.dc_path = dc_path
+        self.commands = None
+        self.process = None
+        self.error = None
+        self.key = dc_fingerprint(dc_path)
+        if self.key is not None:
+            self.name = cache.entry_name(commands_cache_prefix, self.key[0])
+            if not refresh:
+                self.commands = cache.load(self.name, self.key)
+        if self.commands is None:
+            try:
+                self.process = subprocess.Popen(dc_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except OSError as e:
+                self.error = e  # deferred so that speculative scrapes can be discarded quietly
+
+    def result(self):
+        """Waits for the scrape to finish and returns the command table."""
+        if self.commands is None:
+            if self.error is not None:
+                raise self.error
+            _, text = self.process.communicate()
+            self.commands = parse_docker_compose_help(text)
+            if self.commands and self.key is not None:
+                cache.store(self.name, self.key, self.commands)
+        return self.commands
+
+    def cancel(self):
+        """Abandons the scrape, terminating the child if it is still running."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.communicate()
+        self.process = None
+
+
+def get_docker_compose_commands(refresh=False):
+    """Returns docker-compose command names and help text.
+
+    Results are cached on disk, keyed on the resolved docker-compose binary, so the help
+    output is only scraped when the binary changes or when refresh is set.
+    """
+    return CommandScrape(settings['dc_path'], refresh).result()
+
+
+def clear_commands_cache():
+    """Discards all cached docker-compose command tables."""
+    cache.invalidate(commands_cache_prefix)
+
+
+def compose_command(*args, **kwargs):
+    """Returns the argv for running docker-compose with the specified args.
+
+    The dc_path and sudo settings are taken from the optional config keyword argument,
+    and from the global settings otherwise.
+    """
+
+    config = kwargs.get('config', settings)
+    cmd = [config['dc_path']] + list(args)
+    if config['sudo']:
+        cmd = ['sudo'] + cmd
+    return cmd
+
+
+def docker_command(*args, **kwargs):
+    """Returns the argv for running docker with the specified args.
 
-    cmd = ['docker-compose'] + list(args)
-    if settings['sudo']:
+    The docker_path and sudo settings are taken from the optional config keyword argument,
+    and from the global settings otherwise.
+    """
+
+    config = kwargs.get('config', settings)
+    cmd = [config['docker_path']] + list(args)
+    if config['sudo']:
         cmd = ['sudo'] + cmd
+    return cmd
+
+
+def select_hosts(spec):
+    """Returns the Docker hosts in the comma separated host groups named by spec, without duplicates.
+
+    Groups are configured in the host_groups setting, as lists of DOCKER_HOST values.
+    Raises an exception for unknown groups.
+    """
+
+    hosts = []
+    for group in [group for group in spec.split(',') if group]:
+        if group not in settings['host_groups']:
+            raise Exception('Unknown host group: {}'.format(group))
+        for host in settings['host_groups'][group]:
+            if host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+def exit_code(status):
+    """Converts a wait() status into an exit code, 128 + N for a child killed by signal N, as shells do."""
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def shell_code(returncode):
+    """Converts a subprocess return code, negative for a child killed by a signal, as exit_code does."""
+    return 128 - returncode if returncode < 0 else returncode
+
+
+def spawn(cmd, invocation=None):
+    """Runs cmd directly, without a shell, and returns its exit code.
+
+    If an Invocation is given, the moment the child process is created is marked on it.
+    """
+
+    if hasattr(os, 'posix_spawnp'):
+        pid = os.posix_spawnp(cmd[0], cmd, os.environ)
+        if invocation is not None:
+            invocation.mark_spawned()
+        return exit_code(os.waitpid(pid, 0)[1])
+    sh = subprocess.Popen(cmd)
+    if invocation is not None:
+        invocation.mark_spawned()
+    return shell_code(sh.wait())
+
+
+def get_highlighter():
+    """Returns a Highlighter for the configured highlight rules, compiling them only once."""
+    rules = settings['highlights']
+    if _highlighter[0] is not rules:
+        _highlighter[:] = [rules, Highlighter(rules, printer)]
+    return _highlighter[1]
+
+
+def stream_compose(cmd, highlighter, out, invocation=None):
+    """Runs cmd with stdout and stderr piped through highlighter to out; returns its exit code.
+
+    Output is read in large chunks and highlighted a chunk of complete lines at a time.
+    At most stream_max_line bytes of an unterminated line are held back.
+
+    If an Invocation is given, the moment the child process is created is marked on it.
+    """
+
+    sh = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if invocation is not None:
+        invocation.mark_spawned()
+    fd = sh.stdout.fileno()
+    partial = ''
+    while True:
+        data = os.read(fd, stream_chunk_size)
+        if not data:
+            break
+        if partial:
+            data = partial + data
+        cut = data.rfind('\n') + 1
+        if cut == 0:
+            if len(data) < stream_max_line:
+                partial = data
+                continue
+            cut = len(data)
+        partial = data[cut:]
+        out.write(highlighter.apply(data[:cut]))
+        out.flush()
+    if partial:
+        out.write(highlighter.apply(partial))
+        out.flush()
+    sh.stdout.close()
+    return shell_code(sh.wait())
+
+
+def capture_compose(cmd, out, invocation=None):
+    """Runs cmd with stdout copied to out as it arrives; returns (exit code, stdout text).
+
+    If an Invocation is given, the moment the child process is created is marked on it.
+    """
+
+    sh = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    if invocation is not None:
+        invocation.mark_spawned()
+    fd = sh.stdout.fileno()
+    chunks = []
+    while True:
+        data = os.read(fd, stream_chunk_size)
+        if not data:
+            break
+        chunks.append(data)
+        out.write(data)
+        out.flush()
+    sh.stdout.close()
+    return shell_code(sh.wait()), ''.join(chunks)
+
+
+def run_compose(*args, **kwargs):
+    """Runs docker-compose with the specified args, and returns its exit code.
+
+    Commands configured in query_cache have their output cached for the configured
+    number of seconds, unless the fresh keyword argument is set.  Running a mutating
+    command discards all cached output.
+
+    When stream_output is enabled, commands listed in stream_commands have their output
+    highlighted by dcsh.  Otherwise, in one-shot mode, the docker-compose process replaces
+    this one, so that the exit code is reported straight to the caller.
+
+    Each run is timed and recorded in dcsh.stats, under the optional label keyword
+    argument, or the docker-compose command name.
+    """
+
+    cmd = compose_command(*args)
+    query_cache.note(args)
+    ttl = 0 if settings.get('oneshot') else query_cache.ttl(args)
+    if ttl and not kwargs.get('fresh'):
+        output = query_cache.get(cmd)
+        if output is not None:
+            if settings['debug']:
+                printer.writeln('debug', 'Cached: {}', cmd)
+            printer.flush()
+            printer.stream.write(output)
+            printer.stream.flush()
+            return 0
     if settings['debug']:
         printer.writeln('debug', 'Running: {}', cmd)
-    sh = subprocess.Popen(' '.join(cmd), shell=True)
-    sh.communicate()
+    printer.flush()
+    invocation = Invocation(kwargs.get('label') or (args[0] if args else 'docker-compose'))
+    if ttl:
+        returncode, output = capture_compose(cmd, printer.stream, invocation)
+        if returncode == 0:
+            query_cache.put(cmd, output, ttl)
+    elif settings.get('stream_output') and args and args[0] in settings['stream_commands']:
+        returncode = stream_compose(cmd, get_highlighter(), printer.stream, invocation)
+    else:
+        if settings.get('oneshot'):
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.execvp(cmd[0], cmd)
+        returncode = spawn(cmd, invocation)
+    stats.record(invocation.finish(returncode))
+    return returncode
@@ -1,18 +1,33 @@
 """Configuration loading module."""
 
 import os
-import yaml
-import argbuilder
+import json
+import hashlib
 import shlex
-from .compose import get_docker_compose_commands
+from collections import Mapping
+from collections import namedtuple
+from . import __version__
+from . import cache
+from . import watch
+from . import yamlload
+from .compose import CommandScrape
+from .depgraph import find_cycle
 from .settings import default_settings
 from .settings import merge_settings
+from .settings import settings_strategies
 from .settings import run_defaults
 from .settings import exec_defaults
 from .settings import merge_task
-from .settings import task_arg_map
+from .settings import task_args
 from .settings import settings
 from .settings import printer
+from .timing import timer
+
+settings_cache_prefix = 'settings'
+project_cache_prefix = 'project'
+
+# state of the most recent load_settings, used by reload_settings
+live = {}
 
 
 def load_yaml(file_path):
@@ -20,53 +35,385 @@ def load_yaml(file_path):
 
     if os.path.exists(file_path):
         with open(file_path) as f:
-            return yaml.load(f.read())
+            return yamlload.load(f) or {}
+    return {}
+
+
+def load_yaml_key(file_path, key):
+    """Attempts to load only a top-level key of a YAML file; returns empty dict on failure.
+
+    Unlike load_yaml, the rest of the document is never materialized.
+    """
+
+    if os.path.exists(file_path):
+        with open(file_path) as f:
+            return yamlload.load_key(f, key) or {}
     return {}
 
 
-def load_settings(sudo, debug, no_color, **kwargs):
-    """Loads settings, merging all available configration sources."""
+def config_sources(directory=None):
+    """Returns the configuration file paths in merge order.
 
-    data = merge_settings(default_settings, load_yaml('/etc/dcsh.yml'))
+    Project files are looked up in directory if given, and the current directory otherwise.
+    """
+    sources = ['/etc/dcsh.yml']
     if 'HOME' in os.environ:
-        data = merge_settings(data, load_yaml(os.environ['HOME'] + '/.dcsh.yml'))
-    data = merge_settings(data, load_yaml('.dcsh.yml'))
-    dc_config = load_yaml('./docker-compose.yml')
-    data = merge_settings(data, dc_config.get('x-dcsh', {}))
+        sources.append(os.environ['HOME'] + '/.dcsh.yml')
+    if directory is None:
+        sources.append('.dcsh.yml')
+        sources.append('./docker-compose.yml')
+    else:
+        sources.append(os.path.join(directory, '.dcsh.yml'))
+        sources.append(os.path.join(directory, 'docker-compose.yml'))
+    return sources
 
-    # TODO: use some schema validation here
-    settings.clear()
-    settings.update(data)
 
+def file_fingerprint(file_path):
+    """Returns (path, mtime, size, hash) for a file; None if it does not exist."""
+    try:
+        st = os.stat(file_path)
+        with open(file_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+    return (os.path.abspath(file_path), st.st_mtime, st.st_size, digest)
+
+
+def schema_fingerprint():
+    """Returns a digest of the defaults and merge rules that compiled settings are built with.
+
+    Snapshots are keyed on it, so that upgrading dcsh never reuses settings compiled by
+    another version, even if no configuration file changed.
+    """
+    schema = {
+        'version': __version__,
+        'defaults': default_settings,
+        'strategies': dict((key, fn.__name__) for key, fn in settings_strategies.items()),
+        'run_defaults': run_defaults,
+        'exec_defaults': exec_defaults,
+    }
+    return hashlib.sha1(json.dumps(schema, sort_keys=True)).hexdigest()
+
+
+def snapshot_key(sources):
+    """Returns the snapshot cache key for settings compiled from the configuration sources."""
+    return (schema_fingerprint(),) + tuple(file_fingerprint(file_path) for file_path in sources)
+
+
+def compile_task(value, environment):
+    """Normalizes a single task definition into its full form, including compiled_args."""
+
+    if value.get('exec', False):
+        taskdef = dict(exec_defaults)
+        taskdef['compiled_args'] = ['exec']
+    else:
+        taskdef = dict(run_defaults)
+        taskdef['compiled_args'] = ['run']
+    taskdef['environment'] = environment
+    taskdef = merge_task(taskdef, value)
+    if isinstance(taskdef['args'], str):
+        taskdef['args'] = shlex.split(taskdef['args'])
+    if isinstance(taskdef['depends'], str):
+        taskdef['depends'] = taskdef['depends'].split()
+    taskdef['compiled_args'] += \
+        task_args(taskdef) + \
+        [taskdef['service']] + \
+        taskdef['args']
+    return taskdef
+
+
+class TaskTable(Mapping):
+    """Read-only mapping of task names to task definitions, compiled on first access.
+
+    The merged definitions are kept as they are, so that names, help text and
+    dependencies are available without compiling anything.  Compiled tasks are memoized.
+    """
+
+    def __init__(self, definitions, environment, compiled=None):
+        """Creates a table for merged task definitions and the global task environment."""
+        self.definitions = definitions
+        self.environment = environment
+        self._compiled = compiled or {}
+
+    def __getitem__(self, name):
+        taskdef = self._compiled.get(name)
+        if taskdef is None:
+            definition = self.definitions[name]
+            try:
+                taskdef = compile_task(definition, self.environment)
+            except Exception as e:
+                # not a KeyError, which would make the task look like it does not exist
+                raise Exception('Invalid task "{}": {}'.format(name, e))
+            self._compiled[name] = taskdef
+        return taskdef
+
+    def __iter__(self):
+        return iter(self.definitions)
+
+    def __len__(self):
+        return len(self.definitions)
+
+    def __contains__(self, name):
+        return name in self.definitions
+
+    def help(self, name):
+        """Returns the help text of a task, or None."""
+        return self.definitions[name].get('help')
+
+    def depends(self, name):
+        """Returns the names of the tasks that a task depends on."""
+        depends = self.definitions[name].get('depends') or []
+        if isinstance(depends, str):
+            return depends.split()
+        return depends
+
+
+# names of tasks that were added, removed, or replaced by a recompile, and whether the
+# docker-compose command set changed
+Changes = namedtuple('Changes', 'added removed replaced commands')
+
+
+class SettingsCompiler(object):
+    """Merges configuration sources into settings, and recompiles them incrementally.
+
+    Every source is kept as a layer alongside the merge of all layers up to it, so that a
+    changed source is re-read and merged over the unchanged layers before it, without
+    touching any other file.  Tasks are compiled lazily by a TaskTable; on an update,
+    compiled tasks are kept unless their merged definition or the environment changed,
+    and changed ones are only recompiled to see whether they were effectively replaced.
+    """
+
+    def __init__(self, sources):
+        """Creates a compiler for the configuration file paths in sources, in merge order."""
+        self.sources = list(sources)
+        self.layers = []
+        self.merged = []
+        self.data = None
+
+    def load_layer(self, index):
+        """Reads the source at index; only the x-dcsh key is read from the last one."""
+        file_path = self.sources[index]
+        with timer.phase('load ' + file_path):
+            if index == len(self.sources) - 1:
+                return load_yaml_key(file_path, 'x-dcsh')
+            return load_yaml(file_path)
+
+    def compile(self):
+        """Reads and merges all sources; returns the compiled settings."""
+        layers = [self.load_layer(ii) for ii in range(len(self.sources))]
+        self._commit(layers, self._merge(layers, 0))
+        return self.data
+
+    def update(self, paths):
+        """Re-reads the sources among paths, and recompiles whatever they affect.
+
+        Returns a Changes, or None if the settings did not change.  If a changed source
+        is invalid the exception propagates, and the current settings are kept.
+        """
+        layers = list(self.layers)
+        first = None
+        for ii, file_path in enumerate(self.sources):
+            if file_path in paths:
+                layers[ii] = self.load_layer(ii)
+                if first is None and layers[ii] != self.layers[ii]:
+                    first = ii
+        if first is None:
+            return None
+        return self._commit(layers, self._merge(layers, first))
+
+    def _merge(self, layers, first):
+        """Returns the running merges of layers, reusing the current ones before first."""
+        merged = self.merged[:first]
+        data = merged[-1] if merged else default_settings
+        with timer.phase('merge'):
+            for layer in layers[first:]:
+                data = merge_settings(data, layer)
+                merged.append(data)
+        return merged
+
+    def _commit(self, layers, merged):
+        """Indexes tasks for the merge result, and makes it current; returns a Changes."""
+        data = dict(merged[-1])
+        old_tasks = self.data['tasks'] if self.data else TaskTable({}, None)
+        same_environment = data['environment'] == old_tasks.environment
+
+        with timer.phase('index tasks'):
+            compiled = {}
+            replaced = []
+            for name, value in data['tasks'].items():
+                if name not in old_tasks:
+                    continue
+                if same_environment and old_tasks.definitions[name] == value:
+                    if name in old_tasks._compiled:
+                        compiled[name] = old_tasks._compiled[name]
+                    continue
+                if name not in old_tasks._compiled:
+                    replaced.append(name)  # never used, so not worth compiling to compare
+                    continue
+                taskdef = compile_task(value, data['environment'])
+                if taskdef == old_tasks._compiled[name]:
+                    compiled[name] = old_tasks._compiled[name]
+                else:
+                    compiled[name] = taskdef
+                    replaced.append(name)
+            tasks = TaskTable(data['tasks'], data['environment'], compiled)
+            check_task_dependencies(tasks)
+        data['tasks'] = tasks
+
+        self.layers = layers
+        self.merged = merged
+        self.data = data
+        return Changes(
+            sorted(name for name in tasks if name not in old_tasks),
+            sorted(name for name in old_tasks if name not in tasks),
+            sorted(replaced),
+            False)
+
+
+def compile_settings(sources):
+    """Merges all configuration sources and normalizes task definitions."""
+    return SettingsCompiler(sources).compile()
+
+
+def check_task_dependencies(tasks):
+    """Raises an exception if the dependencies in a TaskTable name unknown tasks or form a cycle."""
+
+    graph = dict((name, tasks.depends(name)) for name in tasks)
+    for name, depends in sorted(graph.items()):
+        for dep in depends:
+            if dep not in graph:
+                raise Exception('Task "{}" depends on unknown task "{}"'.format(name, dep))
+    cycle = find_cycle(graph)
+    if cycle:
+        raise Exception('Task dependency cycle: {}'.format(' -> '.join(cycle)))
+
+
+def load_project(directory):
+    """Returns the compiled settings for the compose project in directory.
+
+    Settings are compiled from the project's sources as with load_settings, and kept in
+    the snapshot cache.  No docker-compose command set is scraped for them.
+    """
+
+    sources = config_sources(directory)
+    key = snapshot_key(sources)
+    snapshot_name = cache.entry_name(project_cache_prefix, os.path.abspath(directory))
+    compiler = cache.load(snapshot_name, key)
+    if compiler is None:
+        compiler = SettingsCompiler(sources)
+        compiler.compile()
+        cache.store(snapshot_name, key, compiler)
+    return compiler.data
+
+
+def load_settings(sudo, debug, no_color, refresh_commands=False, jobs=None, stream=False, **kwargs):
+    """Loads settings, merging all available configration sources.
+
+    The docker-compose help scrape is started before the configuration is compiled so
+    that the two overlap. On a snapshot miss the scrape is started speculatively with
+    the default dc_path, and restarted if the configuration names a different one.
+
+    The configuration sources are watched from here on; see reload_settings.
+
+    Startup phases are timed if debug is set, or if the timer was already enabled.
+    """
+
+    timer.reset()
+    if debug:
+        timer.enabled = True
+    with timer.phase('snapshot lookup'):
+        sources = config_sources()
+        sources_watcher = watch.watcher(sources)
+        key = snapshot_key(sources)
+        snapshot_name = cache.entry_name(settings_cache_prefix, os.getcwd())
+        compiler = cache.load(snapshot_name, key)
+
+    scrape_start = timer.now()
+    scrape = CommandScrape(compiler.data['dc_path'] if compiler else default_settings['dc_path'],
+                           refresh_commands)
+    if compiler is None:
+        compiler = SettingsCompiler(sources)
+        compiler.compile()
+        with timer.phase('snapshot store'):
+            cache.store(snapshot_name, key, compiler)
+        if compiler.data['dc_path'] != scrape.dc_path:
+            scrape.cancel()
+            scrape_start = timer.now()
+            scrape = CommandScrape(compiler.data['dc_path'], refresh_commands)
+
+    # command line flags take precedence over configuration, including on reload
+    overrides = {}
     if debug:
-        settings['debug'] = True
+        overrides['debug'] = True
     if sudo:
-        settings['sudo'] = True
-
-    # normalize task definitions
-    for name, value in settings['tasks'].items():
-        if value.setdefault('exec', False):
-            taskdef = dict(exec_defaults)
-            taskdef['compiled_args'] = ['exec']
-        else:
-            taskdef = dict(run_defaults)
-            taskdef['compiled_args'] = ['run']
-        taskdef['environment'] = settings['environment']
-        taskdef = merge_task(taskdef, value)
-        if isinstance(taskdef['args'], str):
-            taskdef['args'] = shlex.split(taskdef['args'])
-        taskdef['compiled_args'] += \
-            argbuilder.build(task_arg_map, taskdef) + \
-            [taskdef['service']] + \
-            taskdef['args']
-        settings['tasks'][name] = taskdef
-
-    # supplement config with docker command set
-    commands = get_docker_compose_commands()
+        overrides['sudo'] = True
+    if jobs:
+        overrides['jobs'] = jobs
+    if stream:
+        overrides['stream_output'] = True
+
+    # TODO: use some schema validation here
+    settings.clear()
+    settings.update(compiler.data)
+    settings.update(overrides)
+
+    # configure printer
+    printer.ansimode = not no_color
+    printer.stylesheet = settings['stylesheet']
+
+    # supplement config with docker command set, joining on the scrape
+    with timer.phase('help scrape wait'):
+        commands = dict(scrape.result())
+    timer.record('help scrape', scrape_start, track='docker-compose')
     if 'help' in commands:
         del commands['help']  # 'help' is already provided elsewhere
     settings['dc_commands'] = commands
 
-    # configure printer
-    printer.ansimode = not no_color
+    if live.get('watcher'):
+        live['watcher'].close()
+    live.update(compiler=compiler, watcher=sources_watcher, overrides=overrides,
+                snapshot_name=snapshot_name)
+
+    if settings['debug']:
+        timer.report(printer)
+
+
+def reload_settings():
+    """Applies changes made to the configuration sources since they were last loaded.
+
+    Only the changed sources are re-read, and only the tasks they affect are recompiled.
+    Returns a Changes, or None if nothing changed.  If a changed source is invalid,
+    the exception propagates and the current settings are kept.
+    """
+
+    if not live:
+        return None
+    paths = live['watcher'].changed()
+    if not paths:
+        return None
+    reload_start = timer.now()
+    compiler = live['compiler']
+    changes = compiler.update(paths)
+    if changes is None:
+        return None
+
+    dc_path = settings['dc_path']
+    settings.update(compiler.data)
+    settings.update(live['overrides'])
     printer.stylesheet = settings['stylesheet']
+
+    with timer.phase('snapshot store'):
+        cache.store(live['snapshot_name'], snapshot_key(compiler.sources), compiler)
+
+    # the docker-compose commands are only scraped again if dc_path changes
+    if settings['dc_path'] != dc_path:
+        with timer.phase('help scrape'):
+            commands = dict(CommandScrape(settings['dc_path']).result())
+        commands.pop('help', None)
+        settings['dc_commands'] = commands
+        changes = changes._replace(commands=True)
+
+    timer.record('reload', reload_start)
+    if settings['debug']:
+        timer.report(printer, since=reload_start)
+    return changes
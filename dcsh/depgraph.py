@@ -0,0 +1,60 @@
+"""Utilities for dependency graphs of named nodes."""
+
+
+def find_cycle(graph):
+    """Returns a list of nodes forming a dependency cycle, or None if the graph is acyclic.
+
+    The returned list starts and ends with the same node.  Dependencies that are not
+    themselves nodes of the graph are ignored.
+    """
+
+    state = {}  # node -> 1 while on the DFS stack, 2 when done
+    for root in sorted(graph):
+        if root in state:
+            continue
+        state[root] = 1
+        path = [root]
+        stack = [iter(graph[root])]
+        while stack:
+            for dep in stack[-1]:
+                if dep not in graph:
+                    continue
+                if state.get(dep) == 1:
+                    return path[path.index(dep):] + [dep]
+                if dep not in state:
+                    state[dep] = 1
+                    path.append(dep)
+                    stack.append(iter(graph[dep]))
+                    break
+            else:
+                state[path.pop()] = 2
+                stack.pop()
+    return None
+
+
+def closure(depends, roots):
+    """Returns roots and everything they transitively depend on, dependencies first.
+
+    The depends argument is a function that returns the dependencies of a node.  The
+    graph must be acyclic.
+    """
+
+    order = []
+    seen = set()
+    for root in roots:
+        if root in seen:
+            continue
+        seen.add(root)
+        path = [root]
+        stack = [iter(depends(root))]
+        while stack:
+            for dep in stack[-1]:
+                if dep not in seen:
+                    seen.add(dep)
+                    path.append(dep)
+                    stack.append(iter(depends(dep)))
+                    break
+            else:
+                order.append(path.pop())
+                stack.pop()
+    return order
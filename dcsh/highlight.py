@@ -0,0 +1,47 @@
+"""Regex-based highlighting of command output."""
+
+import re
+
+
+class Highlighter(object):
+    """Applies highlight rules to text, styling every matching span.
+
+    Rules are dicts with a 'match' regular expression and the name of a 'style' in the
+    printer's stylesheet.  All rules are compiled into a single alternation, so text is
+    scanned once no matter how many rules there are; where rules overlap, the earliest
+    listed rule wins.  Patterns are compiled in multiline mode, so '^' and '$' match at
+    line boundaries.
+    """
+
+    def __init__(self, rules, printer):
+        """Compiles rules, to be rendered with the styles of printer."""
+        self.printer = printer
+        self.styles = {}
+        parts = []
+        for ii, rule in enumerate(rules):
+            group = 'r{}'.format(ii)
+            parts.append('(?P<{}>{})'.format(group, rule['match']))
+            self.styles[group] = rule['style']
+        self.expr = re.compile('|'.join(parts), re.M) if parts else None
+
+    def apply(self, text):
+        """Returns text with ANSI styling applied to each span matched by a rule."""
+        if self.expr is None or not self.printer.ansimode:
+            return text
+        out = []
+        pos = 0
+        codes = self.printer.style_codes
+        for match in self.expr.finditer(text):
+            start, end = match.span()
+            if start == end:
+                continue
+            prefix, suffix = codes(self.styles[match.lastgroup])
+            out.append(text[pos:start])
+            out.append(prefix)
+            out.append(text[start:end])
+            out.append(suffix)
+            pos = end
+        if not out:
+            return text
+        out.append(text[pos:])
+        return ''.join(out)
@@ -0,0 +1,235 @@
+"""Background jobs: commands that run while the shell keeps taking input."""
+
+import os
+import time
+import errno
+import signal
+import threading
+import subprocess
+from collections import deque
+from .stats import Invocation
+
+# seconds between checks for new output while following a job in the foreground
+follow_interval = 0.1
+
+
+class OutputBuffer(object):
+    """Bounded, thread-safe buffer of the most recent output lines of a job."""
+
+    def __init__(self, limit):
+        """Creates a buffer that keeps at most limit lines."""
+        self.lines = deque(maxlen=limit)
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def feed(self, stream):
+        """Reads stream line by line into the buffer until it ends; run on a reader thread."""
+        for line in iter(stream.readline, ''):
+            with self.cond:
+                if len(self.lines) == self.lines.maxlen:
+                    self.dropped += 1
+                self.lines.append(line)
+                self.cond.notify_all()
+        stream.close()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def drain(self):
+        """Removes and returns the buffered output, preceded by a note of any dropped lines."""
+        with self.cond:
+            text = ''.join(self.lines)
+            if self.dropped:
+                text = '[{} earlier lines dropped]\n'.format(self.dropped) + text
+            self.lines.clear()
+            self.dropped = 0
+            return text
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for more output, or for the end of the stream."""
+        with self.cond:
+            if not self.lines and not self.closed:
+                self.cond.wait(timeout)
+
+
+class BackgroundJob(object):
+    """A command running in its own process group, with its output kept for later."""
+
+    def __init__(self, number, name, cmd, buffer_lines, log_path=None):
+        """Creates job number to run the argv list cmd, labelled with name.
+
+        Output goes to the file at log_path if given, and to a buffer of the most recent
+        buffer_lines lines otherwise.
+        """
+        self.number = number
+        self.name = name
+        self.cmd = cmd
+        self.log_path = log_path
+        self.buffer = None if log_path else OutputBuffer(buffer_lines)
+        self.process = None
+        self.invocation = Invocation(name)
+        self.log_offset = 0
+        self.returncode = None
+        self.reported = False
+
+    def start(self):
+        """Spawns the job's process; returns False if it could not be started."""
+        try:
+            with open(os.devnull) as devnull:
+                if self.log_path:
+                    with open(self.log_path, 'a') as log:
+                        self.process = self._popen(devnull, log)
+                else:
+                    self.process = self._popen(devnull, subprocess.PIPE)
+        except EnvironmentError as e:
+            self.returncode = 127 if e.errno == errno.ENOENT else 126
+            self.invocation.finish(self.returncode)
+            return False
+        self.invocation.mark_spawned()
+        if self.buffer is not None:
+            reader = threading.Thread(target=self.buffer.feed, args=(self.process.stdout,))
+            reader.daemon = True
+            reader.start()
+        return True
+
+    def _popen(self, stdin, stdout):
+        # a process group of its own keeps CTRL+C at the prompt away from the job
+        return subprocess.Popen(self.cmd, stdin=stdin, stdout=stdout, stderr=subprocess.STDOUT,
+                                close_fds=True, preexec_fn=os.setpgrp)
+
+    def poll(self):
+        """Returns the exit code if the job has finished, without blocking; None otherwise."""
+        if self.returncode is None and self.process is not None:
+            returncode = self.process.poll()
+            if returncode is not None:
+                self.returncode = returncode
+                self.invocation.finish(returncode)
+        return self.returncode
+
+    @property
+    def state(self):
+        """Returns 'running', 'done', or 'exit N'."""
+        returncode = self.poll()
+        if returncode is None:
+            return 'running'
+        return 'done' if returncode == 0 else 'exit {}'.format(returncode)
+
+    def signal(self, signum):
+        """Sends signum to the job's process group; returns False if it has already finished."""
+        if self.poll() is not None:
+            return False
+        try:
+            os.killpg(self.process.pid, signum)
+        except OSError:
+            return False
+        return True
+
+
+class JobTable(object):
+    """Numbered background jobs of a shell.
+
+    Finished jobs are found with reap(), which never blocks.  They stay in the table,
+    with their output, until they are followed or discarded.
+    """
+
+    def __init__(self, settings):
+        """Creates an empty table for settings.
+
+        Job output is kept in memory, up to settings['job_buffer_lines'] lines per job,
+        unless settings['job_log_dir'] names a directory for per-job log files.
+        """
+        self.settings = settings
+        self.jobs = {}
+        self.next_number = 1
+
+    def start(self, name, cmd):
+        """Starts cmd in the background as a new job labelled name, and returns it."""
+        number = self.next_number
+        self.next_number += 1
+        log_path = None
+        if self.settings['job_log_dir']:
+            log_dir = os.path.expanduser(self.settings['job_log_dir'])
+            if not os.path.isdir(log_dir):
+                os.makedirs(log_dir)
+            log_path = os.path.join(log_dir, '{}-{}.log'.format(
+                number, ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)))
+        job = BackgroundJob(number, name, cmd, self.settings['job_buffer_lines'], log_path)
+        self.jobs[number] = job
+        job.start()
+        return job
+
+    def get(self, spec):
+        """Returns the job numbered by spec, e.g. '2' or '%2'; raises an exception if there is none."""
+        try:
+            return self.jobs[int(spec.lstrip('%'))]
+        except (ValueError, KeyError):
+            raise Exception('No such job: {}'.format(spec))
+
+    def running(self):
+        """Returns the jobs that have not finished, in order."""
+        return [job for number, job in sorted(self.jobs.items()) if job.poll() is None]
+
+    def reap(self):
+        """Returns the jobs that finished since the last call, in order."""
+        finished = []
+        for number, job in sorted(self.jobs.items()):
+            if not job.reported and job.poll() is not None:
+                job.reported = True
+                finished.append(job)
+        return finished
+
+    def discard(self, job):
+        """Removes a finished job from the table."""
+        self.jobs.pop(job.number, None)
+
+    def follow(self, job, out):
+        """Writes the job's output to out until it finishes, and removes it; returns its exit code.
+
+        Buffered output is written first.  For a job that logs to a file, the log is
+        written from where the last follow left off.  CTRL+C is passed on to the job,
+        which is then followed until it exits.
+        """
+        while job.process is not None:
+            try:
+                if self._pump(job, out):
+                    break
+            except KeyboardInterrupt:
+                job.signal(signal.SIGINT)
+        self.discard(job)
+        return job.poll()
+
+    def _pump(self, job, out):
+        """Writes any new output of a job to out; returns True once the job has finished."""
+        if job.buffer is not None:
+            closed = job.buffer.closed  # checked first, so that no trailing output is missed
+            out.write(job.buffer.drain())
+            out.flush()
+            if closed:
+                job.process.wait()
+                return job.poll() is not None
+            job.buffer.wait(follow_interval)
+            return False
+        finished = job.poll() is not None  # likewise
+        with open(job.log_path) as log:
+            log.seek(job.log_offset)
+            text = log.read()
+        job.log_offset += len(text)
+        out.write(text)
+        out.flush()
+        if not finished:
+            time.sleep(follow_interval)
+        return finished
+
+    def close(self):
+        """Terminates every running job, and waits for them to exit."""
+        for job in self.running():
+            job.signal(signal.SIGTERM)
+        deadline = time.time() + 5
+        for job in self.running():
+            while job.poll() is None and time.time() < deadline:
+                time.sleep(follow_interval)
+            if job.poll() is None:
+                job.signal(signal.SIGKILL)
+                job.process.wait()
+                job.poll()
@@ -32,7 +32,33 @@ def shallow(left, right, key, default):
     return left_v
 
 
-# TODO: deep merge
+def deep_merge(left_v, right_v):
+    """Recursively merges right_v into left_v, where both are dicts; otherwise returns right_v.
+
+    Subtrees are shared rather than copied: values that only exist on one side are
+    reused as-is, and left_v itself is returned when right_v is empty.
+    """
+    if not isinstance(left_v, dict) or not isinstance(right_v, dict):
+        return right_v
+    if not right_v:
+        return left_v
+    if not left_v:
+        return right_v
+    result = dict(left_v)
+    for key, value in right_v.items():
+        if key in left_v:
+            value = deep_merge(left_v[key], value)
+        result[key] = value
+    return result
+
+
+def deep(left, right, key, default):
+    """Recursively merges dicts from src at key, into key at dst."""
+    if key in right:
+        if key in left:
+            return deep_merge(left[key], right[key])
+        return right[key]
+    return left.get(key, default)
 
 
 class Merge(object):
@@ -49,14 +75,31 @@ class Merge(object):
 
         If no such key exists in left or right, default is used as the value.
         """
-        keys = self._key_fn(left, right)
+        strategy = self._strategy.get
+        default_fn = self._default_fn
         result = {}
-        for key in keys:
-            value = self._strategy.get(key, self._default_fn)(left, right, key, default)
-            if value != no_value:
+        for key in self._key_fn(left, right):
+            value = strategy(key, default_fn)(left, right, key, default)
+            if value is not no_value:
                 result[key] = value
         return result
 
+    def compile(self, keys):
+        """Returns a function equivalent to this merge, specialized for a fixed set of keys.
+
+        The key function is bypassed, and the strategy for each key is resolved up front.
+        """
+        plan = [(key, self._strategy.get(key, self._default_fn)) for key in keys]
+
+        def merge(left, right, default=None):
+            result = {}
+            for key, fn in plan:
+                value = fn(left, right, key, default)
+                if value is not no_value:
+                    result[key] = value
+            return result
+        return merge
+
 
 def inner(left, right):
     """Returns keys from right to left for all keys that exist in both."""
@@ -0,0 +1,234 @@
+"""Concurrent execution of commands with multiplexed, prefixed output."""
+
+import os
+import time
+import errno
+import select
+import signal
+import subprocess
+
+# partial lines longer than this are emitted without waiting for a newline
+max_line = 65536
+
+# prefix styles, assigned to jobs round-robin
+job_styles = ['job1', 'job2', 'job3', 'job4', 'job5', 'job6']
+
+
+class Job(object):
+    """A single command to be run by a Runner.
+
+    The optional depends argument lists the names of other jobs in the same run that
+    must succeed before this one is started.  The optional timeout argument is the number
+    of seconds after which the job is killed.
+
+    Each job runs in a process group of its own, so that everything it starts can be
+    signalled together.
+    """
+
+    def __init__(self, name, cmd, cwd=None, env=None, depends=None, timeout=None):
+        """Creates a job that runs the argv list cmd, labelled with name."""
+        self.name = name
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self.depends = depends or []
+        self.timeout = timeout
+        self.style = 'text'
+        self.process = None
+        self.skipped = False
+        self.timed_out = False
+        self.returncode = None
+        self.start_time = None
+        self.spawn_time = None
+        self.end_time = None
+
+    @property
+    def duration(self):
+        """Wall time of the job in seconds, or None if it has not finished."""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def start(self):
+        """Spawns the job's process with piped output; returns False if it could not be started."""
+        self.start_time = time.time()
+        try:
+            with open(os.devnull) as devnull:
+                self.process = subprocess.Popen(self.cmd, stdin=devnull, stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE, cwd=self.cwd, env=self.env,
+                                                close_fds=True, preexec_fn=os.setpgrp)
+        except OSError as e:
+            self.finish(127 if e.errno == errno.ENOENT else 126)
+            return False
+        self.spawn_time = time.time()
+        return True
+
+    def signal(self, signum):
+        """Sends signum to the job's process group, if it is still there."""
+        try:
+            os.killpg(self.process.pid, signum)
+        except OSError:
+            pass  # already exited
+
+    def finish(self, returncode):
+        """Records the job's exit code and end time."""
+        self.returncode = returncode
+        self.end_time = time.time()
+
+    @property
+    def deadline(self):
+        """Time at which a started job times out, or None if it has no timeout."""
+        if self.timeout is None or self.start_time is None:
+            return None
+        return self.start_time + self.timeout
+
+    @property
+    def failed(self):
+        """True if the job finished unsuccessfully or was skipped."""
+        return self.skipped or self.returncode not in (None, 0)
+
+
+class Runner(object):
+    """Runs jobs concurrently, up to a limit, interleaving their output line by line.
+
+    Jobs are started in order as soon as a slot is free and all of their dependencies
+    have succeeded.  Jobs downstream of a failure are skipped; independent jobs still run.
+
+    Each output line is written to the printer with a per-job prefix, styled with one
+    of job_styles.  Lines from stderr use the 'job_stderr' style.
+
+    Jobs that run past their timeout are killed, and their remaining output is discarded.
+    CTRL+C is passed on to the running jobs.
+    """
+
+    def __init__(self, printer, limit):
+        """Creates a runner that writes to printer and runs at most limit jobs at once."""
+        self.printer = printer
+        self.limit = max(1, limit)
+
+    def run(self, jobs):
+        """Runs all jobs to completion, and returns them."""
+        active = []
+        try:
+            return self._run(jobs, active)
+        except KeyboardInterrupt:
+            for job in active:
+                job.signal(signal.SIGINT)
+            raise
+
+    def _run(self, jobs, active):
+        """Runs jobs, keeping the list of running ones in active."""
+
+        width = max(len(job.name) for job in jobs) if jobs else 0
+        for ii, job in enumerate(jobs):
+            job.style = job_styles[ii % len(job_styles)]
+            job.prefix = job.name.ljust(width) + ' | '
+
+        by_name = dict((job.name, job) for job in jobs)
+        pending = list(jobs)
+        streams = {}  # fd -> [job, style, pending partial line]
+        while pending or active:
+            for job in self._ready(pending, by_name, self.limit - len(active)):
+                if job.start():
+                    active.append(job)
+                    streams[job.process.stdout.fileno()] = [job, 'text', '']
+                    streams[job.process.stderr.fileno()] = [job, 'job_stderr', '']
+                else:
+                    self._emit(job, 'job_stderr', 'failed to start: {}'.format(' '.join(job.cmd)))
+
+            if streams:
+                for fd in self._select(list(streams), self._timeout(active)):
+                    self._read(fd, streams)
+                self.printer.flush()
+            self._expire(active, streams)
+            for job in list(active):
+                if job.process.stdout.fileno() not in streams and job.process.stderr.fileno() not in streams:
+                    job.finish(job.process.wait())
+                    job.process.stdout.close()
+                    job.process.stderr.close()
+                    active.remove(job)
+        return jobs
+
+    def _ready(self, pending, by_name, slots):
+        """Removes and returns up to slots startable jobs from pending, skipping failed branches."""
+        ready = []
+        skipped = True
+        while skipped:  # repeat so that skips propagate through chains of dependents
+            skipped = False
+            for job in list(pending):
+                deps = [by_name[name] for name in job.depends if name in by_name]
+                if any(dep.failed for dep in deps):
+                    job.skipped = skipped = True
+                    pending.remove(job)
+                elif len(ready) < slots and all(dep.returncode == 0 for dep in deps):
+                    ready.append(job)
+                    pending.remove(job)
+        return ready
+
+    def _timeout(self, active):
+        """Returns the seconds until the first of the active jobs times out; None if none can."""
+        deadlines = [job.deadline for job in active if job.deadline is not None]
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - time.time())
+
+    def _expire(self, active, streams):
+        """Kills active jobs that are past their deadline, and stops reading their output."""
+        now = time.time()
+        for job in active:
+            if job.deadline is not None and now >= job.deadline and not job.timed_out:
+                job.timed_out = True
+                job.signal(signal.SIGKILL)
+                for fd in (job.process.stdout.fileno(), job.process.stderr.fileno()):
+                    streams.pop(fd, None)
+                self._emit(job, 'job_stderr', 'timed out after {}s'.format(job.timeout))
+
+    def _select(self, fds, timeout=None):
+        """Waits for any of fds to become readable, for at most timeout seconds."""
+        while True:
+            try:
+                return select.select(fds, [], [], timeout)[0]
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+
+    def _read(self, fd, streams):
+        """Reads available output from fd and emits all complete lines."""
+        job, style, partial = streams[fd]
+        data = os.read(fd, 65536)
+        if not data:
+            if partial:
+                self._emit(job, style, partial)
+            del streams[fd]
+            return
+        lines = (partial + data).split('\n')
+        partial = lines.pop()
+        if len(partial) > max_line:
+            lines.append(partial)
+            partial = ''
+        for line in lines:
+            self._emit(job, style, line)
+        streams[fd][2] = partial
+
+    def _emit(self, job, style, line):
+        """Writes a single prefixed line of job output."""
+        self.printer.write(job.style, job.prefix)
+        self.printer.write(style, line)
+        self.printer.newline()
+
+    def summary(self, jobs):
+        """Writes a table of exit codes and durations for finished jobs."""
+        width = max(len(job.name) for job in jobs) if jobs else 0
+        self.printer.heading('Summary')
+        for job in jobs:
+            self.printer.subheading(job.name.ljust(width))
+            if job.skipped:
+                self.printer.off('skipped')
+            elif job.timed_out:
+                self.printer.off('timeout')
+            elif job.returncode == 0:
+                self.printer.on('ok     ')
+            else:
+                self.printer.off('exit {:<2}', job.returncode)
+            self.printer.text(' {:8.2f}s', job.duration or 0.0)
+        self.printer.newline()
@@ -0,0 +1,170 @@
+"""Warm container pool: idle containers that run-style tasks are exec'd into."""
+
+import os
+import sys
+import time
+import shlex
+import subprocess
+from .compose import compose_command
+from .compose import docker_command
+from .compose import spawn
+from .querycache import query_cache
+from .settings import printer
+from .settings import task_args
+from .stats import Invocation
+from .stats import stats
+
+
+def start_quietly(cmd):
+    """Starts cmd in the background, with no input or output; returns its Popen."""
+    with open(os.devnull, 'r+') as devnull:
+        return subprocess.Popen(cmd, stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True)
+
+
+class WarmContainer(object):
+    """A container of a task's service, started in the background and kept idle."""
+
+    def __init__(self, name, process):
+        """Creates a container named name, being started by the Popen process."""
+        self.name = name
+        self.process = process
+        self.returncode = None
+        self.uses = 0
+        self.idle_since = None
+
+    @property
+    def state(self):
+        """Returns 'starting', 'idle', or 'failed'."""
+        if self.returncode is None:
+            returncode = self.process.poll()
+            if returncode is None:
+                return 'starting'
+            self.returncode = returncode
+            self.idle_since = time.time()
+        return 'idle' if self.returncode == 0 else 'failed'
+
+
+class WarmPool(object):
+    """Idle containers for the run-style tasks that have a warm option, kept per task.
+
+    The first run of a task with warm: N starts N containers of its service in the
+    background, each kept alive by settings['warm_command'].  Later runs exec the task's
+    command in an idle one, instead of creating a container.  A container is removed once
+    it has been used settings['warm_max_uses'] times, and replaced by a new one; idle
+    containers are removed after settings['warm_idle_timeout'] seconds, and replaced on
+    the next run of their task.
+
+    Nothing is pooled until enabled is set, which the shell does for its command loop.
+    """
+
+    def __init__(self, settings):
+        """Creates an empty pool for settings."""
+        self.settings = settings
+        self.enabled = False
+        self.containers = {}  # task name -> [WarmContainer]
+        self.removals = []  # Popen of each pending docker rm
+        self.next_number = 1
+
+    def run(self, name, task, args):
+        """Runs a task with extra args in one of its idle containers; returns the exit code.
+
+        Returns None, without running anything, if the task is not pooled or none of its
+        containers is idle yet.  Either way, its containers are topped up in the background.
+        """
+        if not self.enabled or not task.get('warm') or task['compiled_args'][0] != 'run':
+            return None
+        command = task['args'] + args
+        if not command:
+            return None  # only run can start the image's default command
+        container = self._idle(name)
+        returncode = None
+        if container is not None:
+            returncode = self._exec(name, task, container, command)
+        self._fill(name, task)
+        return returncode
+
+    def _exec(self, name, task, container, command):
+        """Runs command in container, and retires it if it has been used up; returns the exit code."""
+        tty = sys.stdin.isatty() and not task['disable-tty']
+        cmd = docker_command(*(['exec', '-i'] + (['-t'] if tty else []) + [container.name] + command),
+                             config=self.settings)
+        query_cache.note(task['compiled_args'])
+        if self.settings['debug']:
+            printer.writeln('debug', 'Running: {}', cmd)
+        printer.flush()
+        container.uses += 1
+        invocation = Invocation(name)
+        try:
+            returncode = spawn(cmd, invocation)
+        finally:
+            if container.uses >= self.settings['warm_max_uses']:
+                self.containers[name].remove(container)
+                self._remove([container])
+            else:
+                container.idle_since = time.time()
+        stats.record(invocation.finish(returncode))
+        return returncode
+
+    def _idle(self, name):
+        """Returns an idle container of a task, dropping any that failed to start; None if there is none."""
+        idle = None
+        for container in list(self.containers.get(name, [])):
+            state = container.state
+            if state == 'failed':
+                printer.error('Warm container for {} failed to start (exit {})',
+                              name, container.returncode).newline()
+                self.containers[name].remove(container)
+                self._remove([container])
+            elif state == 'idle' and idle is None:
+                idle = container
+        return idle
+
+    def _fill(self, name, task):
+        """Starts containers for a task in the background, until it has task['warm'] of them."""
+        containers = self.containers.setdefault(name, [])
+        while len(containers) < task['warm']:
+            container_name = 'dcsh_warm_{}_{}_{}'.format(
+                os.getpid(), ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name), self.next_number)
+            self.next_number += 1
+            words = ['run', '-d', '--name', container_name] + \
+                task_args(dict(task, detach=False, remove=False, name=None)) + \
+                [task['service']] + shlex.split(self.settings['warm_command'])
+            process = start_quietly(compose_command(*words, config=self.settings))
+            containers.append(WarmContainer(container_name, process))
+
+    def _remove(self, containers):
+        """Removes containers in the background, once they have finished starting.
+
+        Containers that failed to start are removed as well, in case they were created.
+        """
+        if not containers:
+            return
+        for container in containers:
+            if container.state == 'starting':
+                container.process.wait()
+        names = [container.name for container in containers]
+        self.removals.append(start_quietly(docker_command(*(['rm', '-f'] + names), config=self.settings)))
+
+    def maintain(self):
+        """Removes containers that have been idle too long, and collects finished removals."""
+        if self.containers:
+            deadline = time.time() - self.settings['warm_idle_timeout']
+            for name, containers in self.containers.items():
+                expired = [container for container in containers
+                           if container.state == 'idle' and container.idle_since < deadline]
+                for container in expired:
+                    containers.remove(container)
+                self._remove(expired)
+        self.removals = [process for process in self.removals if process.poll() is None]
+
+    def discard(self, names=None):
+        """Removes the containers of the named tasks, or of every task."""
+        for name in list(self.containers) if names is None else names:
+            self._remove(self.containers.pop(name, []))
+
+    def drain(self):
+        """Removes every container, and waits for them to be gone."""
+        self.discard()
+        for process in self.removals:
+            process.wait()
+        self.removals = []
@@ -1,7 +1,6 @@
 """Ansi-enhanced output printer library."""
 
 import sys
-import StringIO
 from colors import color
 from colors import STYLES
 
@@ -51,6 +50,7 @@ class StylePrinterFn(object):
         p = StylePrinter(self.ctx.stream, self.ctx.stylesheet, self.ctx._get_style(self.style_name))
         p._start_newline = self.ctx._start_newline
         p.ansimode = self.ctx.ansimode
+        p._emit = self.ctx._emit  # share output buffering, to keep ordering intact
         return p
 
     def __exit__(self, type, value, traceback):
@@ -61,11 +61,15 @@ class StylePrinterFn(object):
 class StylePrinter(object):
     """Styled printer for generating ANSI decorated text."""
 
-    def __init__(self, stream=None, stylesheet=None, style_defaults=None):
+    def __init__(self, stream=None, stylesheet=None, style_defaults=None, buffer_size=0):
         """Constructs an ansi-capable printer around a stream and stylesheet.
 
         The optional stream argument defaults to stdout if none is applied.
 
+        The optional buffer_size argument enables output buffering: writes are coalesced
+        in memory until at least buffer_size characters are pending, or until flush() is
+        called.  When zero, every write goes straight to the stream.
+
         The optional stylesheet argument is a dict of style names to
         a dict of style settings.  These settings are forwarded to the
         ansicolor `color` function as kwargs.  Please see the ansicolor
@@ -82,16 +86,70 @@ class StylePrinter(object):
         with no style applied.
         """
 
+        self._compiled = {}
+        self._pending = []
+        self._pending_size = 0
+        self.buffer_size = buffer_size
         self._start_newline = True
         self._style_defaults = style_defaults if style_defaults is not None else default_style
         self.ansimode = True
         self.stream = stream if stream is not None else sys.stdout
         self.stylesheet = stylesheet if stylesheet is not None else {}
 
+    def _invalidating_property(name):
+        """Returns a property that discards compiled styles whenever it is set."""
+
+        def fget(self):
+            return getattr(self, name)
+
+        def fset(self, value):
+            setattr(self, name, value)
+            self._compiled = {}
+        return property(fget, fset)
+
+    stylesheet = _invalidating_property('_stylesheet')
+    ansimode = _invalidating_property('_ansimode')
+    _style_defaults = _invalidating_property('_defaults')
+    del _invalidating_property
+
     def _get_style(self, style_name):
         """Gets the style for name, populated with defaults."""
         return dict(self._style_defaults, **self.stylesheet.get(style_name, {}))
 
+    def _compile(self, style_name):
+        """Compiles a style into a tuple of display flags and literal text to emit around output.
+
+        The result is (hidden, newline_before, newline_after, head, tail, prefix, suffix), where
+        head and tail hold padding and before/after text, and prefix and suffix hold any ANSI
+        escape sequences. Compiled styles are cached until the stylesheet, style defaults, or
+        ansimode change.
+        """
+        style = self._get_style(style_name)
+        display = style['display']
+        prefix = suffix = ''
+        if self.ansimode:
+            marker = '\0'
+            prefix, suffix = color(marker, fg=style['color'], bg=style['background'],
+                                   style='+'.join([k for k in STYLES if style[k]])).split(marker)
+        compiled = (
+            display == 'hidden',
+            display in ('block', 'start'),
+            display in ('block', 'end'),
+            ('\n' * style['padding-top']) + style['before'],
+            style['after'] + ('\n' * style['padding-bottom']),
+            prefix,
+            suffix,
+        )
+        self._compiled[style_name] = compiled
+        return compiled
+
+    def style_codes(self, style_name):
+        """Returns the (prefix, suffix) ANSI escape strings for a style; empty if ansimode is off."""
+        compiled = self._compiled.get(style_name)
+        if compiled is None:
+            compiled = self._compile(style_name)
+        return compiled[5:]
+
     def write(self, style_name, text, *args, **kwargs):
         """Writes formatted text to the configured stream, in a specified style.
 
@@ -100,33 +158,26 @@ class StylePrinter(object):
 
         If the indicated style is not in the stylesheet, no style formatting is applied.
         """
-        style = self._get_style(style_name)
-
-        # handle display conditions for hidden, block, and start
-        display = style['display']
-        if display == 'hidden':
+        compiled = self._compiled.get(style_name)
+        if compiled is None:
+            compiled = self._compile(style_name)
+        hidden, newline_before, newline_after, head, tail, prefix, suffix = compiled
+        if hidden:
             return  # do nothing
-        elif display in ['block', 'start'] and not self._start_newline:
-            self.stream.write('\n')
 
-        # emit the formatted text with padding and before/after style
-        formatted_text = text.format(*args, **kwargs) if args or kwargs else text
-        text = ('\n' * style['padding-top']) + style['before'] + formatted_text + \
-            style['after'] + ('\n' * style['padding-bottom'])
-
-        # emit to stream with or without ansi formatting
-        if self.ansimode:
-            self.stream.write(color(text, fg=style['color'], bg=style['background'],
-                                    style='+'.join([k for k in STYLES if style[k]])))
-        else:
-            self.stream.write(text)
+        # emit the formatted text with padding, before/after style, and ansi formatting
+        text = head + (text.format(*args, **kwargs) if args or kwargs else text) + tail
+        out = prefix + text + suffix
+        if newline_before and not self._start_newline:
+            out = '\n' + out
 
         # handle block condition and newline boolean
-        if display in ['block', 'end']:
-            self.stream.write('\n')
+        if newline_after:
+            out += '\n'
             self._start_newline = True
         else:
             self._start_newline = text.endswith('\n')
+        self._emit(out)
         return self
 
     def writeln(self, style_name, text, *args, **kwargs):
@@ -137,30 +188,87 @@ class StylePrinter(object):
 
     def newline(self):
         """Writes a newline to the configured stream."""
-        self.stream.write('\n')
+        self._emit('\n')
         self._start_newline = True
         return self
 
     def nl(self):
         """Writes a newline to the configured stream."""
-        self.stream.write('\n')
+        self._emit('\n')
         self._start_newline = True
         return self
 
+    def _emit(self, text):
+        """Writes raw text to the stream, or to the pending buffer if buffering is enabled."""
+        if self.buffer_size:
+            self._pending.append(text)
+            self._pending_size += len(text)
+            if self._pending_size >= self.buffer_size:
+                self._drain()
+        else:
+            self.stream.write(text)
+
+    def _drain(self):
+        """Writes all pending output to the stream as a single write."""
+        if self._pending:
+            self.stream.write(''.join(self._pending))
+            del self._pending[:]
+            self._pending_size = 0
+
+    def flush(self):
+        """Writes any buffered output, and flushes the stream.
+
+        Must be called before anything else writes to the same terminal or file, such as
+        a child process, so that output stays in order.
+        """
+        self._drain()
+        flush = getattr(self.stream, 'flush', None)
+        if flush is not None:
+            flush()
+        return self
+
     def __getattr__(self, style_name):
-        """Returns write wrapper for the style indicated by the attribute name."""
-        return StylePrinterFn(self, style_name)
+        """Returns write wrapper for the style indicated by the attribute name.
+
+        Wrappers are cached on the instance, so later lookups bypass __getattr__ entirely.
+        """
+        fn = StylePrinterFn(self, style_name)
+        if not style_name.startswith('__'):
+            self.__dict__[style_name] = fn
+        return fn
+
+
+class StringBuffer(object):
+    """Minimal write-only stream that collects writes in a list, joined on demand."""
+
+    def __init__(self):
+        """Creates an empty buffer."""
+        self.parts = []
+
+    def write(self, text):
+        """Appends text to the buffer."""
+        self.parts.append(text)
+
+    def flush(self):
+        """Stream interface; does nothing."""
+        pass
+
+    def getvalue(self):
+        """Returns everything written so far."""
+        if len(self.parts) > 1:
+            self.parts[:] = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ''
 
 
 class StringPrinter(StylePrinter):
-    """Convienence class for StylePrinter that wraps a StringIO buffer.
+    """Convienence class for StylePrinter that wraps a StringBuffer.
 
-    The 'buffer' attribute contains the wrapped StringIO buffer.
+    The 'buffer' attribute contains the wrapped StringBuffer.
     """
 
     def __init__(self, stylesheet=None, style_defaults=None):
         """Creates the buffer wrapped StylePrinter."""
-        self.buffer = StringIO.StringIO()
+        self.buffer = StringBuffer()
         StylePrinter.__init__(self, stream=self.buffer, stylesheet=stylesheet,
                               style_defaults=style_defaults)
 
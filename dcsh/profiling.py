@@ -0,0 +1,78 @@
+"""Profiling of program sections with cProfile, saved as pstats and callgrind files."""
+
+import re
+import cProfile
+import pstats
+from contextlib import contextmanager
+
+
+def callgrind_name(func):
+    """Returns the callgrind (file, function) names for a pstats function key."""
+    file_name, line, name = func
+    if file_name == '~':
+        return '~', name  # built-in functions
+    return file_name, '{}:{}'.format(name, line)
+
+
+def write_callgrind(stats, file_path):
+    """Writes a pstats.Stats to file_path in callgrind format, for KCachegrind and friends.
+
+    Costs are in microseconds.  Call edges come from the pstats caller data, which
+    records the cumulative time spent in each callee on behalf of each caller.
+    """
+
+    callees = {}  # caller -> [(callee, calls, cumulative time)]
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, value in callers.items():
+            if isinstance(value, tuple):
+                calls, cumulative = value[0], value[3]
+            else:
+                calls, cumulative = value, 0  # older pstats record only the call count
+            callees.setdefault(caller, []).append((func, calls, cumulative))
+
+    with open(file_path, 'w') as f:
+        f.write('# callgrind format\nversion: 1\ncreator: dcsh\npositions: line\nevents: Microseconds\n\n')
+        for func, (cc, nc, tt, ct, callers) in sorted(stats.stats.items()):
+            file_name, name = callgrind_name(func)
+            f.write('fl={}\nfn={}\n{} {}\n'.format(file_name, name, func[1], int(tt * 1000000)))
+            for callee, calls, cumulative in sorted(callees.get(func, [])):
+                callee_file, callee_name = callgrind_name(callee)
+                f.write('cfl={}\ncfn={}\ncalls={} {}\n{} {}\n'.format(
+                    callee_file, callee_name, calls, callee[1], func[1], int(cumulative * 1000000)))
+            f.write('\n')
+
+
+class Profiler(object):
+    """Profiles named sections of the program, saving a pstats and a callgrind file for each.
+
+    Files are named <prefix>.<sequence>.<section>.pstats and .callgrind.  A Profiler with
+    no prefix is disabled, and its sections cost nothing.
+    """
+
+    def __init__(self, prefix=None):
+        """Creates a profiler that writes files starting with prefix; disabled if prefix is None."""
+        self.prefix = prefix
+        self.count = 0
+
+    @contextmanager
+    def section(self, name):
+        """Context manager that profiles the enclosed block as a section called name."""
+        if self.prefix is None:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.save(profile, name)
+
+    def save(self, profile, name):
+        """Writes the files for a finished profile; returns the path without an extension."""
+        self.count += 1
+        base = '{}.{:03d}.{}'.format(self.prefix, self.count, re.sub(r'[^\w.-]+', '_', name).strip('_') or 'section')
+        stats = pstats.Stats(profile)
+        stats.dump_stats(base + '.pstats')
+        write_callgrind(stats, base + '.callgrind')
+        return base
@@ -0,0 +1,64 @@
+"""Registry of sibling compose projects, for running commands across several of them."""
+
+import os
+from .compose import compose_command
+from .config import config_sources
+from .config import load_project
+from .watch import stat_key
+
+
+class Projects(object):
+    """Compose projects registered in settings['projects'], as a mapping of names to directories.
+
+    Project settings are loaded the first time a project is used, and kept in memory until
+    one of its configuration files changes on disk.
+    """
+
+    def __init__(self, settings):
+        """Creates a registry for the projects in settings."""
+        self.settings = settings
+        self._loaded = {}  # directory -> (stat keys of its sources, settings)
+
+    def names(self):
+        """Returns the names of all registered projects, in sorted order."""
+        return sorted(self.settings['projects'])
+
+    def select(self, spec):
+        """Returns the project names selected by spec: 'all', or a comma separated list of names.
+
+        Raises an exception for unknown project names.
+        """
+        if spec == 'all':
+            return self.names()
+        names = [name for name in spec.split(',') if name]
+        for name in names:
+            if name not in self.settings['projects']:
+                raise Exception('Unknown project: {}'.format(name))
+        return names
+
+    def directory(self, name):
+        """Returns the directory of a project."""
+        return os.path.abspath(os.path.expanduser(self.settings['projects'][name]))
+
+    def project_settings(self, name):
+        """Returns the compiled settings of a project, loading them if necessary."""
+        directory = self.directory(name)
+        key = tuple(stat_key(file_path) for file_path in config_sources(directory))
+        loaded = self._loaded.get(directory)
+        if loaded is None or loaded[0] != key:
+            loaded = (key, load_project(directory))
+            self._loaded[directory] = loaded
+        return loaded[1]
+
+    def command(self, name, words):
+        """Returns the docker-compose argv that runs a task or command in a project.
+
+        The first word names a task of the project, or a docker-compose command.  Task
+        dependencies are not run.  The sudo setting applies if it is enabled either for
+        the project or globally.
+        """
+        data = self.project_settings(name)
+        config = {'dc_path': data['dc_path'], 'sudo': data['sudo'] or self.settings['sudo']}
+        if words and words[0] in data['tasks']:
+            return compose_command(*(data['tasks'][words[0]]['compiled_args'] + words[1:]), config=config)
+        return compose_command(*words, config=config)
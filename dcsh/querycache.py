@@ -0,0 +1,78 @@
+"""Cache of the output of read-only docker-compose queries, such as ps and config."""
+
+import time
+from collections import OrderedDict
+from .settings import settings
+
+# docker-compose commands that change containers, images or volumes; running any of them
+# discards all cached results.  Tasks with exec: false start with 'run', so count as well.
+mutating_commands = frozenset([
+    'build', 'create', 'down', 'kill', 'pause', 'pull', 'restart', 'rm', 'run', 'scale',
+    'start', 'stop', 'unpause', 'up',
+])
+
+# docker-compose options that can precede the command, and take the next word as their value
+global_value_options = frozenset([
+    '-f', '--file', '-p', '--project-name', '-c', '--context', '--log-level', '-H', '--host',
+    '--tlscacert', '--tlscert', '--tlskey', '--project-directory', '--env-file',
+])
+
+
+def command_name(args):
+    """Returns the docker-compose command in args, after any global options; None if there is none."""
+    ii = 0
+    while ii < len(args) and args[ii].startswith('-'):
+        ii += 2 if args[ii] in global_value_options else 1
+    return args[ii] if ii < len(args) else None
+
+
+class QueryCache(object):
+    """Outputs of successful docker-compose queries, keyed on their full argv.
+
+    Only the commands named in settings['query_cache'] are cached, each for its own
+    number of seconds.  At most settings['query_cache_size'] results are kept; the least
+    recently used are dropped first.
+    """
+
+    def __init__(self):
+        """Creates an empty cache."""
+        self.entries = OrderedDict()  # argv tuple -> (expiry time, output)
+
+    def ttl(self, args):
+        """Returns the seconds that the output of docker-compose args may be cached; 0 if not at all."""
+        name = command_name(args)
+        if name is None:
+            return 0
+        return settings['query_cache'].get(name) or 0
+
+    def get(self, cmd):
+        """Returns the cached output of the argv list cmd, or None if there is none or it expired."""
+        key = tuple(cmd)
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        if time.time() >= entry[0]:
+            return None
+        self.entries[key] = entry  # most recently used
+        return entry[1]
+
+    def put(self, cmd, output, ttl):
+        """Caches output of the argv list cmd for ttl seconds."""
+        key = tuple(cmd)
+        self.entries.pop(key, None)
+        self.entries[key] = (time.time() + ttl, output)
+        while len(self.entries) > max(0, settings['query_cache_size']):
+            self.entries.popitem(last=False)
+
+    def note(self, args):
+        """Discards every cached result if docker-compose args would change anything."""
+        if command_name(args) in mutating_commands:
+            self.clear()
+
+    def clear(self):
+        """Discards every cached result."""
+        self.entries.clear()
+
+
+# singleton cache for the shell session
+query_cache = QueryCache()
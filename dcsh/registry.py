@@ -0,0 +1,57 @@
+"""Registry of the docker-compose commands and tasks that a shell can dispatch to."""
+
+import functools
+
+
+class CommandRegistry(object):
+    """Maps command names to handlers, in constant time, straight from a shell's settings.
+
+    Names are looked up in settings['tasks'] and then settings['dc_commands'] on every
+    call, so that configuration reloads are seen at once; tasks take precedence over
+    commands of the same name.  A handler is only created the first time its name is
+    dispatched, and kept until invalidate() is called.
+    """
+
+    def __init__(self, settings, run_command, run_task):
+        """Creates a registry for settings.
+
+        Handlers call run_command(name, cmdargs) for docker-compose commands, and
+        run_task(name, task, cmdargs) for tasks.
+        """
+        self.settings = settings
+        self.run_command = run_command
+        self.run_task = run_task
+        self._handlers = {}
+
+    def __contains__(self, name):
+        return name in self.settings['tasks'] or name in self.settings['dc_commands']
+
+    def help(self, name):
+        """Returns the help text for a command or task name; None if it has none, or is unknown."""
+        if name in self.settings['tasks']:
+            return self.settings['tasks'][name]['help']
+        return self.settings['dc_commands'].get(name)
+
+    def handler(self, name):
+        """Returns a callable that runs name with a string of arguments; None if name is unknown.
+
+        Raises an exception if name is a task that cannot be compiled.
+        """
+        fn = self._handlers.get(name)
+        if fn is None:
+            if name in self.settings['tasks']:
+                fn = functools.partial(self.run_task, name, self.settings['tasks'][name])
+            elif name in self.settings['dc_commands']:
+                fn = functools.partial(self.run_command, name)
+            else:
+                return None
+            self._handlers[name] = fn
+        return fn
+
+    def invalidate(self, names=None):
+        """Discards the handlers for names, or all handlers if names is None."""
+        if names is None:
+            self._handlers.clear()
+        else:
+            for name in names:
+                self._handlers.pop(name, None)
@@ -0,0 +1,197 @@
+"""dcsh server: keeps settings and a shell loaded, and runs commands for thin clients."""
+
+import os
+import sys
+import json
+import errno
+import signal
+import socket
+import struct
+import threading
+from .client import frame_header
+from .client import recv_exactly
+from .client import send_frame
+from .client import socket_path
+from .settings import printer
+from .settings import settings
+
+# SO_PEERCRED is Linux only, and missing from Python 2's socket module
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+peer_credentials = struct.Struct('3i')  # pid, uid, gid
+
+
+def peer_uid(conn):
+    """Returns the uid of the process connected to a unix socket; None if the platform cannot tell."""
+    if not sys.platform.startswith('linux'):
+        return None
+    return peer_credentials.unpack(conn.getsockopt(socket.SOL_SOCKET, SO_PEERCRED, peer_credentials.size))[1]
+
+
+class Server(object):
+    """Serves `dcsh -c` requests for one project over a unix socket.
+
+    Each request is run in a forked copy of the server, so that requests cannot affect
+    one another, and the loaded settings never have to be rebuilt.  Configuration changes
+    are picked up before every request.
+    """
+
+    def __init__(self, shell, run_request, path=None):
+        """Creates a server for a DcShell.
+
+        run_request(shell, argv) runs the commands of a client's argv, and returns the exit
+        code; it is called in the forked process, with the client's stdin, stdout and stderr.
+        """
+        self.shell = shell
+        self.run_request = run_request
+        self.path = path or socket_path()
+        self.listener = None
+
+    def listen(self):
+        """Binds the socket, replacing a stale one; raises an exception if a server is running."""
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except socket.error:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        else:
+            raise Exception('A server is already running on {}'.format(self.path))
+        finally:
+            probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)  # only our own user may connect
+        try:
+            self.listener.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.listener.listen(16)
+
+    def close(self):
+        """Stops listening, and removes the socket."""
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def serve_forever(self):
+        """Accepts and serves requests from our own user until interrupted."""
+        while True:
+            try:
+                conn = self.listener.accept()[0]
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            uid = peer_uid(conn)
+            if uid not in (None, os.getuid()):
+                printer.error('Refused a connection from uid {}', uid).newline()
+                printer.flush()
+                conn.close()
+                continue
+            self.reap()
+            self.shell.precmd('')  # picks up configuration changes
+            printer.flush()
+            pid = os.fork()
+            if pid == 0:
+                returncode = 1
+                try:
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    self.listener.close()
+                    returncode = self.handle(conn)
+                finally:
+                    os._exit(returncode)
+            conn.close()
+
+    def reap(self):
+        """Collects the exit status of finished requests, without blocking."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError:
+                return  # no children
+            if pid == 0:
+                return
+
+    def handle(self, conn):
+        """Serves one request in a forked process; returns the exit code of its commands."""
+        from _multiprocessing import recvfd  # checked for by serve()
+        # a process group to stop the request with, in a session of its own, so that the
+        # client's terminal can be used without being this process's controlling terminal
+        os.setsid()
+        for fd in (0, 1, 2):
+            received = recvfd(conn.fileno())
+            os.dup2(received, fd)
+            os.close(received)
+        header = recv_exactly(conn, frame_header.size)
+        channel, size = frame_header.unpack(header)
+        if channel != 'r':
+            raise Exception('Unexpected frame from client: {!r}'.format(channel))
+        request = json.loads(recv_exactly(conn, size))
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+
+        finished = threading.Event()
+        watcher = threading.Thread(target=self.watch, args=(conn, finished))
+        watcher.daemon = True
+        watcher.start()
+
+        try:
+            returncode = self.run_request(self.shell, request['argv'])
+        except KeyboardInterrupt:
+            returncode = 130
+        except Exception as e:
+            printer.error('Error: {}', str(e)).newline()
+            returncode = 1
+        printer.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        finished.set()
+        try:
+            send_frame(conn, 'x', str(returncode))
+        except socket.error:
+            pass
+        conn.close()
+        return returncode
+
+    def watch(self, conn, finished):
+        """Passes the client's CTRL+Cs on to the request, and terminates it if the client goes away."""
+        while True:
+            try:
+                header = recv_exactly(conn, frame_header.size)
+            except socket.error:
+                header = ''
+            if finished.is_set():
+                return
+            if len(header) < frame_header.size:
+                os.killpg(0, signal.SIGTERM)
+                return
+            channel, size = frame_header.unpack(header)
+            recv_exactly(conn, size)
+            if channel == 'i':
+                os.killpg(0, signal.SIGINT)
+
+
+def serve(shell, run_request):
+    """Runs a server for shell in the current directory until interrupted; returns an exit code."""
+    try:
+        from _multiprocessing import recvfd  # noqa: F401
+    except ImportError:
+        raise Exception('This Python cannot pass file descriptors, which the server needs.')
+    settings['oneshot'] = False  # requests must never exec over the server
+    server = Server(shell, run_request)
+    server.listen()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    printer.text('dcsh server listening on {}', server.path).newline()
+    printer.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
@@ -17,9 +17,25 @@ default_stylesheet = {
     'debug': {'color': 'blue', 'italic': True},
     'prompt': {'color': 'yellow'},
     'debug_prompt': {'color': 'red'},
+    'job1': {'color': 'cyan'},
+    'job2': {'color': 'magenta'},
+    'job3': {'color': 'green'},
+    'job4': {'color': 'yellow'},
+    'job5': {'color': 'blue'},
+    'job6': {'color': 'white'},
+    'job_stderr': {'color': 'red'},
+    'service': {'color': 'cyan'},
+    'warning': {'color': 'yellow'},
 }
 
 
+default_highlights = [
+    {'match': r'^[\w.-]+\s+\|', 'style': 'service'},
+    {'match': r'\b(?:ERROR|FATAL|CRITICAL|Traceback)\b', 'style': 'error'},
+    {'match': r'\bWARN(?:ING)?\b', 'style': 'warning'},
+]
+
+
 default_settings = {
     'tasks': {},
     'environment': {},
@@ -31,11 +47,28 @@ default_settings = {
     'debug_prompt_style': 'debug_prompt',
     'intro': 'DCSH started. Type "help" for assitance.',
     'dc_path': 'docker-compose',
+    'docker_path': 'docker',
+    'jobs': 4,
+    'completion_ttl': 5,
+    'projects': {},
+    'host_groups': {},
+    'host_timeout': None,
+    'job_buffer_lines': 1000,
+    'job_log_dir': None,
+    'query_cache': {},
+    'query_cache_size': 64,
+    'warm_command': 'tail -f /dev/null',
+    'warm_max_uses': 1,
+    'warm_idle_timeout': 600,
+    'stream_output': False,
+    'stream_commands': ['logs', 'up', 'build', 'pull', 'push'],
+    'highlights': default_highlights,
     'stylesheet': default_stylesheet,
 }
 
 
-merge_settings = merge.Merge(merge.left, merge.discard, {
+# merge strategy for each setting, when layering one configuration source over another
+settings_strategies = {
     'tasks': merge.shallow,
     'environment': merge.shallow,
     'debug': merge.override,
@@ -46,8 +79,26 @@ merge_settings = merge.Merge(merge.left, merge.discard, {
     'debug_prompt_style': merge.override,
     'intro': merge.override,
     'dc_path': merge.override,
-    'stylesheet': merge.override,
-})
+    'docker_path': merge.override,
+    'jobs': merge.override,
+    'completion_ttl': merge.override,
+    'projects': merge.shallow,
+    'host_groups': merge.shallow,
+    'host_timeout': merge.override,
+    'job_buffer_lines': merge.override,
+    'job_log_dir': merge.override,
+    'query_cache': merge.shallow,
+    'query_cache_size': merge.override,
+    'warm_command': merge.override,
+    'warm_max_uses': merge.override,
+    'warm_idle_timeout': merge.override,
+    'stream_output': merge.override,
+    'stream_commands': merge.override,
+    'highlights': merge.override,
+    'stylesheet': merge.deep,
+}
+
+merge_settings = merge.Merge(merge.left, merge.discard, settings_strategies).compile(default_settings.keys())
 
 run_defaults = {
     'detach': False,
@@ -64,6 +115,8 @@ run_defaults = {
     'help': None,
     'service': None,
     'args': [],
+    'depends': [],
+    'warm': 0,
 }
 
 
@@ -77,6 +130,7 @@ exec_defaults = {
     'help': None,
     'service': None,
     'args': [],
+    'depends': [],
 }
 
 merge_task = merge.Merge(merge.left, merge.override)
@@ -98,10 +152,13 @@ task_arg_map = {
     'environment': argbuilder.multi_arg('-e', '{k}={v}'),
 }
 
+# task_arg_map compiled for building the arguments of every task at load time
+task_args = argbuilder.compile(task_arg_map)
+
 
 # singleton state for all program settings
 settings = dict(default_settings)
 
 
 # singleton state for output printer
-printer = StylePrinter()
+printer = StylePrinter(buffer_size=8192)
@@ -4,14 +4,46 @@ import os
 import cmd
 import stat
 import sys
-import functools
 import shlex
+import signal
 from .printer import printer_fmt
 from .show import do_help
 from .show import do_show
 from .settings import settings as global_settings
 from .settings import printer
 from .compose import run_compose
+from .compose import compose_command
+from .compose import select_hosts
+from .parallel import Job
+from .parallel import Runner
+from .depgraph import closure
+from .complete import Completer
+from .projects import Projects
+from .jobs import JobTable
+from .pool import WarmPool
+from .registry import CommandRegistry
+from .querycache import query_cache
+from .stats import Invocation
+from .stats import stats
+from .timing import timer
+
+
+def split_fresh(cmdargs, name=None):
+    """Splits the arguments of command name; returns (args, whether the query cache is bypassed).
+
+    '--fresh' is only taken as a dcsh option ahead of all other arguments, for commands
+    whose output is cached; otherwise it is passed on like any other argument.  Without
+    a name, as for dc, the command is found in the arguments that follow.
+    """
+    args = shlex.split(cmdargs)
+    if args[:1] != ['--fresh'] or not query_cache.ttl([name] if name else args[1:]):
+        return args, False
+    return args[1:], True
+
+
+# built-ins that take precedence over tasks and commands of the same name; docker-compose
+# has a kill command of its own, which 'dc kill' still runs
+job_builtins = frozenset(['bg', 'jobs', 'fg', 'kill'])
 
 
 class ShellExit(Exception):
@@ -20,53 +52,151 @@ class ShellExit(Exception):
 
 
 class DcShell(cmd.Cmd):
-    def __init__(self, settings=None, stdin=None):
+    def __init__(self, settings=None, stdin=None, reloader=None, profiler=None):
+        """Creates a shell for settings.
+
+        The optional reloader is called before every command; it returns a config.Changes
+        describing any configuration changes, or None.
+
+        The optional profiler is a profiling.Profiler that profiles each command.
+        """
         settings = settings or global_settings
+        self.settings = settings
         self.debug = settings['debug']
+        self.returncode = 0
+        self.reloader = reloader
+        self.profiler = profiler
+        self.projects = Projects(settings)
+        self.jobs = JobTable(settings)
+        self.pool = WarmPool(settings)
+        self.registry = CommandRegistry(settings, self._run_command, self._run_task)
+        self.completer = Completer(settings, [name[3:] for name in dir(DcShell)
+                                              if name.startswith('do_') and name != 'do_EOF'])
 
         # do not display any prompts on redirect/pipe mode
         mode = os.fstat(sys.stdin.fileno()).st_mode
-        if stat.S_ISFIFO(mode) or stat.S_ISREG(mode):
+        self.interactive = not (stat.S_ISFIFO(mode) or stat.S_ISREG(mode))
+        if self.interactive:
+            self.intro = settings['intro']
+            with timer.phase('prompt render'):
+                self.prompt = self._make_prompt()
+        else:
             self.intro = ''
             self.prompt = ''
-        else:
-            self.intro = settings['intro']
-
-            # prompt text varies based on debug mode
-            if self.debug:
-                prompt_text = settings['debug_prompt']
-                style = settings['debug_prompt_style']
-            else:
-                prompt_text = settings['prompt']
-                style = settings['prompt_style']
-            ss = settings['stylesheet']
-            self.prompt = printer_fmt(ss, style, prompt_text) + ' '
-
-        # create cmd.Cmd compatible proxy methods for commands
-        for name, help_text in settings['dc_commands'].items():
-            fn = functools.partial(self._run_command, name)
-            setattr(self, 'do_' + name, fn)
-            setattr(fn, '__doc__', help_text)
-        for name, task in settings['tasks'].items():
-            fn = functools.partial(self._run_task, task)
-            setattr(self, 'do_' + name, fn)
-            if task['help']:
-                setattr(fn, '__doc__', task['help'])
 
         cmd.Cmd.__init__(self, stdin=stdin)  # , stdout=printer.stream)
 
+    def _make_prompt(self):
+        """Returns the prompt text, which varies based on debug mode."""
+        if self.debug:
+            prompt_text = self.settings['debug_prompt']
+            style = self.settings['debug_prompt_style']
+        else:
+            prompt_text = self.settings['prompt']
+            style = self.settings['prompt_style']
+        return printer_fmt(self.settings['stylesheet'], style, prompt_text) + ' '
+
+    def _apply_changes(self, changes):
+        """Discards the handlers of the tasks and commands named by a config.Changes."""
+        if changes.commands:
+            self.registry.invalidate()
+        else:
+            self.registry.invalidate(changes.added + changes.removed + changes.replaced)
+        self.pool.discard(changes.removed + changes.replaced)
+        self.completer.invalidate()
+        self.debug = self.settings['debug']
+        if self.interactive:
+            self.prompt = self._make_prompt()
+
     def _run_command(self, name, cmdargs):
-        """Runs a specified docker-compose command with optional args."""
-        run_compose(name, *shlex.split(cmdargs))
+        """Runs a specified docker-compose command with optional args.
+
+        A leading '--fresh' argument bypasses the query cache.
+        """
+        args, fresh = split_fresh(cmdargs, name)
+        self.returncode = run_compose(name, *args, fresh=fresh)
 
-    def _run_task(self, task, cmdargs):
-        """Runs a specified task definition with optional args."""
-        run_compose(*(task['compiled_args'] + shlex.split(cmdargs)))
+    def _run_task(self, name, task, cmdargs):
+        """Runs a specified task definition with optional args, after its dependencies.
+
+        Tasks with warm containers are run in one of them when it is ready.
+        """
+        if not self._run_task_dependencies(task):
+            self.returncode = 1
+            return
+        args = shlex.split(cmdargs)
+        returncode = self.pool.run(name, task, args)
+        if returncode is None:
+            returncode = run_compose(*(task['compiled_args'] + args), label=name)
+        self.returncode = returncode
+
+    def _run_task_dependencies(self, task):
+        """Runs the dependencies of a task; returns False, after reporting why, if the task must not run."""
+        try:
+            succeeded = not task.get('depends') or self._run_dependencies(task['depends'])
+        except Exception as e:
+            printer.error('{}', str(e)).newline()  # a dependency that cannot be compiled
+            return False
+        if not succeeded:
+            printer.error('Dependencies failed; task not run.').newline()
+        return succeeded
+
+    def _run_dependencies(self, names):
+        """Runs the named tasks, and everything they depend on, concurrently where possible.
+
+        Returns True if all of them succeeded.
+        """
+        jobs = self._dependency_jobs(names)
+        runner = Runner(printer, self.settings['jobs'])
+        runner.run(jobs)
+        runner.summary(jobs)
+        self._record_jobs(jobs)
+        return not any(job.failed for job in jobs)
+
+    def _dependency_jobs(self, names, skip=()):
+        """Returns a job for each of the named tasks and everything they depend on, dependencies first.
+
+        Tasks named in skip are left out, as they are run by jobs of the caller's own.
+        """
+        tasks = self.settings['tasks']
+        order = [name for name in closure(lambda name: tasks[name]['depends'], names) if name not in skip]
+        for name in order:
+            query_cache.note(tasks[name]['compiled_args'])
+        return [Job(name, compose_command(*tasks[name]['compiled_args']), depends=tasks[name]['depends'])
+                for name in order]
+
+    def _command_argv(self, name, args, options=()):
+        """Returns the docker-compose argv for a task or command name, or dc; None if unknown.
+
+        The optional options are docker-compose options that go before the command.
+        """
+        if name in self.settings['tasks']:
+            words = self.settings['tasks'][name]['compiled_args'] + args
+        elif name in self.settings['dc_commands']:
+            words = [name] + args
+        elif name == 'dc':
+            words = list(args)
+        else:
+            return None
+        query_cache.note(words)
+        return compose_command(*(list(options) + words))
 
     def get_names(self):
         """Cmd override to provide sane name support for cmd.Cmd."""
         return dir(self)
 
+    def completenames(self, text, *ignored):
+        """Cmd override that completes command and task names from an index."""
+        if text.startswith('@'):
+            return self.completer.projects(text)
+        if text.startswith('%'):
+            return self.completer.host_groups(text)
+        return self.completer.names(text)
+
+    def completedefault(self, text, line, begidx, endidx):
+        """Cmd override that completes service names for commands that take them."""
+        return self.completer.arguments(text, line, begidx)
+
     def emptyline(self):
         """Cmd override that does nothing on empty input."""
         pass
@@ -78,34 +208,327 @@ class DcShell(cmd.Cmd):
         raise ShellExit()
 
     def do_dc(self, cmdargs):
-        """Passthrough to docker-compose."""
-        run_compose(*shlex.split(cmdargs))
+        """Passthrough to docker-compose; a leading '--fresh' argument bypasses the query cache."""
+        args, fresh = split_fresh(cmdargs)
+        self.returncode = run_compose(*args, fresh=fresh)
+
+    def do_parallel(self, cmdargs):
+        """Runs several tasks or commands concurrently.
+
+        Each argument is a task or command name; quote it to pass arguments along, e.g.
+        parallel lint test "logs web"
+
+        Tasks start once everything they depend on has succeeded; a dependency shared by
+        several of them is run only once.
+        """
+        tasks = self.settings['tasks']
+        jobs = []
+        depends = []
+        try:
+            for item in shlex.split(cmdargs):
+                words = shlex.split(item)
+                argv = self._command_argv(words[0], words[1:]) if words else None
+                if argv is None:
+                    raise Exception('Unknown task or command: {}'.format(item))
+                task = tasks[words[0]] if words[0] in tasks else {}
+                depends.extend(task.get('depends') or [])
+                jobs.append(Job(item, argv, depends=task.get('depends')))
+            jobs = self._dependency_jobs(depends, skip=[job.name for job in jobs]) + jobs
+        except Exception as e:
+            printer.error('{}', str(e)).newline()  # including a task that cannot be compiled
+            self.returncode = 1
+            return
+        self._run_jobs(jobs)
+
+    def _run_jobs(self, jobs):
+        """Runs jobs concurrently, and reports a summary; the returncode is 1 if any failed."""
+        runner = Runner(printer, self.settings['jobs'])
+        runner.run(jobs)
+        runner.summary(jobs)
+        self._record_jobs(jobs)
+        self.returncode = 0 if all(job.returncode == 0 for job in jobs) else 1
+
+    def _record_jobs(self, jobs):
+        """Records the timings of jobs that ran to completion in dcsh.stats."""
+        for job in jobs:
+            if job.end_time is not None:
+                invocation = Invocation(job.name, job.start_time)
+                invocation.spawned = job.spawn_time
+                invocation.returncode = job.returncode
+                invocation.end = job.end_time
+                stats.record(invocation)
+
+    def default(self, line):
+        """Cmd override that fans lines with an '@' or '%' prefix out across projects or hosts.
+
+        '@all', or a comma separated list of project names, runs the rest of the line in each
+        of those compose projects, e.g. @web,api up -d
+
+        '%' followed by a comma separated list of host groups runs the rest of the line
+        against each Docker host in those groups, e.g. %staging ps
+        """
+        if not line.startswith(('@', '%')):
+            return cmd.Cmd.default(self, line)
+        spec, _, cmdargs = line[1:].partition(' ')
+        words = shlex.split(cmdargs)
+        try:
+            if not words:
+                raise Exception('No command given.')
+            if line.startswith('@'):
+                jobs = self._project_jobs(spec, words)
+            else:
+                jobs = self._host_jobs(spec, words)
+        except Exception as e:
+            printer.error('{}', str(e)).newline()
+            self.returncode = 1
+            return
+        self._run_jobs(jobs)
+
+    def _project_jobs(self, spec, words):
+        """Returns jobs that run words in each of the projects selected by spec."""
+        names = self.projects.select(spec)
+        if not names:
+            raise Exception('No projects are configured.')
+        return [Job(name, self.projects.command(name, words), cwd=self.projects.directory(name))
+                for name in names]
+
+    def _host_jobs(self, spec, words):
+        """Returns jobs that run words against each of the Docker hosts selected by spec."""
+        hosts = select_hosts(spec)
+        if not hosts:
+            raise Exception('No hosts are configured.')
+        if self._command_argv(words[0], words[1:]) is None:
+            raise Exception('Unknown task or command: {}'.format(words[0]))
+        # the host is passed as an option rather than DOCKER_HOST, which sudo would drop
+        return [Job(host, self._command_argv(words[0], words[1:], ['-H', host]),
+                    timeout=self.settings['host_timeout'])
+                for host in hosts]
+
+    def do_bg(self, cmdargs):
+        """Runs a task or command in the background, e.g. bg logs -f
+
+        Ending a task or command line with '&' does the same.  Use 'jobs' to list
+        background jobs, 'fg N' to see a job's output, and 'kill N' to stop it.
+
+        A task's dependencies are run first, in the foreground; the task itself always gets
+        a container of its own, rather than a warm one.
+        """
+        words = shlex.split(cmdargs)
+        try:
+            argv = self._command_argv(words[0], words[1:]) if words else None
+        except Exception as e:
+            printer.error('{}', str(e)).newline()
+            self.returncode = 1
+            return
+        if argv is None:
+            printer.error('Unknown task or command: {}', cmdargs).newline()
+            self.returncode = 1
+            return
+        if words[0] in self.settings['tasks'] and not self._run_task_dependencies(self.settings['tasks'][words[0]]):
+            self.returncode = 1
+            return
+        try:
+            job = self.jobs.start(' '.join(words), argv)
+        except EnvironmentError as e:
+            printer.error('Cannot start job: {}', str(e)).newline()  # e.g. an unusable job_log_dir
+            self.returncode = 1
+            return
+        if job.process is None:
+            printer.error('[{}] failed to start: {}', job.number, ' '.join(argv)).newline()
+            self.returncode = 1
+            return
+        printer.text('[{}] {}', job.number, job.process.pid).newline()
+        self.returncode = 0
+
+    def do_jobs(self, cmdargs):
+        """Lists background jobs."""
+        if not self.jobs.jobs:
+            printer.text('No background jobs.').newline()
+        for number, job in sorted(self.jobs.jobs.items()):
+            printer.text('[{}] {:<8} {}', number, job.state, job.name).newline()
+
+    def do_fg(self, cmdargs):
+        """Shows the output of a background job, and waits for it to finish, e.g. fg 2
+
+        Without a job number, the most recent job is used.  CTRL+C is passed on to the job.
+        """
+        try:
+            job = self._job(cmdargs)
+        except Exception as e:
+            printer.error('{}', str(e)).newline()
+            self.returncode = 1
+            return
+        printer.flush()
+        self.returncode = self.jobs.follow(job, printer.stream)
+        self._job_finished(job)
+
+    def do_kill(self, cmdargs):
+        """Terminates a background job, or discards a finished one, e.g. kill 2
+
+        Use 'dc kill' for the docker-compose command.
+        """
+        try:
+            job = self._job(cmdargs)
+        except Exception as e:
+            printer.error('{}', str(e)).newline()
+            self.returncode = 1
+            return
+        if job.poll() is not None:
+            self.jobs.discard(job)
+            self._job_finished(job)
+        elif job.signal(signal.SIGTERM):
+            printer.text('[{}] terminated  {}', job.number, job.name).newline()
+        else:
+            printer.error('[{}] could not be terminated  {}', job.number, job.name).newline()
+            self.returncode = 1
+
+    def _job(self, spec):
+        """Returns the job named by spec, or the most recent job if spec is empty."""
+        spec = spec.strip()
+        if spec:
+            return self.jobs.get(spec)
+        if not self.jobs.jobs:
+            raise Exception('No background jobs.')
+        return self.jobs.jobs[max(self.jobs.jobs)]
+
+    def _job_finished(self, job):
+        """Records a finished background job in dcsh.stats, once."""
+        if not job.reported and job.returncode is not None:
+            job.reported = True
+            stats.record(job.invocation)
+
+    def _report_jobs(self):
+        """Reports background jobs that finished since the last command."""
+        for job in self.jobs.reap():
+            printer.text('[{}] {:<8} {}', job.number, job.state, job.name).newline()
+            stats.record(job.invocation)
 
     def do_show(self, cmdargs):
         """Shows current configuration."""
         do_show()
 
+    def do_stats(self, cmdargs):
+        """Shows timings of the commands run so far.
+
+        'stats --save FILE' appends them to a JSON-lines file, and 'stats --clear' discards them.
+        """
+        args = shlex.split(cmdargs)
+        if args[:1] == ['--save'] and len(args) == 2:
+            try:
+                stats.save(args[1])
+            except EnvironmentError as e:
+                printer.error('Cannot save stats: {}', str(e)).newline()
+                self.returncode = 1
+        elif args == ['--clear']:
+            stats.clear()
+        elif not args:
+            stats.report(printer)
+        else:
+            printer.error('Usage: stats [--save FILE | --clear]').newline()
+            self.returncode = 1
+
     def do_help(self, cmdargs):
-        """Shows help text."""
-        do_help()
+        """Shows help text, for everything or for a single command or task."""
+        name = cmdargs.strip()
+        if name in self.registry and name not in job_builtins:
+            try:
+                help_text = self.registry.help(name)
+            except Exception as e:
+                printer.error('{}', str(e)).newline()
+                self.returncode = 1
+                return
+            printer.subheading('{}:', name).text(help_text or '').newline()
+        else:
+            do_help()
 
     def do_build(self, cmdargs):
         """Builds all services or specified services."""
-        run_compose('build', *shlex.split(cmdargs))
+        self.returncode = run_compose('build', *shlex.split(cmdargs))
 
     def do_EOF(self, cmdargs):
         """Undocumented command shim to allow cmd.Cmd to function on a pipe."""
         return True
 
-    def cmdloop(self, intro=None):
-        """Cmd override that handles CTRL+C gracefully."""
-        intro_text = intro or self.intro
-        if intro_text:
-            printer.intro(intro_text)
-        while True:
+    def precmd(self, line):
+        """Cmd override that picks up configuration changes and finished jobs before each command."""
+        self._report_jobs()
+        self.pool.maintain()
+        if self.reloader is not None:
             try:
-                cmd.Cmd.cmdloop(self, intro='')  # start loop but suppress intro
-            except KeyboardInterrupt:
-                printer.text('KeyboardInterrupt').newline()
-            except ShellExit:
-                break
+                changes = self.reloader()
+            except Exception as e:
+                printer.error('Configuration not reloaded: {}', str(e)).newline()
+            else:
+                if changes is not None:
+                    self._apply_changes(changes)
+        return line
+
+    def onecmd(self, line):
+        """Cmd override that times each command, and profiles it if a profiler is set."""
+        name = line.split(None, 1)[0] if line.strip() else 'emptyline'
+        with timer.phase('command: ' + name):
+            if self.profiler is None:
+                return self._dispatch(line)
+            with self.profiler.section(name):
+                return self._dispatch(line)
+
+    def _dispatch(self, line):
+        """Runs a line through the registry if it names a command or task, or cmd.Cmd otherwise.
+
+        Commands and tasks take precedence over built-in commands of the same name, except
+        for the job control built-ins.  A line ending in '&' is run in the background.
+        """
+        stripped = line.rstrip()
+        if stripped.endswith('&') and not stripped.endswith('&&'):
+            return self.do_bg(stripped[:-1])
+        command, arg, line = self.parseline(line)
+        try:
+            handler = self.registry.handler(command) if command and command not in job_builtins else None
+        except Exception as e:
+            printer.error('{}', str(e)).newline()  # a task that cannot be compiled
+            self.returncode = 1
+            return
+        if handler is None:
+            return cmd.Cmd.onecmd(self, line)
+        self.lastcmd = line
+        return handler(arg)
+
+    def preloop(self):
+        """Cmd override that flushes pending output before the first prompt."""
+        printer.flush()
+        timer.record('first prompt', timer.origin)
+
+    def postcmd(self, stop, line):
+        """Cmd override that flushes pending output before the next prompt."""
+        printer.flush()
+        return stop
+
+    def cmdloop(self, intro=None):
+        """Cmd override that handles CTRL+C gracefully.
+
+        Warm containers are only kept for the duration of the loop: they are removed however
+        it ends, including on SIGTERM, or SIGHUP when the terminal is closed.
+        """
+        self.pool.enabled = True
+        handlers = {signum: signal.signal(signum, self.terminate) for signum in (signal.SIGTERM, signal.SIGHUP)}
+        try:
+            intro_text = intro or self.intro
+            if intro_text:
+                printer.intro(intro_text)
+            while True:
+                try:
+                    cmd.Cmd.cmdloop(self, intro='')  # start loop but suppress intro
+                except KeyboardInterrupt:
+                    printer.text('KeyboardInterrupt').newline()
+                except ShellExit:
+                    break
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)  # a second signal ends dcsh without cleaning up
+            self.jobs.close()
+            self.pool.drain()
+            printer.flush()
+
+    def terminate(self, signum, frame):
+        """Signal handler that leaves the command loop, so that it can clean up."""
+        sys.exit(128 + signum)
@@ -16,12 +16,49 @@ def do_show():
     else:
         printer.off('Disabled')
 
+    printer.subheading('Parallel jobs:').text(str(settings['jobs']))
+    printer.subheading('Query cache:')
+    if settings['query_cache']:
+        printer.on('Enabled - {}', ', '.join('{} {}s'.format(name, ttl)
+                                             for name, ttl in sorted(settings['query_cache'].items())))
+    else:
+        printer.off('Disabled')
+    printer.subheading('Background job output:')
+    if settings['job_log_dir']:
+        printer.text('Logged to {}', settings['job_log_dir'])
+    else:
+        printer.text('Last {} lines kept in memory', settings['job_buffer_lines'])
+    printer.subheading('Warm containers:')
+    printer.text('Used {} times at most, removed after {}s idle',
+                 settings['warm_max_uses'], settings['warm_idle_timeout'])
+    printer.subheading('Output highlighting:')
+    if settings['stream_output']:
+        printer.on('Enabled - for {}', ', '.join(settings['stream_commands']))
+    else:
+        printer.off('Disabled')
+
     printer.subheading('Sudo mode:')
     if settings['sudo']:
         printer.on('Enabled - All docker-compose commands will use "sudo".')
     else:
         printer.off('Disabled')
 
+    printer.heading('Projects')
+    if settings['projects']:
+        for name, directory in sorted(settings['projects'].items()):
+            printer.subheading('{}:', name).text(directory)
+    else:
+        printer.newline().text('No projects are configured.')
+
+    printer.heading('Host groups')
+    if settings['host_groups']:
+        for name, hosts in sorted(settings['host_groups'].items()):
+            printer.subheading('{}:', name).text(', '.join(hosts))
+        if settings['host_timeout']:
+            printer.subheading('Timeout:').text('{}s per host', settings['host_timeout'])
+    else:
+        printer.newline().text('No host groups are configured.')
+
     printer.heading('Task environment')
     if settings['environment']:
         for name, value in settings['environment'].items():
@@ -44,12 +81,22 @@ def do_help():
     printer.subheading('show:').text('Displays DCSH configuration details')
     printer.subheading('exit:').text('Exits the shell')
     printer.subheading('dc:').text('Runs docker-compose')
+    printer.subheading('parallel:').text('Runs several tasks or commands concurrently')
+    printer.subheading('stats:').text('Shows timings of the commands run so far')
+    printer.subheading('bg:').text('Runs a task or command in the background; so does a trailing "&"')
+    printer.subheading('jobs:').text('Lists background jobs')
+    printer.subheading('fg:').text('Shows the output of a background job, and waits for it')
+    printer.subheading('kill:').text('Terminates a background job; "dc kill" runs docker-compose kill')
+    printer.subheading('@<projects>:').text('Runs a task or command in each of several projects, e.g. @all ps')
+    printer.subheading('%<groups>:').text('Runs a task or command against each host in host groups, e.g. %staging ps')
 
     if settings['tasks']:
         printer.heading('User defined tasks')
-        for name, value in settings['tasks'].items():
-            if value['help']:
-                printer.subheading('{}:', name).text(value['help'])
+        tasks = settings['tasks']
+        for name in tasks:
+            help_text = tasks.help(name)
+            if help_text:
+                printer.subheading('{}:', name).text(help_text)
             else:
                 printer.subheading(name)
     else:
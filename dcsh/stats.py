@@ -0,0 +1,163 @@
+"""In-memory statistics of docker-compose invocations, for the 'stats' built-in."""
+
+import os
+import json
+import math
+import time
+from collections import deque
+
+# most recent invocations kept in memory
+max_records = 1000
+
+# upper bounds of the wall time histogram buckets, in seconds
+histogram_buckets = [0.1, 0.3, 1, 3, 10, 30, 100]
+
+# widest histogram bar, in characters
+histogram_width = 30
+
+
+class Invocation(object):
+    """Timing and outcome of a single command run."""
+
+    def __init__(self, command, start=None):
+        """Starts timing command, a label such as a docker-compose command or task name."""
+        self.command = command
+        self.start = start if start is not None else time.time()
+        self.spawned = None
+        self.end = None
+        self.returncode = None
+
+    def mark_spawned(self):
+        """Records that the child process has been created."""
+        self.spawned = time.time()
+
+    def finish(self, returncode):
+        """Records the exit code, and the end of the run."""
+        self.returncode = returncode
+        self.end = time.time()
+        return self
+
+    @property
+    def spawn_latency(self):
+        """Seconds taken to create the child process, or None if it never started."""
+        if self.spawned is None:
+            return None
+        return self.spawned - self.start
+
+    @property
+    def wall(self):
+        """Seconds from start to finish."""
+        return self.end - self.start
+
+    def as_dict(self):
+        """Returns the invocation as a JSON-serializable dict."""
+        return {
+            'command': self.command,
+            'start': self.start,
+            'spawn': self.spawn_latency,
+            'wall': self.wall,
+            'returncode': self.returncode,
+        }
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of sorted values; fraction is between 0 and 1."""
+    index = int(math.ceil(fraction * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def histogram(values):
+    """Returns (bucket upper bound, count) pairs for values; the last bound is None."""
+    counts = [0] * (len(histogram_buckets) + 1)
+    for value in values:
+        for ii, bound in enumerate(histogram_buckets):
+            if value < bound:
+                counts[ii] += 1
+                break
+        else:
+            counts[-1] += 1
+    return list(zip(histogram_buckets + [None], counts))
+
+
+class Stats(object):
+    """Bounded store of recent invocations, with per-command summaries."""
+
+    def __init__(self, limit=max_records):
+        """Creates an empty store that keeps the most recent limit invocations."""
+        self.records = deque(maxlen=limit)
+        self.recorded = 0  # invocations recorded so far, including those no longer kept
+        self.saved = {}  # file path -> value of recorded when last saved there
+
+    def record(self, invocation):
+        """Adds a finished invocation."""
+        self.records.append(invocation)
+        self.recorded += 1
+
+    def clear(self):
+        """Discards all invocations."""
+        self.records.clear()
+
+    def summary(self):
+        """Returns a dict of command -> summary dict, for all recorded commands.
+
+        Each summary has the count, failures, and sorted lists of wall and spawn times.
+        """
+        summary = {}
+        for inv in self.records:
+            entry = summary.get(inv.command)
+            if entry is None:
+                entry = summary[inv.command] = {'count': 0, 'failures': 0, 'wall': [], 'spawn': []}
+            entry['count'] += 1
+            if inv.returncode != 0:
+                entry['failures'] += 1
+            entry['wall'].append(inv.wall)
+            if inv.spawn_latency is not None:
+                entry['spawn'].append(inv.spawn_latency)
+        for entry in summary.values():
+            entry['wall'].sort()
+            entry['spawn'].sort()
+        return summary
+
+    def report(self, printer):
+        """Writes per-command counts, failure rates, latency percentiles and histograms."""
+        printer.title('Command statistics')
+        summary = self.summary()
+        if not summary:
+            printer.text('No commands have been run yet.').newline()
+            return
+        width = max(len(name) for name in summary)
+        for name in sorted(summary):
+            entry = summary[name]
+            wall = entry['wall']
+            printer.subheading(name.ljust(width))
+            printer.text('{:>5} runs  ', entry['count'])
+            if entry['failures']:
+                printer.off('{:>3.0f}% failed', 100.0 * entry['failures'] / entry['count'])
+            else:
+                printer.on('  0% failed')
+            if entry['spawn']:
+                printer.text('  spawn p50 {:.1f}ms', percentile(entry['spawn'], 0.5) * 1000)
+            printer.text('  wall p50 {:.2f}s p95 {:.2f}s max {:.2f}s',
+                         percentile(wall, 0.5), percentile(wall, 0.95), wall[-1])
+            printer.newline()
+            buckets = histogram(wall)
+            peak = max(count for bound, count in buckets)
+            for bound, count in buckets:
+                if count:
+                    label = '< {}s'.format(bound) if bound is not None else '>= {}s'.format(histogram_buckets[-1])
+                    bar = '#' * max(1, count * histogram_width // peak)
+                    printer.text('    {:>8} {:<{}} {}', label, bar, histogram_width, count).newline()
+        printer.newline()
+
+    def save(self, file_path):
+        """Appends the invocations not yet saved to a JSON-lines file."""
+        file_path = os.path.abspath(file_path)
+        unsaved = self.recorded - self.saved.get(file_path, 0)
+        with open(file_path, 'a') as f:
+            for inv in list(self.records)[max(0, len(self.records) - unsaved):]:
+                f.write(json.dumps(inv.as_dict(), sort_keys=True) + '\n')
+        self.saved[file_path] = self.recorded
+
+
+# singleton store for all commands run by the shell
+stats = Stats()
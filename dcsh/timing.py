@@ -0,0 +1,112 @@
+"""Lightweight wall-clock timing of named program phases, with Chrome trace-event output."""
+
+import os
+import json
+import time
+
+
+class _Phase(object):
+    """Context manager that records the enclosed block as a phase of a PhaseTimer."""
+
+    def __init__(self, timer, name, track):
+        self.timer = timer
+        self.name = name
+        self.track = track
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.timer.record(self.name, self.start, track=self.track)
+
+
+class _NoPhase(object):
+    """Context manager that does nothing; stands in for _Phase while timing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+_no_phase = _NoPhase()
+
+
+class PhaseTimer(object):
+    """Records the start and end times of named phases, relative to a common origin.
+
+    Phases are only recorded while the timer is enabled; otherwise phase() and record()
+    return immediately.  Each phase belongs to a track, which is shown as a separate
+    thread in trace viewers; phases that overlap in time must be on different tracks.
+    """
+
+    def __init__(self):
+        """Creates an empty, disabled timer whose origin is the current time."""
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        """Discards all recorded phases and restarts the origin."""
+        self.origin = time.time()
+        self.phases = []
+
+    def now(self):
+        """Returns the current time, for use with record()."""
+        return time.time()
+
+    def record(self, name, start, end=None, track='main'):
+        """Records a phase that ran from start to end (default: now)."""
+        if self.enabled:
+            self.phases.append((name, start, end if end is not None else time.time(), track))
+
+    def phase(self, name, track='main'):
+        """Returns a context manager that records the enclosed block as a phase."""
+        if not self.enabled:
+            return _no_phase
+        return _Phase(self, name, track)
+
+    def report(self, printer, since=None):
+        """Writes a per-phase breakdown, ordered by start time, to a StylePrinter.
+
+        If since is given, only phases that started at or after it are included.
+        """
+        printer.writeln('debug', 'Startup phases (start +duration, ms):')
+        for name, start, end, track in sorted(self.phases, key=lambda p: p[1]):
+            if since is None or start >= since:
+                printer.writeln('debug', '  {:8.1f} +{:<8.1f} {}',
+                                (start - self.origin) * 1000, (end - start) * 1000, name)
+
+    def trace_events(self):
+        """Returns the recorded phases as a list of Chrome trace events."""
+        pid = os.getpid()
+        tracks = []
+        events = []
+        for name, start, end, track in self.phases:
+            if track not in tracks:
+                tracks.append(track)
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': len(tracks),
+                               'args': {'name': track}})
+            events.append({
+                'name': name,
+                'cat': 'dcsh',
+                'ph': 'X',
+                'ts': (start - self.origin) * 1000000,
+                'dur': (end - start) * 1000000,
+                'pid': pid,
+                'tid': tracks.index(track) + 1,
+            })
+        return events
+
+    def write_trace(self, file_path):
+        """Writes the recorded phases to file_path as a Chrome trace-event JSON file.
+
+        The file can be loaded in chrome://tracing, Perfetto, or speedscope.
+        """
+        with open(file_path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
+
+
+# singleton timer for startup phases
+timer = PhaseTimer()
@@ -0,0 +1,151 @@
+"""Change detection for configuration files, using inotify where available."""
+
+import os
+import errno
+import struct
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+# events that mean a file in a watched directory was written, replaced, created or removed
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+event_header = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def stat_key(file_path):
+    """Returns (mtime, size, inode) for a file; None if it does not exist."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+class PollWatcher(object):
+    """Detects changed files by comparing stat results on every check."""
+
+    def __init__(self, paths):
+        """Starts watching paths; files that do not exist yet are watched for creation."""
+        self.paths = list(paths)
+        self._state = dict((file_path, stat_key(file_path)) for file_path in self.paths)
+
+    def changed(self):
+        """Returns the paths that changed since the last check, in watch order."""
+        changed = []
+        for file_path in self.paths:
+            key = stat_key(file_path)
+            if key != self._state[file_path]:
+                self._state[file_path] = key
+                changed.append(file_path)
+        return changed
+
+    def close(self):
+        """Releases any resources held by the watcher."""
+        pass
+
+
+class InotifyWatcher(object):
+    """Detects changed files with inotify watches on their directories.
+
+    Watching directories rather than files catches editors that save by renaming a new
+    file into place, and files that are created after the watch starts.  A check with no
+    pending events costs a single non-blocking read.
+    """
+
+    def __init__(self, paths, libc):
+        """Starts watching paths; raises OSError if inotify cannot be set up."""
+        self.paths = list(paths)
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise self._error()
+        self._names = {}  # wd -> {basename: path}
+        try:
+            for file_path in self.paths:
+                directory = os.path.dirname(os.path.abspath(file_path))
+                if not isinstance(directory, bytes):
+                    directory = directory.encode('utf-8')
+                wd = libc.inotify_add_watch(self._fd, directory, watch_mask)
+                if wd < 0:
+                    raise self._error()
+                self._names.setdefault(wd, {})[os.path.basename(file_path)] = file_path
+        except OSError:
+            self.close()
+            raise
+
+    def _error(self):
+        """Returns an OSError for the last failed libc call."""
+        import ctypes
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code))
+
+    def _read(self):
+        """Returns all pending events as (wd, mask, name) tuples."""
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.EAGAIN:
+                    return events
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = event_header.unpack_from(data, offset)
+                offset += event_header.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                if not isinstance(name, str):
+                    name = name.decode('utf-8')
+                events.append((wd, mask, name))
+                offset += length
+
+    def changed(self):
+        """Returns the paths that changed since the last check, in watch order."""
+        changed = set()
+        for wd, mask, name in self._read():
+            if mask & IN_Q_OVERFLOW:
+                return list(self.paths)  # events were lost; assume everything changed
+            file_path = self._names.get(wd, {}).get(name)
+            if file_path is not None:
+                changed.add(file_path)
+        return [file_path for file_path in self.paths if file_path in changed]
+
+    def close(self):
+        """Closes the inotify descriptor."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def load_libc():
+    """Returns libc through ctypes if it provides inotify; None otherwise."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+    return libc
+
+
+def watcher(paths):
+    """Returns an InotifyWatcher for paths where possible, and a PollWatcher otherwise."""
+    libc = load_libc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(paths, libc)
+        except OSError:
+            pass
+    return PollWatcher(paths)
@@ -0,0 +1,160 @@
+"""Fast YAML loading, including selective loading of a single top-level key."""
+
+import yaml
+from collections import deque
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+from yaml.events import AliasEvent
+from yaml.events import CollectionStartEvent
+from yaml.events import CollectionEndEvent
+from yaml.events import DocumentEndEvent
+from yaml.events import DocumentStartEvent
+from yaml.events import MappingEndEvent
+from yaml.events import MappingStartEvent
+from yaml.events import ScalarEvent
+from yaml.events import SequenceEndEvent
+from yaml.events import SequenceStartEvent
+from yaml.events import StreamEndEvent
+from yaml.events import StreamStartEvent
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+class EventLoader(Composer, SafeConstructor, Resolver):
+    """Loader that constructs data from a pre-recorded list of parser events."""
+
+    def __init__(self, events):
+        """Creates a loader around a sequence of yaml.events instances."""
+        self._events = deque(events)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+    def check_event(self, *choices):
+        """Parser interface: checks the type of the next event."""
+        if self._events:
+            return not choices or isinstance(self._events[0], choices)
+        return False
+
+    def peek_event(self):
+        """Parser interface: returns the next event without consuming it."""
+        return self._events[0]
+
+    def get_event(self):
+        """Parser interface: consumes and returns the next event."""
+        return self._events.popleft()
+
+    def dispose(self):
+        """Loader interface: nothing to release."""
+        pass
+
+
+def load(stream):
+    """Parses a YAML document using the fastest available safe loader."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def _consume(event, events, anchors, order, keep):
+    """Consumes the node that starts with event from the events iterator.
+
+    Every anchored node seen along the way is recorded into anchors, as a tuple of
+    (events, nested anchor names), and its name is appended to order.  Returns the
+    node's events if keep is set.
+    """
+
+    kept = [] if keep else None
+    recorders = []  # (name, events, nested names, depth) for each open anchored node
+    depth = 0
+    while True:
+        anchor = getattr(event, 'anchor', None)
+        if anchor and not isinstance(event, AliasEvent):
+            for recorder in recorders:
+                recorder[2].append(anchor)
+            order.append(anchor)
+            recorders.append((anchor, [], [], depth))
+        for recorder in recorders:
+            recorder[1].append(event)
+        if keep:
+            kept.append(event)
+
+        if isinstance(event, CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, CollectionEndEvent):
+            depth -= 1
+        while recorders and recorders[-1][3] == depth:
+            name, node_events, nested, _ = recorders.pop()
+            anchors[name] = (node_events, nested)
+
+        if depth == 0:
+            return kept
+        event = next(events)
+
+
+def _aliases(node_events):
+    """Returns the names of all aliases that appear in a list of events."""
+    return [e.anchor for e in node_events if isinstance(e, AliasEvent)]
+
+
+def load_key(stream, key, default=None):
+    """Returns the value of a top-level mapping key, materializing as little as possible.
+
+    The document is scanned as a stream of parser events.  Only the events for the
+    requested value, and for anchored nodes that it references, are turned into Python
+    objects.  Scanning stops as soon as the value has been read, so any content that
+    follows it is never parsed.
+    """
+
+    events = yaml.parse(stream, Loader=SafeLoader)
+    anchors = {}
+    order = []
+
+    # find the root mapping
+    for event in events:
+        if not isinstance(event, (StreamStartEvent, DocumentStartEvent)):
+            break
+    else:
+        return default
+    if not isinstance(event, MappingStartEvent):
+        return default
+
+    # walk top-level entries until the key is found
+    value_events = None
+    for event in events:
+        if isinstance(event, MappingEndEvent):
+            break
+        found = isinstance(event, ScalarEvent) and event.value == key
+        _consume(event, events, anchors, order, False)
+        value_events = _consume(next(events), events, anchors, order, found)
+        if found:
+            break
+    if not value_events:
+        return default
+
+    # include the transitive closure of referenced anchors, in definition order
+    local = set(getattr(e, 'anchor', None) for e in value_events if not isinstance(e, AliasEvent))
+    needed = set()
+    pending = _aliases(value_events)
+    while pending:
+        name = pending.pop()
+        if name not in needed and name not in local and name in anchors:
+            needed.add(name)
+            pending.extend(_aliases(anchors[name][0]))
+    prelude = []
+    covered = set()
+    for name in order:
+        if name in needed and name not in covered:
+            node_events, nested = anchors[name]
+            prelude.extend(node_events)
+            covered.add(name)
+            covered.update(nested)
+
+    # compose a synthetic document of [anchors..., value] and return the value
+    loader = EventLoader(
+        [StreamStartEvent(), DocumentStartEvent(), SequenceStartEvent(None, None, True)] +
+        prelude + value_events +
+        [SequenceEndEvent(), DocumentEndEvent(), StreamEndEvent()])
+    return loader.get_single_data()[-1]
@@ -1,8 +1,9 @@
 from setuptools import setup, find_packages
+from dcsh import __version__
 
 setup(
     name = 'dcsh',
-    version = '1.0.0',
+    version = __version__,
     url = 'https://github.com/eanderton/dcsh.git',
     author = 'Eric Anderton',
     author_email = 'eric.t.anderton@gmail.com',
@@ -55,3 +55,37 @@ class TestArgbuilder(unittest.TestCase):
                 '--bar two=three', '--bar four=five',
                 '--baz six', '--baz seven',
             ])
+
+    def test_templates(self):
+        self.assertEqual(argbuilder.arg('-d')('x'), ['-d'])
+        self.assertEqual(argbuilder.arg('{v}')(3), ['3'])
+        self.assertEqual(argbuilder.dict_arg('{k}={v}')({'a': 1}), ['a=1'])
+        self.assertEqual(argbuilder.dict_arg('-{k}-{v}-')({'a': 1}), ['-a-1-'])
+        self.assertEqual(argbuilder.arg('{{v}} {v}')('x'), ['{v} x'])
+        self.assertEqual(argbuilder.arg('{v!r}', '{v:>3}')('x'), ["'x'", '  x'])
+
+    def test_multi_arg_types(self):
+        fn = argbuilder.multi_arg('-e', '{v}')
+        self.assertEqual(fn('x'), ['-e', 'x'])
+        self.assertEqual(fn(['x', 'y']), ['-e', 'x', '-e', 'y'])
+        self.assertEqual(fn(5), ['-e', '5'])
+        self.assertEqual(fn(None), [])
+        self.assertEqual(fn({'k': 'v'}), ['-e', 'v'])
+        self.assertEqual(fn('y'), ['-e', 'y'])
+
+    def test_compile(self):
+        argmap = OrderedDict((
+            ('foo', argbuilder.arg('--foo {v}')),
+            ('bar', argbuilder.multi_arg('--bar', '{k}={v}')),
+            ('baz', argbuilder.iter_arg('--baz {v}')),
+        ))
+        builder = argbuilder.compile(argmap)
+        data = OrderedDict((
+            ('other', 'ignored'),
+            ('baz', ['six']),
+            ('bar', OrderedDict((('two', 'three'),))),
+            ('foo', 'one'),
+        ))
+        self.assertEqual(builder(data), argbuilder.build(argmap, data))
+        self.assertEqual(builder(data), ['--foo one', '--bar', 'two=three', '--baz six'])
+        self.assertEqual(builder({}), [])
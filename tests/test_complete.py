@@ -0,0 +1,132 @@
+"""Tests for the dcsh complete module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.complete as complete
+from mock import patch
+
+compose_yml = '''
+version: '3.4'
+x-dcsh:
+  tasks: {}
+services:
+  web:
+    image: nginx
+  worker:
+    image: python
+  db:
+    image: postgres
+'''
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def test_match(self):
+        index = complete.PrefixIndex(['up', 'build', 'push', 'pull', 'ps', 'pull'])
+        self.assertEqual(index.match('p'), ['ps', 'pull', 'push'])
+        self.assertEqual(index.match('pu'), ['pull', 'push'])
+        self.assertEqual(index.match('pull'), ['pull'])
+        self.assertEqual(index.match('x'), [])
+        self.assertEqual(index.match(''), ['build', 'ps', 'pull', 'push', 'up'])
+
+
+class TestCompleter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        with open('docker-compose.yml', 'w') as f:
+            f.write(compose_yml)
+        self.settings = {
+            'dc_commands': {'up': '', 'ps': '', 'exec': '', 'logs': '', 'run': ''},
+            'tasks': {'test': {}, 'tail': {}},
+            'completion_ttl': 5,
+        }
+        self.completer = complete.Completer(self.settings, ['exit', 'help', 'parallel'])
+        self.ps = patch.object(self.completer, '_ps', return_value=['web']).start()
+
+    def tearDown(self):
+        patch.stopall()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_names(self):
+        self.assertEqual(self.completer.names('e'), ['exec', 'exit'])
+        self.assertEqual(self.completer.names('t'), ['tail', 'test'])
+        self.settings['tasks']['extra'] = {}
+        self.assertEqual(self.completer.names('e'), ['exec', 'exit'])  # until invalidated
+        self.completer.invalidate()
+        self.assertEqual(self.completer.names('e'), ['exec', 'exit', 'extra'])
+
+    def test_services(self):
+        self.assertEqual(self.completer.arguments('w', 'up -d w', 6), ['web', 'worker'])
+        self.assertEqual(self.completer.arguments('', 'up web ', 7), ['db', 'web', 'worker'])
+        self.assertEqual(self.completer.arguments('', 'dc up ', 6), ['db', 'web', 'worker'])
+
+    def test_services_reloaded(self):
+        self.assertEqual(self.completer.services(''), ['db', 'web', 'worker'])
+        with patch('dcsh.complete.yamlload.load_key') as load_key:
+            self.completer.services('')
+            self.assertFalse(load_key.called)
+        with open('docker-compose.yml', 'w') as f:
+            f.write(compose_yml.replace('db:', 'cache:'))
+        self.assertEqual(self.completer.services(''), ['cache', 'web', 'worker'])
+
+    def test_no_compose_file(self):
+        os.remove('docker-compose.yml')
+        self.assertEqual(self.completer.services(''), [])
+
+    def test_running_services(self):
+        self.assertEqual(self.completer.arguments('', 'logs ', 5), ['web'])
+        self.assertEqual(self.completer.arguments('', 'exec ', 5), ['web'])
+        self.assertEqual(self.completer.arguments('', 'exec web ', 9), [])
+        self.assertEqual(self.ps.call_count, 1)
+
+    def test_running_services_expiry(self):
+        with patch('time.time', return_value=100.0):
+            self.completer.running_services('')
+        with patch('time.time', return_value=104.0):
+            self.completer.running_services('')
+            self.assertEqual(self.ps.call_count, 1)
+        with patch('time.time', return_value=105.0):
+            self.completer.running_services('')
+            self.assertEqual(self.ps.call_count, 2)
+
+    def test_other_arguments(self):
+        self.assertEqual(self.completer.arguments('t', 'parallel t', 9), ['tail', 'test'])
+        self.assertEqual(self.completer.arguments('t', 'bg t', 3), ['tail', 'test'])
+        self.assertEqual(self.completer.arguments('e', 'dc e', 3), ['exec'])
+        self.assertEqual(self.completer.arguments('-', 'up -', 3), [])
+        self.assertEqual(self.completer.arguments('', 'test ', 5), [])
+
+    def test_ps(self):
+        patch.stopall()
+        with patch('dcsh.complete.compose_command', return_value=['sh', '-c', 'echo web; echo db']):
+            self.assertEqual(self.completer._ps(), ['web', 'db'])
+        with patch('dcsh.complete.compose_command', return_value=['sh', '-c', 'echo web; exit 1']):
+            self.assertEqual(self.completer._ps(), [])
+        with patch('dcsh.complete.compose_command', return_value=[os.path.join(self.tmpdir, 'missing')]):
+            self.assertEqual(self.completer._ps(), [])
+
+
+class TestCompleteProjects(unittest.TestCase):
+    def setUp(self):
+        self.completer = complete.Completer({
+            'dc_commands': {'ps': ''},
+            'tasks': {},
+            'projects': {'web': 'web', 'api': 'api', 'worker': 'worker'},
+        }, [])
+
+    def test_projects(self):
+        self.assertEqual(self.completer.projects('@w'), ['@web', '@worker'])
+        self.assertEqual(self.completer.projects('@web,a'), ['@web,all', '@web,api'])
+        self.assertEqual(self.completer.projects('w'), ['web', 'worker'])
+        self.assertEqual(self.completer.arguments('a', '@a', 1), ['all', 'api'])
+        self.assertEqual(self.completer.arguments('p', '@all p', 5), ['ps'])
+
+    def test_host_groups(self):
+        self.completer.settings['host_groups'] = {'staging': [], 'prod': [], 'perf': []}
+        self.assertEqual(self.completer.host_groups('%p'), ['%perf', '%prod'])
+        self.assertEqual(self.completer.host_groups('%staging,pr'), ['%staging,prod'])
+        self.assertEqual(self.completer.arguments('s', '%s', 1), ['staging'])
@@ -1,8 +1,226 @@
+import os
+import shutil
+import tempfile
 import unittest
+import dcsh.compose as compose
+import dcsh.printer as printer
+from dcsh.highlight import Highlighter
+from dcsh.querycache import QueryCache
+from dcsh.stats import Stats
+from mock import patch
+from StringIO import StringIO
+
+fake_help = '''Define and run multi-container applications with Docker.
+
+Usage:
+  docker-compose [-f <arg>...] [options] [COMMAND] [ARGS...]
+
+Commands:
+  build              Build or rebuild services
+  help               Get help on a command
+  ps                 List containers
+  up                 Create and start containers
+'''
+
+
+def make_fake_dc(path, help_text=fake_help):
+    """Writes an executable stub docker-compose that logs each invocation."""
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n')
+        f.write('echo "$@" >> "{}.log"\n'.format(path))
+        f.write('cat >&2 <<"EOF"\n{}EOF\n'.format(help_text))
+    os.chmod(path, 0o755)
+    return path
+
+
+def call_count(path):
+    """Returns the number of times a stub from make_fake_dc was run."""
+    if not os.path.exists(path + '.log'):
+        return 0
+    with open(path + '.log') as f:
+        return len(f.readlines())
 
 
 class TestCompose(unittest.TestCase):
-    def test_compose(self):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dc_path = os.path.join(self.tmpdir, 'docker-compose')
+        with open(self.dc_path, 'w') as f:
+            f.write('#!/bin/sh\nfor arg in "$@"; do echo "$arg"; done > "$0.args"\nexit 3\n')
+        os.chmod(self.dc_path, 0o755)
+        dict_patch = patch.dict('dcsh.compose.settings', {
+            'dc_path': self.dc_path,
+            'sudo': False,
+            'debug': False,
+        })
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        self.settings = compose.settings
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.tmpdir)
+
+    def test_compose_command(self):
+        self.assertEqual(compose.compose_command('ps', '-q'), [self.dc_path, 'ps', '-q'])
+        self.settings['sudo'] = True
+        self.assertEqual(compose.compose_command('ps'), ['sudo', self.dc_path, 'ps'])
+
+    def test_run_compose(self):
+        """Args are passed verbatim without a shell, and the exit code is returned."""
+        self.assertEqual(compose.run_compose('run', 'svc', 'echo $HOME; "quoted arg"'), 3)
+        with open(self.dc_path + '.args') as f:
+            self.assertEqual(f.read().splitlines(), ['run', 'svc', 'echo $HOME; "quoted arg"'])
+
+    def test_run_compose_stats(self):
+        store = Stats()
+        with patch('dcsh.compose.stats', store):
+            compose.run_compose('ps')
+            compose.run_compose('run', 'svc', label='test')
+        self.assertEqual([(inv.command, inv.returncode) for inv in store.records], [('ps', 3), ('test', 3)])
+        for inv in store.records:
+            self.assertLessEqual(0, inv.spawn_latency)
+            self.assertLessEqual(inv.spawn_latency, inv.wall)
+
+    def test_run_compose_oneshot(self):
+        self.settings['oneshot'] = True
+        with patch('os.execvp') as execvp:
+            compose.run_compose('logs', '-f')
+            execvp.assert_called_once_with(self.dc_path, [self.dc_path, 'logs', '-f'])
+
+    def test_stream_compose(self):
+        out = StringIO()
+        p = printer.StylePrinter(out, {'error': {'color': 'red'}})
+        h = Highlighter([{'match': 'ERROR', 'style': 'error'}], p)
+        code = compose.stream_compose(['sh', '-c', 'echo one; echo ERROR >&2; printf two; exit 4'], h, out)
+        self.assertEqual(code, 4)
+        self.assertEqual(out.getvalue(), 'one\n\x1b[31mERROR\x1b[0m\ntwo')
+
+    def test_stream_compose_long_line(self):
+        """Unterminated output is flushed once it exceeds the line bound."""
+        out = StringIO()
+        h = Highlighter([], printer.StylePrinter(out))
+        with patch('dcsh.compose.stream_max_line', 10):
+            with patch('dcsh.compose.stream_chunk_size', 4):
+                compose.stream_compose(['printf', 'x' * 25], h, out)
+        self.assertEqual(out.getvalue(), 'x' * 25)
+
+    def test_run_compose_stream(self):
+        self.settings.update({
+            'oneshot': True,
+            'stream_output': True,
+            'stream_commands': ['logs'],
+            'highlights': [],
+        })
+        with patch('dcsh.compose.stream_compose', return_value=5) as stream:
+            self.assertEqual(compose.run_compose('logs', '-f'), 5)
+            self.assertEqual(stream.call_args[0][0], [self.dc_path, 'logs', '-f'])
+        with patch('os.execvp') as execvp:
+            compose.run_compose('exec', 'web', 'sh')
+            self.assertTrue(execvp.called)
+
+    def test_run_compose_cached(self):
+        with open(self.dc_path, 'w') as f:
+            f.write('#!/bin/sh\necho "$@" >> "$0.log"\n[ "$1" = ps ] && echo "output of $1"\nexit 0\n')
+        self.settings.update({'query_cache': {'ps': 60}, 'query_cache_size': 8})
+        out = StringIO()
+        with patch('dcsh.compose.query_cache', QueryCache()), patch('dcsh.compose.printer', printer.StylePrinter(out)):
+            self.assertEqual(compose.run_compose('ps'), 0)
+            self.assertEqual(compose.run_compose('ps'), 0)
+            compose.run_compose('ps', fresh=True)
+            compose.run_compose('up', '-d')
+            compose.run_compose('ps')
+        with open(self.dc_path + '.log') as f:
+            self.assertEqual(f.read().splitlines(), ['ps', 'ps', 'up -d', 'ps'])
+        self.assertEqual(out.getvalue(), 'output of ps\n' * 4)
+
+    def test_get_highlighter(self):
+        self.settings['highlights'] = [{'match': 'x', 'style': 'error'}]
+        self.assertIs(compose.get_highlighter(), compose.get_highlighter())
+        self.settings['highlights'] = []
+        self.assertIsNone(compose.get_highlighter().expr)
+
+    def test_exit_code(self):
+        self.assertEqual(compose.exit_code(0), 0)
+        self.assertEqual(compose.exit_code(2 << 8), 2)
+        self.assertEqual(compose.exit_code(9), 137)
+
+    def test_killed(self):
+        """Children killed by a signal give 128 + the signal number, however they are run."""
+        cmd = ['sh', '-c', 'kill -9 $$']
+        self.assertEqual(compose.spawn(cmd), 137)
+        out = StringIO()
+        self.assertEqual(compose.stream_compose(cmd, Highlighter([], printer.StylePrinter(out)), out), 137)
+        self.assertEqual(compose.capture_compose(cmd, out), (137, ''))
+
+
+class TestCommandsCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dc_path = make_fake_dc(os.path.join(self.tmpdir, 'docker-compose'))
+        dict_patch = patch.dict('os.environ', {'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache')})
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        dict_patch = patch.dict('dcsh.compose.settings', {'dc_path': self.dc_path})
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.tmpdir)
+
+    def test_scrape(self):
+        commands = compose.scrape_docker_compose_commands(self.dc_path)
+        self.assertEqual(sorted(commands.keys()), ['build', 'help', 'ps', 'up'])
+        self.assertEqual(commands['ps'], 'List containers')
+
+    def test_cache_hit(self):
+        first = compose.get_docker_compose_commands()
+        second = compose.get_docker_compose_commands()
+        self.assertEqual(first, second)
+        self.assertEqual(call_count(self.dc_path), 1)
+
+    def test_refresh(self):
+        compose.get_docker_compose_commands()
+        compose.get_docker_compose_commands(refresh=True)
+        self.assertEqual(call_count(self.dc_path), 2)
+
+    def test_binary_change(self):
+        compose.get_docker_compose_commands()
+        make_fake_dc(self.dc_path, fake_help + '  logs               View output from containers\n')
+        commands = compose.get_docker_compose_commands()
+        self.assertIn('logs', commands)
+        self.assertEqual(call_count(self.dc_path), 2)
+
+    def test_clear(self):
+        compose.get_docker_compose_commands()
+        compose.clear_commands_cache()
+        compose.get_docker_compose_commands()
+        self.assertEqual(call_count(self.dc_path), 2)
+
+    def test_missing_binary(self):
+        self.assertIsNone(compose.dc_fingerprint(os.path.join(self.tmpdir, 'nonexistent')))
+
+    def test_compose_command_config(self):
+        config = {'dc_path': '/opt/docker-compose', 'sudo': True}
+        self.assertEqual(compose.compose_command('ps', config=config), ['sudo', '/opt/docker-compose', 'ps'])
+
+
+class TestHosts(unittest.TestCase):
+    def setUp(self):
+        dict_patch = patch.dict('dcsh.compose.settings', {'host_groups': {
+            'staging': ['tcp://stage1:2376', 'tcp://stage2:2376'],
+            'prod': ['tcp://prod1:2376', 'tcp://stage2:2376'],
+        }})
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
 
-        pass
+    def tearDown(self):
+        patch.stopall()
 
+    def test_select_hosts(self):
+        self.assertEqual(compose.select_hosts('staging'), ['tcp://stage1:2376', 'tcp://stage2:2376'])
+        self.assertEqual(compose.select_hosts('staging,prod'), [
+            'tcp://stage1:2376', 'tcp://stage2:2376', 'tcp://prod1:2376'])
+        with self.assertRaisesRegexp(Exception, 'Unknown host group: dev'):
+            compose.select_hosts('staging,dev')
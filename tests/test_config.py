@@ -0,0 +1,270 @@
+"""Tests for the dcsh config module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.config as config
+from mock import patch
+
+dcsh_yml = '''
+environment:
+  FOO: bar
+tasks:
+  test:
+    help: runs tests
+    service: python-dev
+    args: coverage run setup.py test
+'''
+
+compose_yml = '''
+version: '3.4'
+x-dcsh:
+  tasks:
+    sh:
+      service: python-dev
+      exec: true
+      args: sh
+services:
+  python-dev:
+    image: python
+'''
+
+
+class ConfigTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        self.write('.dcsh.yml', dcsh_yml)
+        self.write('docker-compose.yml', compose_yml)
+        dict_patch = patch.dict('os.environ', {
+            'HOME': self.tmpdir,
+            'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache'),
+        })
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        dict_patch = patch.dict('dcsh.config.settings')
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        self.addCleanup(setattr, config.printer, 'stylesheet', config.printer.stylesheet)
+        self.addCleanup(setattr, config.printer, 'ansimode', config.printer.ansimode)
+        self.addCleanup(setattr, config.timer, 'enabled', config.timer.enabled)
+        self.scrape = patch('dcsh.config.CommandScrape').start()
+        self.scrape.return_value.result.return_value = {'ps': 'List containers', 'help': 'Get help'}
+        self.scrape.return_value.dc_path = 'docker-compose'
+
+    def tearDown(self):
+        patch.stopall()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, text):
+        with open(os.path.join(self.tmpdir, name), 'w') as f:
+            f.write(text)
+
+    def load(self):
+        config.load_settings(sudo=False, debug=False, no_color=True)
+        return config.settings
+
+
+class TestLoadSettings(ConfigTestCase):
+
+    def test_tasks(self):
+        settings = self.load()
+        self.assertEqual(settings['tasks']['test']['compiled_args'], [
+            'run', '--rm', '-e', 'FOO=bar', 'python-dev', 'coverage', 'run', 'setup.py', 'test'])
+        self.assertEqual(settings['tasks']['sh']['compiled_args'], [
+            'exec', '-e', 'FOO=bar', 'python-dev', 'sh'])
+        self.assertEqual(settings['dc_commands'], {'ps': 'List containers'})
+
+    def test_tasks_lazy(self):
+        with patch('dcsh.config.compile_task', side_effect=config.compile_task) as compile_task:
+            tasks = self.load()['tasks']
+            self.assertEqual(sorted(tasks), ['sh', 'test'])
+            self.assertEqual(tasks.help('test'), 'runs tests')
+            self.assertFalse(compile_task.called)
+            self.assertIs(tasks['sh'], tasks['sh'])
+            self.assertEqual(compile_task.call_count, 1)
+
+    def test_task_invalid(self):
+        """Compile errors name the task, and never look like a missing task."""
+        tasks = config.TaskTable({'bad': {'service': 'app', 'args': "echo 'unterminated"}}, {})
+        self.assertIn('bad', tasks)
+        with self.assertRaisesRegexp(Exception, 'Invalid task "bad": No closing quotation'):
+            tasks['bad']
+        with patch('dcsh.config.compile_task', side_effect=KeyError('service')):
+            with self.assertRaisesRegexp(Exception, 'Invalid task "bad"') as raised:
+                tasks.get('bad')
+            self.assertNotIsInstance(raised.exception, KeyError)
+        self.assertRaises(KeyError, lambda: tasks['missing'])
+
+    def test_flags(self):
+        with patch.object(config.timer, 'report') as report:
+            config.load_settings(sudo=True, debug=True, no_color=True)
+            report.assert_called_once_with(config.printer)
+        self.assertTrue(config.settings['sudo'])
+        self.assertTrue(config.settings['debug'])
+
+    def test_snapshot_hit(self):
+        first = dict(self.load())
+        with patch('dcsh.config.load_yaml') as load_yaml:
+            second = dict(self.load())
+            self.assertFalse(load_yaml.called)
+        self.assertEqual(first, second)
+
+    def test_snapshot_invalidated(self):
+        self.load()
+        self.write('.dcsh.yml', dcsh_yml.replace('bar', 'baz'))
+        settings = self.load()
+        self.assertIn('FOO=baz', settings['tasks']['test']['compiled_args'])
+
+    def test_snapshot_schema_changed(self):
+        """Snapshots compiled with other defaults are not reused, even if no source changed."""
+        self.load()
+        with patch.dict('dcsh.config.default_settings', {'new_setting': 1}):
+            with patch('dcsh.config.load_yaml', side_effect=config.load_yaml) as load_yaml:
+                self.load()
+                self.assertTrue(load_yaml.called)
+
+    def test_scrape_overlap(self):
+        """The scrape is started before configuration is compiled, and joined after."""
+        calls = []
+        scrape = self.scrape.return_value
+        self.scrape.side_effect = lambda *args: calls.append('start') or scrape
+        scrape.result.side_effect = lambda: calls.append('join') or {}
+        compile = config.SettingsCompiler.compile
+        with patch.object(config.SettingsCompiler, 'compile', autospec=True,
+                          side_effect=lambda compiler: calls.append('compile') or compile(compiler)):
+            self.load()
+        self.assertEqual(calls, ['start', 'compile', 'join'])
+
+    def test_scrape_restarted(self):
+        """A speculative scrape is discarded when dc_path is configured."""
+        self.write('.dcsh.yml', dcsh_yml + 'dc_path: /opt/bin/docker-compose\n')
+        self.load()
+        self.assertEqual([c[0] for c in self.scrape.call_args_list], [
+            ('docker-compose', False), ('/opt/bin/docker-compose', False)])
+        self.scrape.return_value.cancel.assert_called_once_with()
+
+    def test_scrape_snapshot_dc_path(self):
+        """On a snapshot hit, the scrape uses the configured dc_path directly."""
+        self.write('.dcsh.yml', dcsh_yml + 'dc_path: /opt/bin/docker-compose\n')
+        self.load()
+        self.scrape.reset_mock()
+        self.load()
+        self.assertEqual([c[0] for c in self.scrape.call_args_list], [('/opt/bin/docker-compose', False)])
+
+    def test_depends(self):
+        self.write('.dcsh.yml', dcsh_yml + '    depends: sh\n')
+        self.assertEqual(self.load()['tasks']['test']['depends'], ['sh'])
+
+    def test_depends_unknown(self):
+        self.write('.dcsh.yml', dcsh_yml + '    depends: [lint]\n')
+        with self.assertRaisesRegexp(Exception, 'Task "test" depends on unknown task "lint"'):
+            self.load()
+
+    def test_depends_cycle(self):
+        self.write('.dcsh.yml', dcsh_yml + '    depends: [sh]\n')
+        self.write('docker-compose.yml', compose_yml.replace('args: sh', 'args: sh\n      depends: [test]'))
+        with self.assertRaisesRegexp(Exception, 'Task dependency cycle: (sh -> test -> sh|test -> sh -> test)'):
+            self.load()
+
+    def test_stylesheet_merge(self):
+        """Configured styles are merged over the default stylesheet."""
+        self.write('.dcsh.yml', dcsh_yml + 'stylesheet:\n  error: {bold: true}\n  extra: {color: blue}\n')
+        stylesheet = self.load()['stylesheet']
+        self.assertEqual(stylesheet['error'], {'color': 'red', 'bold': True})
+        self.assertEqual(stylesheet['extra'], {'color': 'blue'})
+        self.assertEqual(stylesheet['prompt'], {'color': 'yellow'})
+
+
+class TestReload(ConfigTestCase):
+    def setUp(self):
+        ConfigTestCase.setUp(self)
+        dict_patch = patch.dict(config.live)
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        patch('dcsh.config.watch.watcher', side_effect=lambda paths: config.watch.PollWatcher(paths)).start()
+        self.load()
+        self.compile_task = patch('dcsh.config.compile_task', side_effect=config.compile_task).start()
+
+    def write(self, name, text):
+        ConfigTestCase.write(self, name, text)
+        path = os.path.join(self.tmpdir, name)
+        os.utime(path, (0, os.stat(path).st_mtime + 1))  # defeat coarse mtime resolution
+
+    def compiled(self):
+        return sorted(c[0][0]['service'] for c in self.compile_task.call_args_list)
+
+    def test_unchanged(self):
+        self.assertIsNone(config.reload_settings())
+
+    def test_same_content(self):
+        self.write('.dcsh.yml', dcsh_yml)
+        self.assertIsNone(config.reload_settings())
+
+    def test_task_changed(self):
+        with patch('dcsh.config.load_yaml_key') as load_yaml_key:
+            self.write('.dcsh.yml', dcsh_yml.replace('setup.py test', 'setup.py check'))
+            changes = config.reload_settings()
+            self.assertFalse(load_yaml_key.called)  # docker-compose.yml is not re-read
+        self.assertEqual(changes, config.Changes([], [], ['test'], False))
+        self.assertEqual(self.compiled(), [])  # tasks are compiled when used
+        self.assertEqual(config.settings['tasks']['test']['args'], ['coverage', 'run', 'setup.py', 'check'])
+
+    def test_compiled_task_changed(self):
+        """Compiled tasks are kept if unchanged, and only reported if their compiled form changed."""
+        config.settings['tasks']['test']
+        config.settings['tasks']['sh']
+        self.compile_task.reset_mock()
+        self.write('.dcsh.yml', dcsh_yml.replace('args: coverage run setup.py test',
+                                                 'args: [coverage, run, setup.py, test]'))
+        self.assertEqual(config.reload_settings(), config.Changes([], [], [], False))
+        self.assertEqual(self.compiled(), ['python-dev'])
+
+    def test_environment_changed(self):
+        self.write('.dcsh.yml', dcsh_yml.replace('bar', 'baz'))
+        self.assertEqual(config.reload_settings(), config.Changes([], [], ['sh', 'test'], False))
+        self.assertIn('FOO=baz', config.settings['tasks']['sh']['compiled_args'])
+
+    def test_tasks_added_and_removed(self):
+        self.write('docker-compose.yml', compose_yml.replace('    sh:', '    shell:'))
+        self.assertEqual(config.reload_settings(), config.Changes(['shell'], ['sh'], [], False))
+        self.assertEqual(self.compiled(), [])
+        self.assertEqual(sorted(config.settings['tasks']), ['shell', 'test'])
+
+    def test_settings_changed(self):
+        """Non-task settings are applied, command line flags still win, and commands are kept."""
+        config.load_settings(sudo=True, debug=False, no_color=True)
+        self.write('.dcsh.yml', dcsh_yml + 'sudo: false\nprompt: "$"\n')
+        self.assertEqual(config.reload_settings(), config.Changes([], [], [], False))
+        self.assertEqual(config.settings['prompt'], '$')
+        self.assertTrue(config.settings['sudo'])
+        self.assertEqual(config.settings['dc_commands'], {'ps': 'List containers'})
+        self.assertFalse(self.compile_task.called)
+
+    def test_dc_path_changed(self):
+        self.scrape.return_value.result.return_value = {'logs': 'View output'}
+        self.write('.dcsh.yml', dcsh_yml + 'dc_path: /opt/bin/docker-compose\n')
+        self.assertTrue(config.reload_settings().commands)
+        self.assertEqual(self.scrape.call_args[0], ('/opt/bin/docker-compose',))
+        self.assertEqual(config.settings['dc_commands'], {'logs': 'View output'})
+
+    def test_invalid(self):
+        """An invalid change is reported, and the settings are kept until it is fixed."""
+        self.write('.dcsh.yml', dcsh_yml + '    depends: [lint]\n')
+        with self.assertRaisesRegexp(Exception, 'unknown task "lint"'):
+            config.reload_settings()
+        self.assertEqual(config.settings['tasks']['test']['depends'], [])
+        self.write('.dcsh.yml', dcsh_yml + '    depends: [sh]\n')
+        self.assertEqual(config.reload_settings(), config.Changes([], [], ['test'], False))
+
+    def test_snapshot_updated(self):
+        self.write('.dcsh.yml', dcsh_yml.replace('bar', 'baz'))
+        config.reload_settings()
+        with patch('dcsh.config.load_yaml') as load_yaml:
+            self.load()
+            self.assertFalse(load_yaml.called)
+        self.assertIn('FOO=baz', config.settings['tasks']['test']['compiled_args'])
+        self.assertIsNone(config.reload_settings())
@@ -0,0 +1,26 @@
+"""Tests for the dcsh depgraph module."""
+
+import dcsh.depgraph as depgraph
+import unittest
+
+
+class TestFindCycle(unittest.TestCase):
+    def test_acyclic(self):
+        graph = {'a': ['b', 'c'], 'b': ['c'], 'c': [], 'd': ['a', 'external']}
+        self.assertIsNone(depgraph.find_cycle(graph))
+
+    def test_cycle(self):
+        graph = {'a': ['b'], 'b': ['c'], 'c': ['a'], 'd': []}
+        cycle = depgraph.find_cycle(graph)
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertEqual(sorted(cycle[:-1]), ['a', 'b', 'c'])
+
+    def test_self_cycle(self):
+        self.assertEqual(depgraph.find_cycle({'a': ['a']}), ['a', 'a'])
+
+
+class TestClosure(unittest.TestCase):
+    def test_closure(self):
+        graph = {'a': ['b', 'c'], 'b': ['c'], 'c': [], 'd': ['a'], 'e': []}
+        self.assertEqual(depgraph.closure(graph.get, ['a']), ['c', 'b', 'a'])
+        self.assertEqual(depgraph.closure(graph.get, ['d', 'e', 'b']), ['c', 'b', 'a', 'd', 'e'])
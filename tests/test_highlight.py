@@ -0,0 +1,40 @@
+"""Tests for the dcsh highlight module."""
+
+import dcsh.printer as printer
+import dcsh.highlight as highlight
+import unittest
+from StringIO import StringIO
+
+rules = [
+    {'match': r'^\w+\s+\|', 'style': 'service'},
+    {'match': r'\bERROR\b', 'style': 'error'},
+    {'match': r'x*', 'style': 'error'},
+]
+
+
+class TestHighlighter(unittest.TestCase):
+    def setUp(self):
+        self.printer = printer.StylePrinter(StringIO(), {
+            'service': {'color': 'cyan'},
+            'error': {'color': 'red'},
+        })
+        self.highlighter = highlight.Highlighter(rules, self.printer)
+
+    def test_apply(self):
+        text = 'web_1  | ERROR: failed\nweb_1  | ok ERRORS\n'
+        self.assertEqual(self.highlighter.apply(text),
+                         '\x1b[36mweb_1  |\x1b[0m \x1b[31mERROR\x1b[0m: failed\n'
+                         '\x1b[36mweb_1  |\x1b[0m ok ERRORS\n')
+
+    def test_no_match(self):
+        text = 'nothing to see here\n'
+        self.assertIs(self.highlighter.apply(text), text)
+
+    def test_no_rules(self):
+        text = 'ERROR\n'
+        self.assertIs(highlight.Highlighter([], self.printer).apply(text), text)
+
+    def test_no_color(self):
+        self.printer.ansimode = False
+        text = 'web_1 | ERROR\n'
+        self.assertIs(self.highlighter.apply(text), text)
@@ -0,0 +1,81 @@
+"""Tests for the dcsh jobs module."""
+
+import os
+import shutil
+import signal
+import tempfile
+import time
+import unittest
+import dcsh.jobs as jobs
+from StringIO import StringIO
+
+
+def wait(job):
+    deadline = time.time() + 5
+    while job.poll() is None and time.time() < deadline:
+        time.sleep(0.01)
+    return job.returncode
+
+
+class TestJobTable(unittest.TestCase):
+    def setUp(self):
+        self.settings = {'job_buffer_lines': 100, 'job_log_dir': None}
+        self.table = jobs.JobTable(self.settings)
+        self.addCleanup(self.table.close)
+
+    def test_buffered(self):
+        job = self.table.start('echo', ['sh', '-c', 'echo one; echo two >&2; exit 3'])
+        self.assertEqual(job.number, 1)
+        self.assertEqual(wait(job), 3)
+        self.assertEqual(job.state, 'exit 3')
+        out = StringIO()
+        self.assertEqual(self.table.follow(job, out), 3)
+        self.assertEqual(sorted(out.getvalue().splitlines()), ['one', 'two'])
+        self.assertEqual(self.table.jobs, {})
+
+    def test_bounded(self):
+        self.settings['job_buffer_lines'] = 10
+        job = self.table.start('seq', ['seq', '1', '25'])
+        out = StringIO()
+        self.table.follow(job, out)
+        self.assertEqual(out.getvalue().splitlines(),
+                         ['[15 earlier lines dropped]'] + [str(ii) for ii in range(16, 26)])
+
+    def test_log_file(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.settings['job_log_dir'] = os.path.join(tmpdir, 'logs')
+        job = self.table.start('logs -f', ['sh', '-c', 'echo logged'])
+        self.assertEqual(job.log_path, os.path.join(tmpdir, 'logs', '1-logs_-f.log'))
+        out = StringIO()
+        self.assertEqual(self.table.follow(job, out), 0)
+        self.assertEqual(out.getvalue(), 'logged\n')
+
+    def test_reap(self):
+        fast = self.table.start('fast', ['true'])
+        slow = self.table.start('slow', ['sleep', '5'])
+        wait(fast)
+        self.assertEqual(self.table.reap(), [fast])
+        self.assertEqual(self.table.reap(), [])
+        self.assertEqual(self.table.running(), [slow])
+        self.assertTrue(slow.signal(signal.SIGTERM))
+        self.assertEqual(wait(slow), -signal.SIGTERM)
+        self.assertEqual(self.table.reap(), [slow])
+        self.assertFalse(slow.signal(signal.SIGTERM))
+
+    def test_failed_start(self):
+        job = self.table.start('missing', ['/nonexistent/docker-compose'])
+        self.assertIsNone(job.process)
+        self.assertEqual(job.returncode, 127)
+        self.assertEqual(self.table.follow(job, StringIO()), 127)
+
+    def test_get(self):
+        job = self.table.start('true', ['true'])
+        self.assertIs(self.table.get('1'), job)
+        self.assertIs(self.table.get('%1'), job)
+        self.assertRaisesRegexp(Exception, 'No such job: 2', self.table.get, '2')
+
+    def test_close(self):
+        job = self.table.start('slow', ['sleep', '5'])
+        self.table.close()
+        self.assertEqual(job.returncode, -signal.SIGTERM)
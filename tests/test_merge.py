@@ -37,6 +37,32 @@ class TestMergeStrategies(unittest.TestCase):
         right = {'a': {'b': 2, 'c': 3}}
         self.assertEqual(merge.shallow(left, right, 'a', None), right['a'])
 
+    def test_deep(self):
+        """Nested dicts are merged recursively."""
+        left = {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}}
+        right = {'a': {'b': {'c': 111}, 'f': 4}}
+        self.assertEqual(merge.deep(left, right, 'a', None),
+                         {'b': {'c': 111, 'd': 2}, 'e': 3, 'f': 4})
+        self.assertEqual(left, {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}})
+        self.assertEqual(merge.deep(left, right, 'z', 9), 9)
+
+    def test_deep_mismatch(self):
+        """Non-dict values are overridden from source."""
+        left = {'a': {'b': [1, 2]}}
+        right = {'a': {'b': {'c': 3}}}
+        self.assertEqual(merge.deep(left, right, 'a', None), {'b': {'c': 3}})
+        self.assertEqual(merge.deep(right, left, 'a', None), {'b': [1, 2]})
+
+    def test_deep_sharing(self):
+        """Unchanged subtrees are shared, not copied."""
+        left = {'a': {'b': {'c': 1}, 'd': {'e': 2}}}
+        right = {'a': {'d': {'f': 3}, 'g': {'h': 4}}}
+        result = merge.deep(left, right, 'a', None)
+        self.assertIs(result['b'], left['a']['b'])
+        self.assertIs(result['g'], right['a']['g'])
+        self.assertIs(merge.deep(left, {'a': {}}, 'a', None), left['a'])
+        self.assertIs(merge.deep(left, {}, 'a', None), left['a'])
+
 
 class TestKeys(unittest.TestCase):
     def test_inner(self):
@@ -74,6 +100,23 @@ class TestMerge(unittest.TestCase):
         self.assertEqual(merge.Merge(['a', 'b', 'c'], merge.override)(left, right, 9000),
                          {'a': 1, 'b': 2, 'c': 9000})
 
+    def test_discard(self):
+        """Discarded values are omitted from the result."""
+        left = {'a': 1, 'b': 2}
+        right = {'b': 222}
+        self.assertEqual(merge.Merge(merge.full, merge.discard, {'a': merge.override})(left, right),
+                         {'a': 1})
+
+    def test_compile(self):
+        """Compiled merges match their uncompiled equivalents for the given keys."""
+        m = merge.Merge(merge.left, merge.discard, {'a': merge.override, 'b': merge.shallow})
+        fn = m.compile(['a', 'b', 'c'])
+        left = {'a': 1, 'b': {'x': 1}, 'c': 3}
+        right = {'a': 2, 'b': {'y': 2}, 'd': 4}
+        self.assertEqual(fn(left, right), m(left, right))
+        self.assertEqual(fn(left, right), {'a': 2, 'b': {'x': 1, 'y': 2}})
+        self.assertEqual(m.compile(['a', 'z'])({}, {}, 5), {'a': 5})
+
     def test_inner(self):
         """Merge for the subset of left and right keys."""
         left = {'a': 1, 'b': 2}
@@ -0,0 +1,130 @@
+"""Tests for the dcsh parallel module."""
+
+import os
+import shutil
+import tempfile
+import dcsh.printer as printer
+import dcsh.parallel as parallel
+from dcsh.settings import default_stylesheet
+import time
+import unittest
+from mock import patch
+from StringIO import StringIO
+
+
+def sh(name, script, depends=None, timeout=None):
+    return parallel.Job(name, ['sh', '-c', script], depends=depends, timeout=timeout)
+
+
+class TestRunner(unittest.TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.printer = printer.StylePrinter(self.stream)
+        self.printer.ansimode = False
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def lines(self):
+        return self.stream.getvalue().splitlines()
+
+    def test_output(self):
+        jobs = parallel.Runner(self.printer, 2).run([
+            sh('a', 'echo one; echo two >&2; exit 2'),
+            sh('bbb', 'printf "partial"'),
+        ])
+        self.assertEqual([job.returncode for job in jobs], [2, 0])
+        self.assertEqual(sorted(self.lines()), ['a   | one', 'a   | two', 'bbb | partial'])
+        for job in jobs:
+            self.assertGreaterEqual(job.duration, 0)
+
+    def test_line_order(self):
+        """Lines from a single stream keep their order."""
+        parallel.Runner(self.printer, 4).run([sh('a', 'seq 1 2000')])
+        self.assertEqual(self.lines(), ['a | {}'.format(ii) for ii in range(1, 2001)])
+
+    def test_limit(self):
+        """No more than limit jobs run at once."""
+        script = 'echo start; sleep 0.1; echo end'
+        parallel.Runner(self.printer, 1).run([sh('a', script), sh('b', script)])
+        self.assertEqual(self.lines(), ['a | start', 'a | end', 'b | start', 'b | end'])
+
+    def test_concurrent(self):
+        script = 'echo start; sleep 0.2; echo end'
+        parallel.Runner(self.printer, 2).run([sh('a', script), sh('b', script)])
+        self.assertEqual([line[4:] for line in self.lines()], ['start', 'start', 'end', 'end'])
+
+    def test_start_failure(self):
+        jobs = parallel.Runner(self.printer, 2).run([parallel.Job('x', ['/nonexistent/command'])])
+        self.assertEqual(jobs[0].returncode, 127)
+        self.assertEqual(self.lines(), ['x | failed to start: /nonexistent/command'])
+
+    def test_depends(self):
+        """Jobs start only after their dependencies succeed."""
+        jobs = parallel.Runner(self.printer, 4).run([
+            sh('c', 'echo c', depends=['a', 'b']),
+            sh('a', 'sleep 0.1; echo a'),
+            sh('b', 'echo b', depends=['a']),
+        ])
+        self.assertEqual([line[4:] for line in self.lines()], ['a', 'b', 'c'])
+        self.assertEqual([job.returncode for job in jobs], [0, 0, 0])
+
+    def test_depends_failure(self):
+        """Downstream jobs are skipped on failure, but independent ones still run."""
+        jobs = parallel.Runner(self.printer, 1).run([
+            sh('a', 'exit 1'),
+            sh('b', 'echo b', depends=['a']),
+            sh('c', 'echo c', depends=['b']),
+            sh('d', 'echo d'),
+        ])
+        self.assertEqual([job.skipped for job in jobs], [False, True, True, False])
+        self.assertEqual([job.failed for job in jobs], [True, True, True, False])
+        self.assertEqual(self.lines(), ['d | d'])
+
+    def test_timeout(self):
+        """Jobs past their timeout are killed, without holding up the others."""
+        start = time.time()
+        jobs = parallel.Runner(self.printer, 2).run([
+            sh('slow', 'echo started; exec sleep 5', timeout=0.2),
+            sh('fast', 'sleep 0.3; echo done', timeout=2),
+        ])
+        self.assertLess(time.time() - start, 2)
+        self.assertEqual([job.timed_out for job in jobs], [True, False])
+        self.assertEqual([job.failed for job in jobs], [True, False])
+        self.assertEqual(self.lines(), ['slow | started', 'slow | timed out after 0.2s', 'fast | done'])
+
+    def test_timeout_process_group(self):
+        """Timeouts kill everything the job started, not just its own process."""
+        marker = os.path.join(self.tmpdir, 'survived')
+        parallel.Runner(self.printer, 1).run([sh('slow', '(sleep 0.4; touch {}) & wait'.format(marker), timeout=0.1)])
+        time.sleep(0.6)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_interrupt(self):
+        """CTRL+C is passed on to running jobs, which are in process groups of their own."""
+        marker = os.path.join(self.tmpdir, 'survived')
+        job = sh('slow', 'sleep 0.4; touch {}'.format(marker))
+        runner = parallel.Runner(self.printer, 1)
+        with patch.object(runner, '_select', side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, runner.run, [job])
+        job.process.wait()
+        time.sleep(0.6)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_summary(self):
+        self.printer.stylesheet = default_stylesheet
+        runner = parallel.Runner(self.printer, 2)
+        jobs = runner.run([sh('ok', 'true'), sh('bad', 'exit 3')])
+        self.stream.truncate(0)
+        runner.summary(jobs)
+        lines = self.lines()
+        self.assertEqual(lines[:2], ['', 'Summary'])
+        self.assertRegexpMatches(lines[2], r'^  ok  ok\s+\d+\.\d\ds$')
+        self.assertRegexpMatches(lines[3], r'^  bad exit 3\s+\d+\.\d\ds$')
+
+    def test_summary_timeout(self):
+        self.printer.stylesheet = default_stylesheet
+        runner = parallel.Runner(self.printer, 1)
+        jobs = runner.run([sh('slow', 'exec sleep 5', timeout=0.1)])
+        self.stream.truncate(0)
+        runner.summary(jobs)
+        self.assertRegexpMatches(self.lines()[2], r'^  slow timeout\s+\d+\.\d\ds$')
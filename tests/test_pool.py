@@ -0,0 +1,146 @@
+"""Tests for the dcsh pool module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.printer as printer
+import dcsh.pool as pool
+from dcsh.config import compile_task
+from dcsh.stats import Stats
+from mock import patch
+from StringIO import StringIO
+
+fake_dc = '''#!/bin/sh
+echo "dc $*" >> {log}
+case "$*" in
+  *broken*) exit 1 ;;
+esac
+'''
+
+fake_docker = '''#!/bin/sh
+echo "docker $*" >> {log}
+case "$*" in
+  *fail*) exit 3 ;;
+esac
+'''
+
+
+class TestWarmPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.log = os.path.join(self.tmpdir, 'log')
+        self.settings = {
+            'dc_path': self.stub('docker-compose', fake_dc),
+            'docker_path': self.stub('docker', fake_docker),
+            'sudo': False,
+            'debug': False,
+            'warm_command': 'tail -f /dev/null',
+            'warm_max_uses': 1,
+            'warm_idle_timeout': 600,
+        }
+        self.stream = StringIO()
+        p = printer.StylePrinter(self.stream)
+        p.ansimode = False
+        patch('dcsh.pool.printer', p).start()
+        patch('dcsh.pool.stats', Stats()).start()
+        self.addCleanup(patch.stopall)
+        self.pool = pool.WarmPool(self.settings)
+        self.pool.enabled = True
+        self.addCleanup(self.pool.drain)
+        self.task = compile_task({'service': 'app', 'args': 'python -V', 'warm': 2}, {'A': '1'})
+
+    def stub(self, name, script):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(script.format(log=self.log))
+        os.chmod(path, 0o755)
+        return path
+
+    def started(self, name='py'):
+        for container in self.pool.containers[name]:
+            container.process.wait()
+        return [container.name for container in self.pool.containers[name]]
+
+    def calls(self):
+        for process in self.pool.removals:
+            process.wait()
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def test_disabled(self):
+        self.pool.enabled = False
+        self.assertIsNone(self.pool.run('py', self.task, []))
+        self.assertEqual(self.pool.containers, {})
+
+    def test_not_pooled(self):
+        self.assertIsNone(self.pool.run('py', dict(self.task, warm=0), []))
+        self.assertIsNone(self.pool.run('py', dict(self.task, args=[]), []))
+        exec_task = compile_task({'exec': True, 'service': 'app', 'args': 'ls', 'warm': 2}, {})
+        self.assertIsNone(self.pool.run('ls', exec_task, []))
+        self.assertEqual(self.pool.containers, {})
+
+    def test_fill(self):
+        """The first run is left to docker-compose run, and starts containers for the next ones."""
+        self.assertIsNone(self.pool.run('py', self.task, []))
+        names = self.started()
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[0].startswith('dcsh_warm_{}_py_'.format(os.getpid())))
+        self.assertEqual(sorted(self.calls()), sorted(
+            'dc run -d --name {} -e A=1 app tail -f /dev/null'.format(name) for name in names))
+
+    def test_exec(self):
+        """A used container is removed and replaced."""
+        self.pool.run('py', self.task, [])
+        first, second = self.started()
+        self.assertEqual(self.pool.run('py', self.task, ['--verbose']), 0)
+        replaced = self.started()
+        self.assertEqual(replaced[0], second)
+        self.assertNotIn(first, replaced)
+        calls = self.calls()
+        self.assertTrue(calls[2].startswith('docker exec -i '))
+        self.assertTrue(calls[2].endswith(' {} python -V --verbose'.format(first)))
+        self.assertIn('docker rm -f {}'.format(first), calls[3:])
+        self.assertEqual(len(calls), 5)
+
+    def test_reuse(self):
+        self.settings['warm_max_uses'] = 2
+        self.pool.run('py', self.task, [])
+        names = self.started()
+        self.assertEqual(self.pool.run('py', self.task, []), 0)
+        self.assertEqual(self.pool.run('py', self.task, ['fail']), 3)
+        self.assertEqual(self.started()[0], names[1])
+        calls = self.calls()
+        self.assertTrue(calls[2].endswith(' {} python -V'.format(names[0])))
+        self.assertTrue(calls[3].endswith(' {} python -V fail'.format(names[0])))
+        self.assertIn('docker rm -f {}'.format(names[0]), calls[4:])
+
+    def test_failed_start(self):
+        self.task['service'] = 'broken'
+        self.pool.run('py', self.task, [])
+        self.started()
+        self.assertIsNone(self.pool.run('py', self.task, []))
+        self.assertEqual(self.stream.getvalue().count('Warm container for py failed to start (exit 1)'), 2)
+        self.assertEqual(len(self.pool.containers['py']), 2)  # replaced, to be tried again
+
+    def test_idle_timeout(self):
+        self.pool.run('py', self.task, [])
+        names = self.started()
+        self.pool.maintain()
+        self.assertEqual(len(self.pool.containers['py']), 2)
+        self.settings['warm_idle_timeout'] = -1
+        self.pool.maintain()
+        self.assertEqual(self.pool.containers['py'], [])
+        self.assertEqual(self.calls()[-1], 'docker rm -f {} {}'.format(*names))
+        self.pool.maintain()
+        self.assertEqual(self.pool.removals, [])
+
+    def test_drain(self):
+        self.pool.run('py', self.task, [])
+        self.pool.run('other', self.task, [])
+        self.pool.drain()
+        self.assertEqual(self.pool.containers, {})
+        self.assertEqual(self.pool.removals, [])
+        removed = [call for call in self.calls() if call.startswith('docker rm -f ')]
+        self.assertEqual(len(removed), 2)
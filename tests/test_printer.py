@@ -64,6 +64,89 @@ class TestBasics(unittest.TestCase):
         mock_get_style.assert_called_once_with(p, 'foobarbaz')
 
 
+class TestCompiledStyles(unittest.TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.p = printer.StylePrinter(self.stream, {'red': {'color': 'red'}})
+
+    def test_compiled_once(self):
+        with patch.object(printer.StylePrinter, '_get_style', autospec=True,
+                          side_effect=printer.StylePrinter._get_style) as mock_get_style:
+            self.p.red('one').red('two')
+            mock_get_style.assert_called_once_with(self.p, 'red')
+        self.assertEqual(self.stream.getvalue(), '\x1b[31mone\x1b[0m\x1b[31mtwo\x1b[0m')
+
+    def test_invalidate_stylesheet(self):
+        self.p.red('one')
+        self.p.stylesheet = {'red': {'color': 'blue'}}
+        self.p.red('two')
+        self.assertEqual(self.stream.getvalue(), '\x1b[31mone\x1b[0m\x1b[34mtwo\x1b[0m')
+
+    def test_invalidate_ansimode(self):
+        self.p.red('one')
+        self.p.ansimode = False
+        self.p.red('two')
+        self.assertEqual(self.stream.getvalue(), '\x1b[31mone\x1b[0mtwo')
+
+    def test_invalidate_defaults(self):
+        self.p.red('one')
+        self.p._style_defaults = dict(printer.default_style, bold=True)
+        self.p.red('two')
+        self.assertEqual(self.stream.getvalue(), '\x1b[31mone\x1b[0m\x1b[31;1mtwo\x1b[0m')
+
+    def test_accessor_cached(self):
+        self.assertIs(self.p.red, self.p.red)
+        self.assertIn('red', vars(self.p))
+
+
+class TestBuffering(unittest.TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        self.p = printer.StylePrinter(self.stream, {'block': {'display': 'block'}}, buffer_size=16)
+
+    def test_buffered(self):
+        self.p.text('hello').newline()
+        self.assertEqual(self.stream.getvalue(), '')
+        self.p.text('world, again')
+        self.assertEqual(self.stream.getvalue(), 'hello\nworld, again')
+
+    def test_single_write(self):
+        with patch.object(self.stream, 'write', wraps=self.stream.write) as write:
+            self.p.text('a').text('b').newline().text('c').flush()
+            write.assert_called_once_with('ab\nc')
+
+    def test_flush(self):
+        with patch.object(self.stream, 'flush') as flush:
+            self.p.text('hello').flush()
+            flush.assert_called_once_with()
+        self.assertEqual(self.stream.getvalue(), 'hello')
+
+    def test_context_ordering(self):
+        self.p.text('one ')
+        with self.p.text as p:
+            p.block('two')
+        self.p.text('three').flush()
+        self.assertEqual(self.stream.getvalue(), 'one \ntwo\nthree')
+
+    def test_unbuffered(self):
+        p = printer.StylePrinter(self.stream)
+        p.text('hello')
+        self.assertEqual(self.stream.getvalue(), 'hello')
+
+
+class TestStringPrinter(unittest.TestCase):
+    def test_getvalue(self):
+        p = printer.StringPrinter({'red': {'color': 'red'}})
+        self.assertEqual(p.getvalue(), '')
+        p.red('one').text(' two')
+        self.assertEqual(p.getvalue(), '\x1b[31mone\x1b[0m two')
+        p.newline()
+        self.assertEqual(p.getvalue(), '\x1b[31mone\x1b[0m two\n')
+
+    def test_printer_fmt(self):
+        self.assertEqual(printer.printer_fmt({}, 'text', '{} {}', 'a', 'b'), 'a b')
+
+
 class TestStyles(unittest.TestCase):
     def setUp(self):
         self.stream = StringIO()
@@ -0,0 +1,44 @@
+"""Tests for the dcsh profiling module."""
+
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+from dcsh.profiling import Profiler
+
+
+def work(n):
+    return sum(range(n))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.section('startup'):
+            work(10)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_section(self):
+        profiler = Profiler(os.path.join(self.tmpdir, 'run'))
+        with profiler.section('startup'):
+            work(10)
+        with profiler.section('up -d'):
+            work(10)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), [
+            'run.001.startup.callgrind', 'run.001.startup.pstats',
+            'run.002.up_-d.callgrind', 'run.002.up_-d.pstats'])
+
+        stats = pstats.Stats(os.path.join(self.tmpdir, 'run.001.startup.pstats'))
+        self.assertIn('work', [func[2] for func in stats.stats])
+
+        with open(os.path.join(self.tmpdir, 'run.001.startup.callgrind')) as f:
+            callgrind = f.read()
+        self.assertTrue(callgrind.startswith('# callgrind format\n'))
+        self.assertIn('fn=work:11\n', callgrind)
+        self.assertIn('fn=work:11\n11 ', callgrind)
+        self.assertIn('cfn=<sum>\ncalls=1 0\n11 ', callgrind)
@@ -0,0 +1,107 @@
+"""Tests for the dcsh projects module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.printer as printer
+import dcsh.projects as projects
+import dcsh.shell as shell
+from mock import patch
+from StringIO import StringIO
+
+fake_dc = '''#!/bin/sh
+echo "$(basename "$PWD") $@"
+[ "$1" != fail ]
+'''
+
+dcsh_yml = '''
+dc_path: {dc_path}
+tasks:
+  test:
+    service: app
+    args: pytest
+'''
+
+
+class TestProjects(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        dict_patch = patch.dict('os.environ', {'XDG_CACHE_HOME': os.path.join(self.tmpdir, 'cache')})
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        self.dc_path = os.path.join(self.tmpdir, 'docker-compose')
+        with open(self.dc_path, 'w') as f:
+            f.write(fake_dc)
+        os.chmod(self.dc_path, 0o755)
+        for name in ('web', 'api', 'db'):
+            os.mkdir(os.path.join(self.tmpdir, name))
+            self.write(name, '.dcsh.yml', dcsh_yml.format(dc_path=self.dc_path))
+        self.write('db', '.dcsh.yml', 'sudo: true\n')
+        self.settings = {
+            'sudo': False,
+            'debug': False,
+            'jobs': 2,
+            'projects': dict((name, os.path.join(self.tmpdir, name)) for name in ('web', 'api', 'db')),
+        }
+        self.projects = projects.Projects(self.settings)
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, project, name, text):
+        with open(os.path.join(self.tmpdir, project, name), 'w') as f:
+            f.write(text)
+
+    def test_select(self):
+        self.assertEqual(self.projects.select('all'), ['api', 'db', 'web'])
+        self.assertEqual(self.projects.select('web,api'), ['web', 'api'])
+        with self.assertRaisesRegexp(Exception, 'Unknown project: cache'):
+            self.projects.select('web,cache')
+
+    def test_command(self):
+        self.assertEqual(self.projects.command('web', ['ps', '-q']), [self.dc_path, 'ps', '-q'])
+        self.assertEqual(self.projects.command('web', ['test', '-x']), [
+            self.dc_path, 'run', '--rm', 'app', 'pytest', '-x'])
+        self.assertEqual(self.projects.command('db', ['ps']), ['sudo', 'docker-compose', 'ps'])
+        self.settings['sudo'] = True
+        self.assertEqual(self.projects.command('web', ['ps']), ['sudo', self.dc_path, 'ps'])
+
+    def test_lazy_load(self):
+        with patch('dcsh.projects.load_project', side_effect=projects.load_project) as load_project:
+            self.projects.command('web', ['ps'])
+            self.projects.command('web', ['ps'])
+            self.assertEqual(load_project.call_count, 1)
+            self.assertEqual(load_project.call_args[0], (os.path.join(self.tmpdir, 'web'),))
+
+            self.write('web', '.dcsh.yml', dcsh_yml.format(dc_path=self.dc_path) + '    nodeps: true\n')
+            self.assertIn('--no-deps', self.projects.command('web', ['test']))
+            self.assertEqual(load_project.call_count, 2)
+
+    def test_snapshot(self):
+        self.projects.command('web', ['ps'])
+        with patch('dcsh.config.load_yaml') as load_yaml:
+            projects.Projects(self.settings).command('web', ['ps'])
+            self.assertFalse(load_yaml.called)
+
+    def test_shell(self):
+        stream = StringIO()
+        patch('dcsh.shell.printer', printer.StylePrinter(stream)).start()
+        with patch('stat.S_ISFIFO', return_value=True):
+            sh = shell.DcShell(dict(self.settings, dc_commands={}, tasks={}))
+        sh.onecmd('@web,api test -k fast')
+        output = stream.getvalue()
+        self.assertIn('web | web run --rm app pytest -k fast\n', output)
+        self.assertIn('api | api run --rm app pytest -k fast\n', output)
+        self.assertEqual(sh.returncode, 0)
+
+        sh.onecmd('@web,api fail')
+        self.assertEqual(sh.returncode, 1)
+
+        sh.onecmd('@cache ps')
+        self.assertIn('Unknown project: cache\n', stream.getvalue())
+        self.assertEqual(sh.returncode, 1)
+
+        sh.onecmd('@all')
+        self.assertIn('No command given.\n', stream.getvalue())
@@ -0,0 +1,56 @@
+"""Tests for the dcsh querycache module."""
+
+import unittest
+import dcsh.querycache as querycache
+from mock import patch
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        dict_patch = patch.dict('dcsh.querycache.settings', {
+            'query_cache': {'ps': 5, 'config': 60},
+            'query_cache_size': 2,
+        })
+        dict_patch.start()
+        self.addCleanup(dict_patch.stop)
+        self.cache = querycache.QueryCache()
+
+    def test_ttl(self):
+        self.assertEqual(self.cache.ttl(['ps', '-q']), 5)
+        self.assertEqual(self.cache.ttl(['logs']), 0)
+        self.assertEqual(self.cache.ttl([]), 0)
+        self.assertEqual(self.cache.ttl(['-f', 'other.yml', '--verbose', 'ps']), 5)
+        self.assertEqual(self.cache.ttl(['--file=ps', 'logs']), 0)
+        self.assertEqual(self.cache.ttl(['-p', 'ps']), 0)
+
+    def test_command_name(self):
+        self.assertEqual(querycache.command_name(['-f', 'a.yml', '-p', 'x', '--no-ansi', 'up', '-d']), 'up')
+        self.assertEqual(querycache.command_name(['--project-name=x', 'down']), 'down')
+        self.assertIsNone(querycache.command_name(['-f', 'a.yml']))
+
+    def test_expiry(self):
+        with patch('time.time', return_value=100.0):
+            self.cache.put(['dc', 'ps'], 'web', 5)
+            self.assertEqual(self.cache.get(['dc', 'ps']), 'web')
+            self.assertIsNone(self.cache.get(['dc', 'ps', '-q']))
+        with patch('time.time', return_value=105.0):
+            self.assertIsNone(self.cache.get(['dc', 'ps']))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_size(self):
+        self.cache.put(['ps'], 'a', 5)
+        self.cache.put(['config'], 'b', 5)
+        self.cache.get(['ps'])
+        self.cache.put(['ps', '-q'], 'c', 5)
+        self.assertEqual(list(self.cache.entries), [('ps',), ('ps', '-q')])
+
+    def test_note(self):
+        self.cache.put(['ps'], 'a', 5)
+        self.cache.note(['exec', 'web', 'sh'])
+        self.cache.note(['logs'])
+        self.assertEqual(self.cache.get(['ps']), 'a')
+        self.cache.note(['run', '--rm', 'web', 'test'])
+        self.assertIsNone(self.cache.get(['ps']))
+        self.cache.put(['ps'], 'a', 5)
+        self.cache.note(['-p', 'x', 'down'])
+        self.assertIsNone(self.cache.get(['ps']))
@@ -0,0 +1,48 @@
+"""Tests for the dcsh registry module."""
+
+import unittest
+from dcsh.registry import CommandRegistry
+
+
+class TestCommandRegistry(unittest.TestCase):
+    def setUp(self):
+        self.settings = {
+            'dc_commands': {'ps': 'List containers', 'test': 'shadowed'},
+            'tasks': {'test': {'help': 'runs tests', 'compiled_args': ['run', 'tests']}},
+        }
+        self.calls = []
+        self.registry = CommandRegistry(
+            self.settings,
+            lambda name, cmdargs: self.calls.append(('command', name, cmdargs)),
+            lambda name, task, cmdargs: self.calls.append(('task', name, cmdargs)))
+
+    def test_lookup(self):
+        self.assertIn('ps', self.registry)
+        self.assertIn('test', self.registry)
+        self.assertNotIn('exit', self.registry)
+        self.assertIsNone(self.registry.handler('exit'))
+        self.assertEqual(self.registry.help('ps'), 'List containers')
+        self.assertEqual(self.registry.help('test'), 'runs tests')
+        self.assertIsNone(self.registry.help('exit'))
+
+    def test_handler(self):
+        self.registry.handler('ps')('-a')
+        self.registry.handler('test')('-x')
+        self.assertEqual(self.calls, [('command', 'ps', '-a'), ('task', 'test', '-x')])
+
+    def test_lazy(self):
+        self.assertEqual(self.registry._handlers, {})
+        handler = self.registry.handler('ps')
+        self.assertIs(self.registry.handler('ps'), handler)
+        self.assertEqual(list(self.registry._handlers), ['ps'])
+
+    def test_invalidate(self):
+        self.registry.handler('test')
+        self.registry.handler('ps')
+        del self.settings['tasks']['test']
+        self.registry.invalidate(['test'])
+        self.assertEqual(list(self.registry._handlers), ['ps'])
+        self.registry.handler('test')('')
+        self.assertEqual(self.calls, [('command', 'test', '')])
+        self.registry.invalidate()
+        self.assertEqual(self.registry._handlers, {})
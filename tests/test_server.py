@@ -0,0 +1,146 @@
+"""Tests for the dcsh server and client modules."""
+
+import os
+import pty
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import unittest
+import dcsh.client as client
+import dcsh.server as server
+from mock import Mock
+from mock import patch
+
+
+def run_request(shell, argv):
+    if argv[0] == 'sleep':
+        time.sleep(10)
+    os.write(1, 'out {} {}\n'.format(' '.join(argv), os.read(0, 100)))
+    os.write(2, 'err in {} tty {}\n'.format(os.getcwd(), os.isatty(0)))
+    return int(argv[0])
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'test.sock')
+        self.shell = Mock()
+
+    def start(self):
+        s = server.Server(self.shell, run_request, self.path)
+        s.listen()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                s.serve_forever()
+            finally:
+                os._exit(0)
+        s.listener.close()
+        self.addCleanup(os.waitpid, pid, 0)
+        self.addCleanup(os.kill, pid, signal.SIGTERM)
+
+    def remote(self, argv, stdin='', stdin_fd=None):
+        """Runs argv on the server, with stdin as input; returns the exit code, stdout and stderr."""
+        files = [tempfile.TemporaryFile() for fd in (0, 1, 2)]
+        files[0].write(stdin)
+        files[0].seek(0)
+        saved = [os.dup(fd) for fd in (0, 1, 2)]
+        try:
+            for fd, f in enumerate(files):
+                os.dup2(stdin_fd if fd == 0 and stdin_fd is not None else f.fileno(), fd)
+            with patch('dcsh.client.socket_path', return_value=self.path):
+                returncode = client.run_remote(argv)
+        finally:
+            for fd in (0, 1, 2):
+                os.dup2(saved[fd], fd)
+                os.close(saved[fd])
+        output = []
+        for f in files[1:]:
+            f.seek(0)
+            output.append(f.read())
+            f.close()
+        return returncode, output[0], output[1]
+
+    def test_no_server(self):
+        self.assertEqual(self.remote(['0']), (None, '', ''))
+
+    def test_request(self):
+        self.start()
+        self.assertEqual(self.remote(['3', '-c', 'ps'], stdin='input'),
+                         (3, 'out 3 -c ps input\n', 'err in {} tty False\n'.format(os.getcwd())))
+        self.assertEqual(self.remote(['0'])[0], 0)
+
+    def test_terminal(self):
+        """The request runs on the client's terminal."""
+        self.start()
+        master, slave = pty.openpty()
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        os.write(master, 'typed\n')
+        returncode, stdout, stderr = self.remote(['0'], stdin_fd=slave)
+        self.assertEqual(stdout, 'out 0 typed\n\n')
+        self.assertTrue(stderr.endswith('tty True\n'))
+
+    def test_interrupt(self):
+        """CTRL+C in the client interrupts the request."""
+        self.start()
+        threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGINT)).start()
+        self.assertEqual(self.remote(['sleep'])[0], 130)
+        self.assertIs(signal.getsignal(signal.SIGINT), signal.default_int_handler)
+
+    def test_no_fd_passing(self):
+        """Without a way to pass file descriptors, commands run in-process."""
+        self.start()
+        with patch.dict('sys.modules', {'_multiprocessing': None}):
+            self.assertIsNone(self.remote(['0'])[0])
+            with self.assertRaises(Exception):
+                server.serve(self.shell, run_request)
+
+    def test_other_user(self):
+        with patch('dcsh.server.peer_uid', return_value=os.getuid() + 1), \
+                patch('dcsh.server.printer'):
+            self.start()
+        self.assertEqual(self.remote(['0']), (1, '', 'dcsh: lost connection to server\n'))
+
+    def test_peer_uid(self):
+        a, b = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        self.assertEqual(server.peer_uid(a), os.getuid())
+
+    def test_socket_mode(self):
+        umask = os.umask(0)
+        try:
+            s = server.Server(self.shell, run_request, self.path)
+            s.listen()
+        finally:
+            os.umask(umask)
+        self.addCleanup(s.close)
+        self.assertEqual(os.stat(self.path).st_mode & 0o077, 0)
+
+    def test_already_running(self):
+        self.start()
+        with self.assertRaises(Exception):
+            server.Server(self.shell, run_request, self.path).listen()
+
+    def test_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        s = server.Server(self.shell, run_request, self.path)
+        s.listen()
+        s.close()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_socket_path(self):
+        with patch('dcsh.cache.cache_dir', return_value='/cache'):
+            path = client.socket_path('/some/project')
+            self.assertTrue(path.startswith('/cache/server-'))
+            self.assertTrue(path.endswith('.sock'))
+            self.assertEqual(path, client.socket_path('/some/project/'))
+            self.assertNotEqual(path, client.socket_path('/other/project'))
@@ -1,8 +1,17 @@
 """Tests for the dcsh shell module."""
 
+import os
+import shutil
+import signal
+import tempfile
 import dcsh.printer as printer
 import dcsh.shell as shell
 import unittest
+from dcsh.config import Changes
+from dcsh.config import TaskTable
+from dcsh.profiling import Profiler
+from dcsh.stats import Stats
+from dcsh.timing import PhaseTimer
 from mock import patch
 from StringIO import StringIO
 
@@ -27,6 +36,10 @@ class TestDCShell(unittest.TestCase):
                 },
             },
             'dc_path': '/usr/bin/docker-compose',
+            'jobs': 4,
+            'completion_ttl': 5,
+            'job_buffer_lines': 100,
+            'job_log_dir': None,
             'environment': {},
             'stylesheet': {
                 'prompt': {'color': 'yellow'},
@@ -57,13 +70,35 @@ class TestDCShell(unittest.TestCase):
         sh = shell.DcShell(self.settings)
         with patch('dcsh.shell.run_compose', return_value=None) as fn:
             self.assertIsNone(sh.onecmd('cmd1 foo bar baz'))
-            fn.assert_called_once_with('cmd1', 'foo', 'bar', 'baz')
+            fn.assert_called_once_with('cmd1', 'foo', 'bar', 'baz', fresh=False)
+
+    def test_run_command_fresh(self):
+        sh = shell.DcShell(self.settings)
+        with patch.dict('dcsh.querycache.settings', {'query_cache': {'cmd1': 5, 'ps': 5}}), \
+                patch('dcsh.shell.run_compose', return_value=0) as fn:
+            sh.onecmd('cmd1 --fresh -q')
+            fn.assert_called_with('cmd1', '-q', fresh=True)
+            sh.onecmd('cmd1 -q --fresh')
+            fn.assert_called_with('cmd1', '-q', '--fresh', fresh=False)
+            sh.onecmd('dc --fresh ps')
+            fn.assert_called_with('ps', fresh=True)
+            sh.onecmd('dc --fresh run app prog')
+            fn.assert_called_with('--fresh', 'run', 'app', 'prog', fresh=False)
+            sh.onecmd('dc run app prog --fresh')
+            fn.assert_called_with('run', 'app', 'prog', '--fresh', fresh=False)
+
+    def test_returncode(self):
+        sh = shell.DcShell(self.settings)
+        self.assertEqual(sh.returncode, 0)
+        with patch('dcsh.shell.run_compose', return_value=2):
+            self.assertIsNone(sh.onecmd('cmd1'))
+        self.assertEqual(sh.returncode, 2)
 
     def test_run_task(self):
         sh = shell.DcShell(self.settings)
         with patch('dcsh.shell.run_compose', return_value=None) as fn:
             self.assertIsNone(sh.onecmd('task1 foo bar baz'))
-            fn.assert_called_once_with('gorf', 'foo', 'bar', 'baz')
+            fn.assert_called_once_with('gorf', 'foo', 'bar', 'baz', label='task1')
 
     def test_pipe(self):
         with patch('stat.S_ISFIFO', return_value=True):
@@ -94,7 +129,104 @@ class TestDCShell(unittest.TestCase):
         sh = shell.DcShell(self.settings)
         with patch('dcsh.shell.run_compose', return_value=None) as fn:
             self.assertIsNone(sh.do_dc('foo bar baz'))
-            fn.assert_called_once_with('foo', 'bar', 'baz')
+            fn.assert_called_once_with('foo', 'bar', 'baz', fresh=False)
+
+    def test_do_parallel(self):
+        sh = shell.DcShell(self.settings)
+        self.settings['jobs'] = 3
+        with patch('dcsh.shell.Runner') as runner:
+            with patch('dcsh.shell.compose_command', side_effect=lambda *args: list(args)):
+                self.assertIsNone(sh.onecmd('parallel task1 "cmd1 -f"'))
+            jobs = runner.return_value.run.call_args[0][0]
+            self.assertEqual([(job.name, job.cmd) for job in jobs], [
+                ('task1', ['gorf']),
+                ('cmd1 -f', ['cmd1', '-f']),
+            ])
+            self.assertEqual(runner.call_args[0][1], 3)
+
+    def test_do_parallel_depends(self):
+        """Dependencies of the tasks are run first, once, and not again for tasks that are named."""
+        self.settings['tasks']['task1']['depends'] = ['task2', 'task3']
+        self.settings['tasks']['task2'] = {'help': None, 'compiled_args': ['dep2'], 'depends': ['task3']}
+        self.settings['tasks']['task3'] = {'help': None, 'compiled_args': ['dep3'], 'depends': []}
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.Runner') as runner:
+            with patch('dcsh.shell.compose_command', side_effect=lambda *args: list(args)):
+                sh.onecmd('parallel task1 task2 cmd1')
+            jobs = runner.return_value.run.call_args[0][0]
+            self.assertEqual([(job.name, job.cmd, job.depends) for job in jobs], [
+                ('task3', ['dep3'], []),
+                ('task1', ['gorf'], ['task2', 'task3']),
+                ('task2', ['dep2'], ['task3']),
+                ('cmd1', ['cmd1'], []),
+            ])
+            self.assertEqual(runner.call_count, 1)
+
+    def test_do_parallel_unknown(self):
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.Runner') as runner:
+            sh.onecmd('parallel task1 foo')
+            self.assertFalse(runner.called)
+        self.assertEqual(sh.returncode, 1)
+        self.assertEqual(self.stream.getvalue(), 'Unknown task or command: foo\n')
+
+    def test_run_task_depends(self):
+        self.settings['tasks']['task1']['depends'] = ['task2']
+        self.settings['tasks']['task2'] = {'help': None, 'compiled_args': ['dep'], 'depends': []}
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.Runner') as runner, patch('dcsh.shell.run_compose', return_value=0) as fn:
+            with patch('dcsh.shell.compose_command', side_effect=lambda *args: list(args)):
+                sh.onecmd('task1 foo')
+            jobs = runner.return_value.run.call_args[0][0]
+            self.assertEqual([(job.name, job.cmd) for job in jobs], [('task2', ['dep'])])
+            fn.assert_called_once_with('gorf', 'foo', label='task1')
+
+    def test_run_task_warm(self):
+        """Tasks are run by the warm pool when it has a container ready, and by docker-compose otherwise."""
+        sh = shell.DcShell(self.settings)
+        with patch.object(sh.pool, 'run', side_effect=[None, 5]) as pool_run, \
+                patch('dcsh.shell.run_compose', return_value=0) as fn:
+            sh.onecmd('task1 foo')
+            self.assertEqual(sh.returncode, 0)
+            sh.onecmd('task1 bar')
+            self.assertEqual(sh.returncode, 5)
+            fn.assert_called_once_with('gorf', 'foo', label='task1')
+        self.assertEqual(pool_run.call_args[0], ('task1', self.settings['tasks']['task1'], ['bar']))
+
+    def test_run_task_invalid(self):
+        """Tasks that cannot be compiled are reported, and the shell carries on."""
+        self.settings['tasks'] = TaskTable({
+            'good': {'service': 'app', 'args': 'echo ok'},
+            'bad': {'service': 'app', 'args': "echo 'unterminated"},
+            'uses_bad': {'service': 'app', 'depends': ['bad']},
+        }, {})
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.run_compose', return_value=0) as fn:
+            sh.onecmd('bad')
+            self.assertEqual(sh.returncode, 1)
+            sh.onecmd('uses_bad')
+            self.assertEqual(sh.returncode, 1)
+            sh.onecmd('help bad')
+            self.assertEqual(sh.returncode, 1)
+            sh.onecmd('parallel good bad')
+            sh.onecmd('bg bad')
+            self.assertFalse(fn.called)
+            sh.onecmd('good')
+            self.assertEqual(sh.returncode, 0)
+            self.assertEqual(fn.call_count, 1)
+        self.assertEqual(self.stream.getvalue(),
+                         'Invalid task "bad": No closing quotation\n' * 5)
+
+    def test_run_task_depends_failed(self):
+        self.settings['tasks']['task1']['depends'] = ['task2']
+        self.settings['tasks']['task2'] = {'help': None, 'compiled_args': ['dep'], 'depends': []}
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.run_compose') as fn, patch('dcsh.shell.Runner'):
+            with patch('dcsh.shell.Job') as job:
+                job.return_value.failed = True
+                sh.onecmd('task1 foo')
+            self.assertFalse(fn.called)
+        self.assertEqual(sh.returncode, 1)
 
     def test_do_show(self):
         sh = shell.DcShell(self.settings)
@@ -108,6 +240,20 @@ class TestDCShell(unittest.TestCase):
             self.assertIsNone(sh.do_help('foo bar baz'))
             fn.assert_called_once_with()
 
+    def test_do_help_name(self):
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.do_help') as fn:
+            sh.onecmd('help task1')
+            self.assertFalse(fn.called)
+        self.assertEqual(self.stream.getvalue(), 'task1:task1 help\n')
+
+    def test_task_shadows_builtin(self):
+        self.settings['tasks']['build'] = {'help': None, 'compiled_args': ['make']}
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.run_compose', return_value=None) as fn:
+            sh.onecmd('build all')
+            fn.assert_called_once_with('make', 'all', label='build')
+
     def test_do_build(self):
         sh = shell.DcShell(self.settings)
         with patch('dcsh.shell.run_compose', return_value=None) as fn:
@@ -118,6 +264,12 @@ class TestDCShell(unittest.TestCase):
         sh = shell.DcShell(self.settings)
         self.assertTrue(sh.do_EOF(None))
 
+    def test_postcmd_flush(self):
+        sh = shell.DcShell(self.settings)
+        with patch.object(self._shell_printer, 'flush') as flush:
+            self.assertTrue(sh.postcmd(True, 'foo'))
+            flush.assert_called_once_with()
+
     def test_cmdloop(self):
         sh = shell.DcShell(self.settings)
 
@@ -129,7 +281,321 @@ class TestDCShell(unittest.TestCase):
             'ctrl_c',
             'exit'
         ]
-        sh.cmdloop()
+        with patch.object(sh.pool, 'drain') as drain:
+            sh.cmdloop()
+            drain.assert_called_once_with()
+        self.assertTrue(sh.pool.enabled)
         self.assertEqual(self.stream.getvalue(),
                          'bazKeyboardInterrupt\n' +
                          'Exiting DCSH\n')
+        self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+    def test_cmdloop_error(self):
+        """Warm containers are removed when the loop ends with an error."""
+        sh = shell.DcShell(self.settings)
+
+        def do_fail(cmdargs):
+            raise ValueError('failed')
+
+        sh.do_fail = do_fail
+        sh.cmdqueue = ['fail']
+        with patch.object(sh.pool, 'drain') as drain:
+            with self.assertRaises(ValueError):
+                sh.cmdloop()
+            drain.assert_called_once_with()
+
+    def test_cmdloop_terminate(self):
+        sh = shell.DcShell(self.settings)
+        sh.do_term = lambda cmdargs: os.kill(os.getpid(), signal.SIGTERM)
+        sh.cmdqueue = ['term', 'exit']
+        with patch.object(sh.pool, 'drain') as drain, patch.object(sh.jobs, 'close') as close:
+            with self.assertRaises(SystemExit) as cm:
+                sh.cmdloop()
+            drain.assert_called_once_with()
+            close.assert_called_once_with()
+        self.assertEqual(cm.exception.code, 128 + signal.SIGTERM)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+    def test_precmd_reload(self):
+        """Task handlers are added, removed and replaced in place when configuration changes."""
+        self.settings['dc_commands']['task1'] = 'shadowed command'
+        sh = shell.DcShell(self.settings, reloader=lambda: changes)
+        self.settings['tasks'] = {
+            'task2': {'help': 'task2 help', 'compiled_args': ['new']},
+        }
+        changes = Changes(['task2'], ['task1'], [], False)
+        self.assertEqual(sh.precmd('task2'), 'task2')
+        with patch('dcsh.shell.run_compose', return_value=None) as fn:
+            sh.onecmd('task2 foo')
+            fn.assert_called_once_with('new', 'foo', label='task2')
+        with patch('dcsh.shell.run_compose', return_value=None) as fn:
+            sh.onecmd('task1 foo')
+            fn.assert_called_once_with('task1', 'foo', fresh=False)  # the command is no longer shadowed
+
+        self.settings['tasks']['task2'] = {'help': None, 'compiled_args': ['replaced']}
+        self.settings['prompt'] = 'bar'
+        changes = Changes([], [], ['task2'], False)
+        sh.precmd('')
+        with patch('dcsh.shell.run_compose', return_value=None) as fn:
+            sh.onecmd('task2')
+            fn.assert_called_once_with('replaced', label='task2')
+        self.assertEqual(sh.prompt, '\x1b[33mbar\x1b[0m ' if sh.interactive else '')
+
+    def test_precmd_reload_pool(self):
+        """Warm containers of removed and replaced tasks are discarded."""
+        sh = shell.DcShell(self.settings, reloader=lambda: Changes(['task3'], ['task1'], ['task2'], False))
+        with patch.object(sh.pool, 'discard') as discard:
+            sh.precmd('')
+            discard.assert_called_once_with(['task1', 'task2'])
+
+    def test_precmd_reload_commands(self):
+        sh = shell.DcShell(self.settings, reloader=lambda: Changes([], [], [], True))
+        self.settings['dc_commands'] = {'cmd2': 'cmd2 help', 'task1': 'shadowed command'}
+        sh.precmd('')
+        self.assertNotIn('cmd1', sh.registry)
+        with patch('dcsh.shell.run_compose', return_value=None) as fn:
+            sh.onecmd('cmd2')
+            sh.onecmd('task1')
+            self.assertEqual(fn.call_args_list[0][0], ('cmd2',))
+            self.assertEqual(fn.call_args_list[1][0], ('gorf',))
+
+    def test_precmd_reload_error(self):
+        def reloader():
+            raise Exception('bad config')
+        sh = shell.DcShell(self.settings, reloader=reloader)
+        self.assertEqual(sh.precmd('task1'), 'task1')
+        self.assertEqual(self.stream.getvalue(), 'Configuration not reloaded: bad config\n')
+        self.assertIsNotNone(sh.registry.handler('task1'))
+
+    def test_do_stats(self):
+        store = Stats()
+        sh = shell.DcShell(self.settings)
+        with patch('dcsh.shell.stats', store):
+            with patch('dcsh.shell.Runner') as runner:
+                runner.return_value.run.side_effect = lambda jobs: [job.start() and job.finish(job.process.wait())
+                                                                    for job in jobs]
+                with patch('dcsh.shell.compose_command', return_value=['true']):
+                    sh.onecmd('parallel task1 cmd1')
+            self.assertEqual(sorted(inv.command for inv in store.records), ['cmd1', 'task1'])
+            sh.onecmd('stats')
+            self.assertIn('Command statistics', self.stream.getvalue())
+            sh.onecmd('stats --clear')
+            self.assertEqual(len(store.records), 0)
+            sh.onecmd('stats --bogus')
+            self.assertEqual(sh.returncode, 1)
+            sh.returncode = 0
+            sh.onecmd('stats --save /nonexistent/dir/stats.jsonl')
+            self.assertEqual(sh.returncode, 1)
+            self.assertIn('Cannot save stats: ', self.stream.getvalue())
+
+    def test_onecmd_profile(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        timer = PhaseTimer()
+        timer.enabled = True
+        with patch('dcsh.shell.timer', timer), patch('dcsh.shell.stats', Stats()):
+            sh = shell.DcShell(self.settings, profiler=Profiler(os.path.join(tmpdir, 'prof')))
+            sh.onecmd('stats --clear')
+        self.assertEqual(sorted(os.listdir(tmpdir)), ['prof.001.stats.callgrind', 'prof.001.stats.pstats'])
+        self.assertEqual([phase[0] for phase in timer.phases], ['prompt render', 'command: stats'])
+
+    def test_background_jobs(self):
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch('dcsh.shell.compose_command', return_value=['sh', '-c', 'echo hi; exit 2']) as fn:
+            sh.onecmd('task1 --all &')
+            fn.assert_called_once_with('gorf', '--all')
+        job = sh.jobs.get('1')
+        self.assertEqual(job.name, 'task1 --all')
+        self.assertEqual(self.stream.getvalue(), '[1] {}\n'.format(job.process.pid))
+        job.process.wait()
+
+        store = Stats()
+        with patch('dcsh.shell.stats', store):
+            self.stream.truncate(0)
+            sh.precmd('jobs')
+            sh.onecmd('jobs')
+            self.assertEqual(self.stream.getvalue(), '[1] exit 2   task1 --all\n' * 2)
+            self.stream.truncate(0)
+            sh.onecmd('fg')
+            self.assertEqual(self.stream.getvalue(), 'hi\n')
+            self.assertEqual(sh.returncode, 2)
+            self.assertEqual([inv.command for inv in store.records], ['task1 --all'])
+
+        sh.onecmd('fg 1')
+        self.assertEqual(sh.returncode, 1)
+        sh.onecmd('bg nosuchtask')
+        self.assertEqual(sh.returncode, 1)
+
+    def test_bg_depends(self):
+        """Background tasks run their dependencies first, and not at all if those fail."""
+        self.settings['tasks']['task1']['depends'] = ['task2']
+        self.settings['tasks']['task2'] = {'help': None, 'compiled_args': ['dep'], 'depends': []}
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch.object(sh, '_run_dependencies', side_effect=[True, False]) as deps, \
+                patch('dcsh.shell.compose_command', return_value=['true']) as fn:
+            sh.onecmd('task1 foo &')
+            deps.assert_called_once_with(['task2'])
+            fn.assert_called_once_with('gorf', 'foo')
+            self.assertEqual(list(sh.jobs.jobs), [1])
+            sh.onecmd('bg task1')
+            self.assertEqual(sh.returncode, 1)
+            self.assertEqual(list(sh.jobs.jobs), [1])
+        self.assertIn('Dependencies failed; task not run.\n', self.stream.getvalue())
+
+    def test_bg_dc(self):
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch('dcsh.shell.compose_command', return_value=['true']) as fn:
+            sh.onecmd('dc ps -q &')
+            fn.assert_called_once_with('ps', '-q')
+        self.assertEqual(sh.jobs.get('1').name, 'dc ps -q')
+        self.assertEqual(sh.returncode, 0)
+
+    def test_kill(self):
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch('dcsh.shell.compose_command', return_value=['sleep', '5']):
+            sh.onecmd('bg cmd1')
+        job = sh.jobs.get('1')
+        sh.onecmd('kill 1')
+        job.process.wait()
+        self.assertIn('[1] terminated  cmd1\n', self.stream.getvalue())
+        sh.onecmd('kill 1')
+        self.assertEqual(sh.jobs.jobs, {})
+
+    def test_kill_shadows_command(self):
+        """kill stops a background job even though docker-compose has a kill command."""
+        self.settings['dc_commands']['kill'] = 'Kill containers'
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch('dcsh.shell.compose_command', return_value=['sleep', '5']):
+            sh.onecmd('bg cmd1')
+        job = sh.jobs.get('1')
+        with patch('dcsh.shell.run_compose', return_value=0) as fn:
+            sh.onecmd('kill')
+            job.process.wait()
+            self.assertFalse(fn.called)
+            sh.onecmd('dc kill web')
+            fn.assert_called_once_with('kill', 'web', fresh=False)
+        self.assertIn('[1] terminated  cmd1\n', self.stream.getvalue())
+
+    def test_kill_failed(self):
+        """A job that cannot be signalled is reported, and kept."""
+        sh = shell.DcShell(self.settings)
+        self.addCleanup(sh.jobs.close)
+        with patch('dcsh.shell.compose_command', return_value=['sleep', '5']):
+            sh.onecmd('bg cmd1')
+        with patch('os.killpg', side_effect=OSError(1, 'Operation not permitted')):
+            sh.onecmd('kill 1')
+        self.assertIn('[1] could not be terminated  cmd1\n', self.stream.getvalue())
+        self.assertEqual(sh.returncode, 1)
+        self.assertEqual(list(sh.jobs.jobs), [1])
+
+    def test_bg_log_dir_error(self):
+        self.settings['job_log_dir'] = '/dev/null/logs'
+        sh = shell.DcShell(self.settings)
+        sh.onecmd('bg cmd1')
+        self.assertIn('Cannot start job: ', self.stream.getvalue())
+        self.assertEqual(sh.returncode, 1)
+        self.assertEqual(sh.jobs.jobs, {})
+
+    def test_complete(self):
+        sh = shell.DcShell(self.settings)
+        self.assertEqual(sh.completenames('t'), ['task1'])
+        self.assertEqual(sh.completenames('e'), ['exit'])
+        self.assertEqual(sh.completenames('p'), ['parallel'])
+        with patch.object(sh.completer, 'services', return_value=['web']) as services:
+            self.assertEqual(sh.completedefault('', 'build ', 6, 6), ['web'])
+            services.assert_called_once_with('')
+
+
+# stub docker-compose that reports the engine it was pointed at
+fake_host_dc = '''#!/bin/sh
+[ "$1" = "-H" ] || exit 2
+host=$2
+shift 2
+case "$host" in
+  *slow*) exec sleep 5 ;;
+  *down*) echo "cannot connect to $host" >&2; exit 1 ;;
+esac
+echo "$host $@"
+'''
+
+
+class TestHostFanOut(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        dc_path = os.path.join(self.tmpdir, 'docker-compose')
+        with open(dc_path, 'w') as f:
+            f.write(fake_host_dc)
+        os.chmod(dc_path, 0o755)
+        self.settings = patch.dict('dcsh.compose.settings', {
+            'dc_path': dc_path,
+            'sudo': False,
+            'debug': False,
+            'jobs': 2,
+            'host_timeout': 0.5,
+            'host_groups': {
+                'staging': ['tcp://stage1:2376', 'tcp://stage2:2376'],
+                'broken': ['tcp://slow:2376', 'tcp://down:2376', 'tcp://up:2376'],
+            },
+            'projects': {},
+            'dc_commands': {'ps': 'List containers'},
+            'tasks': {'check': {'help': None, 'compiled_args': ['run', 'app', 'check'], 'depends': []}},
+        })
+        self.settings.start()
+        self.addCleanup(self.settings.stop)
+        self.stream = StringIO()
+        p = printer.StylePrinter(self.stream)
+        p.ansimode = False
+        patch('dcsh.shell.printer', p).start()
+        with patch('stat.S_ISFIFO', return_value=True):
+            self.sh = shell.DcShell()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.tmpdir)
+
+    def test_command(self):
+        self.sh.onecmd('%staging ps -q')
+        output = self.stream.getvalue()
+        self.assertIn('tcp://stage1:2376 | tcp://stage1:2376 ps -q\n', output)
+        self.assertIn('tcp://stage2:2376 | tcp://stage2:2376 ps -q\n', output)
+        self.assertEqual(self.sh.returncode, 0)
+
+    def test_task(self):
+        self.sh.onecmd('%staging check --fast')
+        self.assertIn('tcp://stage1:2376 | tcp://stage1:2376 run app check --fast\n', self.stream.getvalue())
+
+    def test_sudo(self):
+        """The host is passed on the command line, where sudo cannot drop it."""
+        shell.global_settings['sudo'] = True
+        with patch('dcsh.shell.Job') as job, patch('dcsh.shell.Runner'):
+            self.sh.onecmd('%staging ps')
+        dc_path = shell.global_settings['dc_path']
+        self.assertEqual([call[0] for call in job.call_args_list], [
+            ('tcp://stage1:2376', ['sudo', dc_path, '-H', 'tcp://stage1:2376', 'ps']),
+            ('tcp://stage2:2376', ['sudo', dc_path, '-H', 'tcp://stage2:2376', 'ps']),
+        ])
+        self.assertNotIn('env', job.call_args[1])
+
+    def test_failures(self):
+        """Timeouts and failing hosts are reported per host, and do not stop the others."""
+        self.sh.onecmd('%broken ps')
+        lines = self.stream.getvalue().splitlines()
+        self.assertIn('tcp://slow:2376 | timed out after 0.5s', lines)
+        self.assertIn('tcp://down:2376 | cannot connect to tcp://down:2376', lines)
+        self.assertIn('tcp://up:2376   | tcp://up:2376 ps', lines)
+        self.assertIn('tcp://slow:2376timeout', lines[-1])  # summary, without a stylesheet
+        self.assertEqual(self.sh.returncode, 1)
+
+    def test_errors(self):
+        self.sh.onecmd('%dev ps')
+        self.sh.onecmd('%staging nonsense')
+        self.assertEqual(self.stream.getvalue().splitlines(), [
+            'Unknown host group: dev',
+            'Unknown task or command: nonsense',
+        ])
+        self.assertEqual(self.sh.returncode, 1)
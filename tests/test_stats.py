@@ -0,0 +1,89 @@
+"""Tests for the dcsh stats module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.printer as printer
+import dcsh.stats as stats
+
+
+def invocation(command, wall, returncode=0, spawn=0.001):
+    inv = stats.Invocation(command, start=100.0)
+    inv.spawned = 100.0 + spawn if spawn is not None else None
+    inv.returncode = returncode
+    inv.end = 100.0 + wall
+    return inv
+
+
+class TestStats(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(stats.percentile(values, 0.5), 50)
+        self.assertEqual(stats.percentile(values, 0.95), 95)
+        self.assertEqual(stats.percentile(values, 1), 100)
+        self.assertEqual(stats.percentile([7], 0.5), 7)
+
+    def test_histogram(self):
+        self.assertEqual(stats.histogram([0.05, 0.2, 0.25, 500]), [
+            (0.1, 1), (0.3, 2), (1, 0), (3, 0), (10, 0), (30, 0), (100, 0), (None, 1)])
+
+    def test_invocation(self):
+        inv = stats.Invocation('ps')
+        self.assertIsNone(inv.spawn_latency)
+        inv.mark_spawned()
+        self.assertIs(inv.finish(3), inv)
+        self.assertEqual(inv.returncode, 3)
+        self.assertGreaterEqual(inv.wall, inv.spawn_latency)
+
+    def test_bounded(self):
+        store = stats.Stats(limit=3)
+        for ii in range(5):
+            store.record(invocation('cmd{}'.format(ii), 1))
+        self.assertEqual([inv.command for inv in store.records], ['cmd2', 'cmd3', 'cmd4'])
+
+    def test_summary(self):
+        store = stats.Stats()
+        store.record(invocation('test', 3, returncode=1))
+        store.record(invocation('test', 1))
+        store.record(invocation('ps', 0.5, spawn=None))
+        summary = store.summary()
+        self.assertEqual(summary['test']['count'], 2)
+        self.assertEqual(summary['test']['failures'], 1)
+        self.assertEqual(summary['test']['wall'], [1, 3])
+        self.assertEqual(summary['ps']['spawn'], [])
+
+    def test_report(self):
+        store = stats.Stats()
+        p = printer.StringPrinter()
+        store.report(p)
+        self.assertIn('No commands have been run yet.', p.getvalue())
+
+        for wall in (0.05, 0.2, 0.2, 2):
+            store.record(invocation('test', wall, returncode=wall > 1))
+        p = printer.StringPrinter()
+        store.report(p)
+        output = p.getvalue()
+        self.assertIn('    4 runs   25% failed  spawn p50 1.0ms  wall p50 0.20s p95 2.00s max 2.00s', output)
+        self.assertIn('     < 0.3s ' + '#' * 30 + ' 2\n', output)
+        self.assertIn('       < 3s ' + '#' * 15 + ' ' * 15 + ' 1\n', output)
+
+    def test_save(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'stats.jsonl')
+            store = stats.Stats()
+            store.record(invocation('test', 2, returncode=1))
+            store.save(path)
+            store.save(path)  # nothing new to save
+            store.record(invocation('other', 1))
+            store.save(path)
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual([line['command'] for line in lines], ['test', 'other'])
+            self.assertEqual(lines[0], {
+                'command': 'test', 'start': 100.0, 'spawn': lines[0]['spawn'], 'wall': 2.0, 'returncode': 1})
+            self.assertAlmostEqual(lines[0]['spawn'], 0.001)
+        finally:
+            shutil.rmtree(tmpdir)
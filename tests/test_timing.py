@@ -0,0 +1,55 @@
+"""Tests for the dcsh timing module."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.printer as printer
+from dcsh.timing import PhaseTimer
+from StringIO import StringIO
+
+
+class TestPhaseTimer(unittest.TestCase):
+    def setUp(self):
+        self.timer = PhaseTimer()
+        self.timer.enabled = True
+        self.timer.origin = 100.0
+
+    def test_disabled(self):
+        timer = PhaseTimer()
+        with timer.phase('load'):
+            pass
+        timer.record('first prompt', timer.origin)
+        self.assertEqual(timer.phases, [])
+
+    def test_phase(self):
+        with self.timer.phase('load', track='scrape'):
+            pass
+        self.assertEqual(len(self.timer.phases), 1)
+        name, start, end, track = self.timer.phases[0]
+        self.assertEqual((name, track), ('load', 'scrape'))
+        self.assertLessEqual(start, end)
+
+    def test_report(self):
+        self.timer.record('yaml', 100.0, 100.5)
+        self.timer.record('reload', 102.0, 102.25)
+        stream = StringIO()
+        self.timer.report(printer.StylePrinter(stream), since=101.0)
+        self.assertEqual(stream.getvalue(), 'Startup phases (start +duration, ms):\n'
+                                            '    2000.0 +250.0    reload\n')
+
+    def test_trace(self):
+        self.timer.record('yaml', 100.0, 100.5)
+        self.timer.record('help scrape', 100.0, 100.25, track='docker-compose')
+        events = self.timer.trace_events()
+        self.assertEqual([(e['ph'], e['name'], e['tid']) for e in events], [
+            ('M', 'thread_name', 1), ('X', 'yaml', 1), ('M', 'thread_name', 2), ('X', 'help scrape', 2)])
+        self.assertEqual((events[3]['ts'], events[3]['dur']), (0, 250000))
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        trace = os.path.join(tmpdir, 'trace.json')
+        self.timer.write_trace(trace)
+        with open(trace) as f:
+            self.assertEqual(json.load(f)['traceEvents'][1]['name'], 'yaml')
@@ -0,0 +1,82 @@
+"""Tests for the dcsh watch module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import dcsh.watch as watch
+from mock import patch
+
+
+class WatcherTests(object):
+    """Behaviour shared by all watcher implementations."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.paths = [os.path.join(self.tmpdir, name) for name in ('one.yml', 'two.yml')]
+        self.write(self.paths[0], 'one')
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, file_path, text):
+        with open(file_path, 'w') as f:
+            f.write(text)
+
+    def test_unchanged(self):
+        self.watcher = self.make(self.paths)
+        self.assertEqual(self.watcher.changed(), [])
+
+    def test_modified(self):
+        self.watcher = self.make(self.paths)
+        self.write(self.paths[0], 'changed')
+        self.assertEqual(self.watcher.changed(), [self.paths[0]])
+        self.assertEqual(self.watcher.changed(), [])
+
+    def test_created_and_deleted(self):
+        self.watcher = self.make(self.paths)
+        self.write(self.paths[1], 'two')
+        os.remove(self.paths[0])
+        self.assertEqual(self.watcher.changed(), self.paths)
+
+    def test_replaced(self):
+        """Editors that save by renaming a new file over the old one are detected."""
+        self.watcher = self.make(self.paths)
+        tmp_path = os.path.join(self.tmpdir, '.one.yml.swp')
+        self.write(tmp_path, 'replaced')
+        os.rename(tmp_path, self.paths[0])
+        self.assertEqual(self.watcher.changed(), [self.paths[0]])
+
+    def test_unrelated(self):
+        self.watcher = self.make(self.paths)
+        self.write(os.path.join(self.tmpdir, 'other.yml'), 'other')
+        self.assertEqual(self.watcher.changed(), [])
+
+
+class TestPollWatcher(WatcherTests, unittest.TestCase):
+    make = watch.PollWatcher
+
+
+@unittest.skipIf(watch.load_libc() is None, 'inotify is not available')
+class TestInotifyWatcher(WatcherTests, unittest.TestCase):
+    def make(self, paths):
+        return watch.InotifyWatcher(paths, watch.load_libc())
+
+    def test_overflow(self):
+        self.watcher = self.make(self.paths)
+        with patch.object(self.watcher, '_read', return_value=[(-1, watch.IN_Q_OVERFLOW, '')]):
+            self.assertEqual(self.watcher.changed(), self.paths)
+
+
+class TestWatcher(unittest.TestCase):
+    def test_fallback(self):
+        with patch('dcsh.watch.load_libc', return_value=None):
+            self.assertIsInstance(watch.watcher([]), watch.PollWatcher)
+
+    def test_unwatchable(self):
+        """Paths whose directory cannot be watched fall back to polling."""
+        if watch.load_libc() is None:
+            self.skipTest('inotify is not available')
+        w = watch.watcher(['/nonexistent/dir/file.yml'])
+        self.assertIsInstance(w, watch.PollWatcher)
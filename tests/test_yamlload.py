@@ -0,0 +1,77 @@
+"""Tests for the dcsh yamlload module."""
+
+import yaml
+import unittest
+import dcsh.yamlload as yamlload
+from StringIO import StringIO
+
+compose_yml = '''
+version: '3.4'
+x-proxy-args: &proxy-args
+  http_proxy: proxy
+  no_proxy: localhost
+x-unused: &unused
+  foo: bar
+x-outer: &outer
+  inner: &inner [1, 2]
+  value: outer
+x-dcsh:
+  environment:
+    <<: *proxy-args
+    EXTRA: 'yes'
+  tasks:
+    sh:
+      service: python-dev
+      args: *inner
+  late: &late late
+  again: *late
+services:
+  python-dev:
+    build:
+      args:
+        <<: *proxy-args
+  broken: [this is, {not: valid yaml
+'''
+
+
+class TestLoadKey(unittest.TestCase):
+    def load_key(self, text, key='x-dcsh'):
+        return yamlload.load_key(StringIO(text), key)
+
+    def test_load(self):
+        self.assertEqual(yamlload.load(StringIO('a: [1, 2]')), {'a': [1, 2]})
+
+    def test_key(self):
+        self.assertEqual(self.load_key(compose_yml), {
+            'environment': {'http_proxy': 'proxy', 'no_proxy': 'localhost', 'EXTRA': 'yes'},
+            'tasks': {'sh': {'service': 'python-dev', 'args': [1, 2]}},
+            'late': 'late',
+            'again': 'late',
+        })
+
+    def test_matches_full_load(self):
+        text = compose_yml[:compose_yml.index('  broken')]
+        self.assertEqual(self.load_key(text), yaml.safe_load(text)['x-dcsh'])
+        self.assertEqual(self.load_key(text, 'x-outer'), yaml.safe_load(text)['x-outer'])
+
+    def test_stops_after_key(self):
+        """Content after the requested key is never parsed."""
+        self.assertRaises(yaml.YAMLError, yaml.safe_load, compose_yml)
+        self.assertIsNotNone(self.load_key(compose_yml))
+
+    def test_alias_value(self):
+        self.assertEqual(self.load_key('a: &a {b: 1}\nx-dcsh: *a\n'), {'b': 1})
+
+    def test_nested_anchor_parent(self):
+        """Anchors nested in a referenced anchor are not redefined."""
+        text = 'a: &a {b: &b 1}\nx-dcsh: [*a, *b]\n'
+        self.assertEqual(self.load_key(text), [{'b': 1}, 1])
+
+    def test_missing(self):
+        self.assertIsNone(self.load_key('a: 1\nb: 2\n'))
+        self.assertEqual(yamlload.load_key(StringIO('a: 1'), 'x', {}), {})
+
+    def test_empty(self):
+        self.assertIsNone(self.load_key(''))
+        self.assertIsNone(self.load_key('- x-dcsh\n'))
+        self.assertIsNone(self.load_key('just a scalar'))